@@ -1,47 +1,76 @@
 from fastapi.security import OAuth2PasswordBearer
 from fastapi import Depends, HTTPException
-from passlib.context import CryptContext
-from jose import JWTError, jwt
-from datetime import datetime, timedelta
-from config import SECRET_KEY, ALGORITHM, ACCESS_TOKEN_EXPIRE_MINUTES
-from database import get_user_by_username
-from utils import verify_password  # Import from utils
-# Password hashing setup using bcrypt for secure password storage
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+from jose import JWTError, jwt, jwk
+from datetime import datetime, timedelta, timezone
+import time
+import uuid
+from config import (
+    SECRET_KEY,
+    ALGORITHM,
+    ACCESS_TOKEN_EXPIRE_MINUTES,
+    USER_CACHE_TTL,
+    USER_CACHE_MAX_ENTRIES,
+    TOKEN_DENYLIST_ENABLED,
+)
+from database import get_user_by_username, get_user_credentials, update_user_password_hash
+from models import Principal, UserProfile
+from local_cache import LocalCache
+from redis_interface import get_redis_connection
+from utils import verify_and_update_password  # Import from utils
 
 # OAuth2PasswordBearer is used to extract the token from the request header
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 
+# Key used to sign and verify access tokens, constructed once instead of on every request
+token_key = jwk.construct(SECRET_KEY, ALGORITHM)
+
+# Redis keys of the revocation list: single tokens (by `jti`) and every token of a user
+# issued up to a given UNIX time
+REVOKED_TOKEN_KEY = "tao:auth:revoked_token:{token_id}"
+REVOKED_USER_KEY = "tao:auth:revoked_user:{username}"
+
+# Redis pub/sub channel on which user profiles to drop from every worker's cache are broadcast
+USER_CACHE_INVALIDATE_CHANNEL = "tao:user_cache_invalidate"
+
+# Short-lived per-process cache of user profiles, for the endpoints that need more than the token claims
+user_cache = LocalCache(max_entries=USER_CACHE_MAX_ENTRIES, ttl=USER_CACHE_TTL, channel=USER_CACHE_INVALIDATE_CHANNEL)
+
 # Function to authenticate the user by verifying username and password
 async def authenticate_user(username: str, password: str):
     """
     Authenticate the user by comparing the plain password with the stored hashed password.
+
+    The check runs on the password hashing pool. If the stored hash was made with another
+    cost factor than `BCRYPT_ROUNDS`, it is replaced by a fresh hash.
     
     Args:
         username (str): The username entered by the user.
         password (str): The plain password entered by the user.
     
     Returns:
-        dict or None: The user data if authenticated, None otherwise.
+        dict or None: The username and password hash if authenticated, None otherwise.
     """
-    # Fetch the user from the database using the provided username
-    user = await get_user_by_username(username)
-    
-    # Check if the user exists and if the password matches
-    try:
-        verified = verify_password(password, user.hashed_password)
-    except Exception as e:
-        print(e)
+    # Fetch the credentials (not the whole profile) using the provided username
+    user = await get_user_credentials(username)
+    if not user:
+        return None
     
-    if not user or not verified:
+    # Check if the password matches
+    verified, new_hash = await verify_and_update_password(password, user["hashed_password"])
+    if not verified:
         return None
     
+    # Upgrade the stored hash to the current cost factor
+    if new_hash is not None:
+        await update_user_password_hash(username, new_hash)
+        user["hashed_password"] = new_hash
+    
     return user
 
 # Function to create a JWT access token
 def create_access_token(data: dict) -> str:
     """
-    Create a JWT token that includes the user data and expiration time.
+    Create a JWT token that includes the user data, a unique token ID, and issue and expiration times.
     
     Args:
         data (dict): The data to include in the token (typically user info).
@@ -52,49 +81,129 @@ def create_access_token(data: dict) -> str:
     # Copy the data and add an expiration time
     try:
         to_encode = data.copy()
-        expire = datetime.utcnow() + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
-        to_encode.update({"exp": expire})  # Set the expiration claim
-        # Encode the token with the secret key and algorithm
-        token = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
+        issued_at = datetime.now(timezone.utc)
+        expire = issued_at + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
+        # Set the expiration, issue time and token ID claims; the issue time keeps its
+        # fraction of a second so a token issued right after a revocation stays valid
+        to_encode.update({"exp": expire, "iat": issued_at.timestamp(), "jti": uuid.uuid4().hex})
+        # Encode the token with the signing key and algorithm
+        token = jwt.encode(to_encode, token_key, algorithm=ALGORITHM)
     except Exception as e:
         print(e)
         return None
     return token
 
+async def is_revoked(principal: Principal) -> bool:
+    """
+    Check a token against the Redis revocation list, in a single round trip.
+
+    Args:
+        principal (Principal): The caller built from the token.
+
+    Returns:
+        bool: True if the token itself or every token of its user issued before the revocation was revoked.
+    """
+    redis = await get_redis_connection()
+    pipe = redis.pipeline(transaction=False)
+    pipe.exists(REVOKED_TOKEN_KEY.format(token_id=principal.token_id))
+    pipe.get(REVOKED_USER_KEY.format(username=principal.username))
+    token_revoked, revoked_until = await pipe.execute()
+    if token_revoked:
+        return True
+    return revoked_until is not None and principal.issued_at.timestamp() < float(revoked_until)
+
+async def revoke_token(principal: Principal):
+    """
+    Revoke a single token (e.g. on logout). The entry expires together with the token.
+
+    Args:
+        principal (Principal): The caller built from the token to revoke.
+    """
+    remaining = int(principal.expires_at.timestamp() - time.time()) + 1
+    if remaining > 0:
+        redis = await get_redis_connection()
+        await redis.set(REVOKED_TOKEN_KEY.format(token_id=principal.token_id), 1, ex=remaining)
+
+async def revoke_user_tokens(username: str):
+    """
+    Revoke every token issued to a user so far (e.g. after a password change or when the
+    account is disabled), and drop the user's cached profile in every worker.
+
+    Args:
+        username (str): The user whose tokens are revoked.
+    """
+    redis = await get_redis_connection()
+    # Tokens live at most ACCESS_TOKEN_EXPIRE_MINUTES, so the entry is not needed for longer
+    await redis.set(REVOKED_USER_KEY.format(username=username), time.time(), ex=ACCESS_TOKEN_EXPIRE_MINUTES * 60)
+    await user_cache.broadcast_invalidation([username])
+
 # Dependency to retrieve the current user from the token
-def get_current_user(token: str = Depends(oauth2_scheme)):
+async def get_current_user(token: str = Depends(oauth2_scheme)) -> Principal:
     """
-    Get the current user from the JWT token by decoding it and verifying the user exists in the database.
+    Get the current user from the claims of the JWT token.
+
+    The token signature and expiration prove who the caller is, so no database lookup is
+    made; only the Redis revocation list is checked.
     
     Args:
         token (str): The JWT token sent by the client in the Authorization header.
     
     Returns:
-        dict: The authenticated user.
+        Principal: The authenticated caller.
     
     Raises:
-        HTTPException: If the token is invalid or the user doesn't exist in the database.
+        HTTPException: If the token is invalid, expired or revoked.
     """
     try:
-        # Decode the JWT token to extract user data
-        print("---------------")
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        # Decode and verify the JWT token to extract its claims
+        payload = jwt.decode(token, token_key, algorithms=[ALGORITHM])
         username: str = payload.get("sub")  # Extract the subject (username) from the payload
         
-        if username is None:
+        # Tokens without an ID or issue time cannot be revoked, so they are not accepted
+        if username is None or payload.get("jti") is None or payload.get("iat") is None:
             raise HTTPException(status_code=401, detail="Invalid authentication credentials")
         
-        # Fetch user data from the database
-        user = get_user_by_username(username)
-        if user is None:
-            raise HTTPException(status_code=404, detail="User not found in the database")
+        principal = Principal(
+            username=username,
+            token_id=payload["jti"],
+            issued_at=datetime.fromtimestamp(payload["iat"], tz=timezone.utc),
+            expires_at=datetime.fromtimestamp(payload["exp"], tz=timezone.utc),
+        )
+        if TOKEN_DENYLIST_ENABLED and await is_revoked(principal):
+            raise HTTPException(status_code=401, detail="Token has been revoked")
         
-        return user  # Return the user data if everything is valid
+        return principal  # Return the caller if everything is valid
 
     except JWTError:
         # If there's an issue decoding the JWT token, raise an HTTPException
         raise HTTPException(status_code=401, detail="Could not validate credentials")
+    except HTTPException:
+        raise
     except Exception as e:
         # Catch any other unexpected errors
         raise HTTPException(status_code=500, detail=f"An error occurred: {str(e)}")
 
+# Dependency for endpoints that need the stored user profile, not only the token claims
+async def get_current_user_profile(principal: Principal = Depends(get_current_user)) -> UserProfile:
+    """
+    Get the stored profile of the current user, cached per process for `USER_CACHE_TTL` seconds.
+    
+    Args:
+        principal (Principal): The authenticated caller.
+    
+    Returns:
+        UserProfile: The user's profile (never the password hash, so none is cached).
+    
+    Raises:
+        HTTPException: If the user doesn't exist in the database anymore.
+    """
+    cached = user_cache.get(principal.username)
+    if cached is not None:
+        return UserProfile(**cached[0])
+    
+    # Fetch user data from the database
+    user = await get_user_by_username(principal.username)
+    if user is None:
+        raise HTTPException(status_code=404, detail="User not found in the database")
+    user_cache.set(principal.username, user.dict(), 0)
+    return user
@@ -1,125 +1,813 @@
 import asyncio
-from async_substrate_interface.async_substrate import AsyncSubstrateInterface
-from bittensor.core.settings import SS58_FORMAT
+import json
+import logging
+import time
+import uuid
 from bittensor.core.chain_data import decode_account_id
 from redis_interface import get_redis_connection
+from substrate_pool import get_substrate_pool
+from block_watcher import get_current_block
+from models import DividendResult
+from singleflight import SingleFlight
+from local_cache import LocalCache
+from config import (
+    SUBNET_LIST_CACHE_TTL,
+    DIVIDEND_CACHE_TTL,
+    DIVIDEND_CACHE_SOFT_TTL,
+    DIVIDEND_CACHE_SWR,
+    DIVIDEND_CACHE_BLOCK_SPAN,
+    DIVIDEND_STREAM_PAGE_SIZE,
+)
+
+# Set up logging to capture important events, especially errors
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Redis key holding the JSON list of live netuids
+SUBNET_LIST_CACHE_KEY = "tao_subnets"
+
+# Hash fields holding the block number and time a cached subnet map was read at
+BLOCK_FIELD = "__block__"
+TS_FIELD = "__ts__"
+
+# Coalesces concurrent cache misses so only one chain query per key and block is in flight
+dividend_flights = SingleFlight("tao_dividends")
+
+# In-process L1 cache in front of Redis, keyed like the Redis keys
+dividend_local_cache = LocalCache()
+
+# Hit/miss counters of the Redis tier (the L1 tier keeps its own)
+redis_tier_stats = {"hits": 0, "misses": 0}
+
+# Stale-while-revalidate: background refreshes in flight, keyed like the single-flight keys
+refresh_tasks = {}
+swr_stats = {"stale_served": 0, "refreshes": 0, "refreshes_deduplicated": 0}
+
+
+def point_cache_key(netuid, address):
+    """
+    Redis key of a single cached (netuid, address) dividend.
+    """
+    return f"tao_dividend:{netuid}:{address}"
+
+
+def subnet_cache_key(netuid):
+    """
+    Redis key of the cached dividend hash of a whole subnet (hotkey -> dividend).
+    """
+    return f"tao_dividend:{netuid}"
+
+
+def is_current_block(block, current_block):
+    """
+    Whether a cache entry read at `block` is still valid at `current_block`.
+
+    Entries are versioned by block span: they stay valid until the chain moves into the
+    next span of `DIVIDEND_CACHE_BLOCK_SPAN` blocks.
+
+    Args:
+        block (int): The block number the entry was read at.
+        current_block (int): The latest finalized block number.
+
+    Returns:
+        bool: True if the entry may be served.
+    """
+    return block is not None and block >= span_start(current_block)
+
+
+def span_start(block):
+    """
+    First block of the cache span containing `block`; entries read before it are outdated.
+    """
+    return block - block % DIVIDEND_CACHE_BLOCK_SPAN
+
+
+def count_redis_lookup(hit):
+    """
+    Record a Redis tier hit or miss.
+    """
+    redis_tier_stats["hits" if hit else "misses"] += 1
+
+
+def cached_result(dividend, block, ts, current_block):
+    """
+    Builds the result for a cached value and classifies it as fresh or stale.
+
+    An entry is fresh while it was read in the current block span and less than
+    `DIVIDEND_CACHE_SOFT_TTL` seconds ago. Stale entries may still be served (until
+    Redis drops them after `DIVIDEND_CACHE_TTL`) while a refresh runs in the background.
+
+    Args:
+        dividend (Any): The cached value.
+        block (int): The block number it was read at.
+        ts (float): The UNIX time it was read at, or None if unknown.
+        current_block (int): The latest finalized block number.
+
+    Returns:
+        DividendResult: The cached value with its block, age and staleness.
+    """
+    age = max(time.time() - ts, 0.0) if ts is not None else None
+    stale = not is_current_block(block, current_block) or (age is not None and age > DIVIDEND_CACHE_SOFT_TTL)
+    return DividendResult(dividend=dividend, block=block, cached=True, stale=stale, age=age)
+
+
+def fetched_result(dividend, block):
+    """
+    Builds the result for a value just read from the chain.
+    """
+    return DividendResult(dividend=dividend, block=block, cached=False, stale=False, age=0.0)
+
+
+def read_local(cache_key, current_block):
+    """
+    Looks up a fresh entry in the in-process cache.
+
+    Args:
+        cache_key (str): The Redis-style cache key.
+        current_block (int): The latest finalized block number.
+
+    Returns:
+        DividendResult: The fresh cached value, or None.
+    """
+    local = dividend_local_cache.get(cache_key, min_block=span_start(current_block))
+    if local is None:
+        return None
+    (dividend, ts), block = local
+    result = cached_result(dividend, block, ts, current_block)
+    return None if result.stale else result
+
+
+def remember_locally(cache_key, dividend, block, ts):
+    """
+    Stores a value in the in-process cache together with the block and time it was read at.
+    """
+    dividend_local_cache.set(cache_key, (dividend, ts), block)
+
+
+def read_time(result):
+    """
+    UNIX time a cached result was read at, derived from its age.
+    """
+    return time.time() - result.age if result.age is not None else None
+
+
+def schedule_refresh(key, fetch):
+    """
+    Refreshes a stale entry in the background, at most once per key at a time.
+
+    Args:
+        key (str): The single-flight key of the entry (cache key and block).
+        fetch (Callable): Coroutine function fetching the entry and writing it to the cache.
+    """
+    if key in refresh_tasks:
+        swr_stats["refreshes_deduplicated"] += 1
+        return
+    swr_stats["refreshes"] += 1
+    task = asyncio.create_task(dividend_flights.do(key, fetch))
+    refresh_tasks[key] = task
+    task.add_done_callback(lambda t: _refresh_done(key, t))
+
+
+def _refresh_done(key, task):
+    """
+    Forget a finished background refresh and log its failure, if any.
+    """
+    refresh_tasks.pop(key, None)
+    if not task.cancelled() and task.exception() is not None:
+        logger.error(f"Background refresh of {key} failed: {task.exception()}")
+
+
+def queue_cached_dividend_reads(pipe, netuid, address):
+    """
+    Queues the reads needed to serve one (netuid, address) dividend from Redis: the
+    address field, block and time markers of the subnet hash, then the point key.
+
+    Args:
+        pipe (Pipeline): The Redis pipeline to queue the commands on.
+        netuid (int): The network ID.
+        address (str): The address whose Tao dividend is to be read.
+    """
+    pipe.hmget(subnet_cache_key(netuid), [address, BLOCK_FIELD, TS_FIELD])
+    pipe.get(point_cache_key(netuid, address))
+
+
+def parse_cached_dividend(hash_values, point_value):
+    """
+    Resolves the replies queued by `queue_cached_dividend_reads` into a dividend and the
+    block and time it was read at. The newer of the subnet hash and the point key wins.
+
+    A cached subnet hash holds every entry of the storage map, whose default is 0, so an
+    address missing from an existing hash has a dividend of 0.
+
+    Args:
+        hash_values (list): The HMGET reply ([address value, block marker, time marker]).
+        point_value (str): The GET reply of the point key (JSON with value, block and ts).
+
+    Returns:
+        tuple: `(dividend, block, ts)`, or None if nothing is cached.
+    """
+    candidates = []
+    field_value, block, ts = hash_values
+    if block is not None:
+        value = float(field_value) if field_value is not None else 0.0
+        candidates.append((value, int(block), float(ts) if ts is not None else None))
+    if point_value is not None:
+        point = json.loads(point_value)
+        candidates.append((float(point["value"]), int(point["block"]), point.get("ts")))
+    if not candidates:
+        return None
+    return max(candidates, key=lambda candidate: candidate[1])
+
+
+async def read_cached_dividend(netuid, address, current_block, fresh_only=False):
+    """
+    Reads a (netuid, address) dividend from Redis: the cached subnet hash and the point
+    key are checked in a single round trip.
+
+    Args:
+        netuid (int): The network ID.
+        address (str): The address whose Tao dividend is to be read.
+        current_block (int): The latest finalized block number.
+        fresh_only (bool): Return None instead of a stale entry.
+
+    Returns:
+        DividendResult: The cached dividend (possibly stale), or None if it is not cached.
+    """
+    redis = await get_redis_connection()
+    pipe = redis.pipeline(transaction=False)
+    queue_cached_dividend_reads(pipe, netuid, address)
+    hash_values, point_value = await pipe.execute()
+    cached = parse_cached_dividend(hash_values, point_value)
+    if cached is None:
+        return None
+    result = cached_result(*cached, current_block)
+    if fresh_only and result.stale:
+        return None
+    return result
+
+
+async def fetch_dividend(netuid, address, current_block, current_hash):
+    """
+    Queries a (netuid, address) dividend from the blockchain at the given block and
+    stores it in Redis and the in-process cache together with the block and time it was
+    read at.
+
+    Args:
+        netuid (int): The network ID.
+        address (str): The address whose Tao dividend is to be fetched.
+        current_block (int): The block number to read at.
+        current_hash (str): The hash of that block.
+
+    Returns:
+        DividendResult: The freshly fetched dividend.
+    """
+    async with get_substrate_pool().connection() as substrate:
+        result = await substrate.query("SubtensorModule", "TaoDividendsPerSubnet", [netuid, address], block_hash=current_hash)
+    value = getattr(result, "value", result) or 0
+    now = time.time()
+
+    redis = await get_redis_connection()
+    cache_key = point_cache_key(netuid, address)
+    await redis.setex(cache_key, DIVIDEND_CACHE_TTL, json.dumps({"value": value, "block": current_block, "ts": now}))
+    await dividend_local_cache.broadcast_invalidation([cache_key])
+    remember_locally(cache_key, value, current_block, now)
+    return fetched_result(value, current_block)
+
 
 async def get_tao_dividend_from_netuid_address(netuid, address):
     """
-    Fetches the Tao dividend for a given address and netuid from either Redis cache
-    or the blockchain. If the value is not cached, it queries the blockchain and
-    stores the result in Redis for future use.
-    
+    Fetches the Tao dividend for a given address and netuid from either the in-process
+    cache, Redis or the blockchain. Cached values are fresh while they were read in the
+    current block span and within the soft TTL. A stale value is returned immediately
+    while a deduplicated background refresh is scheduled (stale-while-revalidate); only
+    a value missing from the cache makes the caller wait for the blockchain. Concurrent
+    misses for the same key share a single chain query.
+
     Args:
         netuid (int): The network ID.
         address (str): The address whose Tao dividend is to be fetched.
-    
+
     Returns:
-        float: The Tao dividend value or None if it couldn't be fetched.
+        DividendResult: The Tao dividend value (None if it couldn't be fetched), the block it was read at, and its freshness.
     """
     try:
-        # Create a connection to Redis
-        redis = await get_redis_connection()
-        cache_key = f"tao_dividend:{netuid}:{address}"
+        current_block, current_hash = await get_current_block()
+        cache_key = point_cache_key(netuid, address)
+
+        # Serve from the in-process cache without any network round trip
+        local = read_local(cache_key, current_block)
+        if local is not None:
+            return local
 
-        # Check if the Tao dividend is available in Redis cache
-        cached_value = await redis.get(cache_key)
-        if cached_value:
+        # Check the subnet hash and the point key in one round trip
+        cached = await read_cached_dividend(netuid, address, current_block)
+        count_redis_lookup(cached is not None and not cached.stale)
+        if cached is not None and not cached.stale:
             print("Fetched from Redis cache")
-            return float(cached_value)
+            remember_locally(cache_key, cached.dividend, cached.block, read_time(cached))
+            return cached
 
-        # If not cached, query the blockchain
-        async with AsyncSubstrateInterface("wss://entrypoint-finney.opentensor.ai:443", ss58_format=SS58_FORMAT) as substrate:
-            block_hash = await substrate.get_chain_head()
-            result = await substrate.query("SubtensorModule", "TaoDividendsPerSubnet", [netuid, address], block_hash=block_hash)
+        # Query the blockchain once per key and block, however many callers missed
+        flight_key = f"{cache_key}@{current_block}"
+        fetch = lambda: fetch_dividend(netuid, address, current_block, current_hash)
 
-            # Cache the result in Redis for 120 seconds (2 minutes)
-            if result:
-                await redis.setex(cache_key, 120, result.value)
-                return result.value
+        # Serve a stale value right away and refresh it in the background
+        if cached is not None and DIVIDEND_CACHE_SWR:
+            swr_stats["stale_served"] += 1
+            schedule_refresh(flight_key, fetch)
+            return cached
+
+        return await dividend_flights.do(
+            flight_key,
+            fetch,
+            recheck=lambda: read_cached_dividend(netuid, address, current_block, fresh_only=True),
+        )
 
     except Exception as e:
         print(f"Error fetching Tao dividend: {e}")
+        return DividendResult()
+
+
+async def read_cached_subnet_dividends(netuid, current_block, fresh_only=False):
+    """
+    Reads the cached dividend hash of a subnet.
+
+    Args:
+        netuid (int): The network ID.
+        current_block (int): The latest finalized block number.
+        fresh_only (bool): Return None instead of a stale entry.
+
+    Returns:
+        DividendResult: The cached list of hotkey -> dividend entries (possibly stale), or None if it is not cached.
+    """
+    redis = await get_redis_connection()
+    cached_values = await redis.hgetall(subnet_cache_key(netuid))
+    if not cached_values:
         return None
+    cached_block = int(cached_values.pop(BLOCK_FIELD, -1))
+    ts = cached_values.pop(TS_FIELD, None)
+    dividends = [{hotkey: float(value)} for hotkey, value in cached_values.items()]
+    result = cached_result(dividends, cached_block, float(ts) if ts is not None else None, current_block)
+    if fresh_only and result.stale:
+        return None
+    return result
 
-    return None
+
+async def fetch_subnet_dividends(netuid, current_block, current_hash):
+    """
+    Scans the `TaoDividendsPerSubnet` map of a subnet at the given block and stores it in
+    Redis as a hash (hotkey -> dividend) together with the block and time it was read at.
+
+    Args:
+        netuid (int): The network ID.
+        current_block (int): The block number to read at.
+        current_hash (str): The hash of that block.
+
+    Returns:
+        DividendResult: The freshly fetched list of hotkey -> dividend entries.
+    """
+    async with get_substrate_pool().connection() as substrate:
+        # Query the blockchain for Tao dividends for the subnet
+        qmr = await substrate.query_map("SubtensorModule", "TaoDividendsPerSubnet", [netuid], block_hash=current_hash)
+
+        # Process the results to extract account IDs and their dividend values
+        dividends = {}
+        async for k, v in qmr:
+            dividends[decode_account_id(k)] = v.value
+    now = time.time()
+
+    # Replace the cached hash atomically and let it expire with the hard TTL
+    redis = await get_redis_connection()
+    cache_key = subnet_cache_key(netuid)
+    pipe = redis.pipeline(transaction=True)
+    pipe.delete(cache_key)
+    pipe.hset(cache_key, mapping={**dividends, BLOCK_FIELD: current_block, TS_FIELD: now})
+    pipe.expire(cache_key, DIVIDEND_CACHE_TTL)
+    await pipe.execute()
+
+    dividends = [{hotkey: value} for hotkey, value in dividends.items()]
+    await dividend_local_cache.broadcast_invalidation([cache_key])
+    remember_locally(cache_key, dividends, current_block, now)
+    return fetched_result(dividends, current_block)
 
 
 async def get_tao_dividends_for_subnet(netuid):
     """
     Fetches the Tao dividends for all addresses under a particular netuid (subnet).
-    It first checks Redis for cached values and if not found, queries the blockchain.
+    It first checks the in-process cache and Redis for the subnet hash and if not
+    found, queries the blockchain and stores the whole map as a hash (hotkey -> dividend)
+    together with the block number and time it was read at. The same hash then serves
+    point lookups on this subnet. A stale map is returned immediately while a background
+    refresh is scheduled, and concurrent misses for the same subnet share a single scan.
 
     Args:
         netuid (int): The network ID for which Tao dividends are to be fetched.
 
     Returns:
-        list: A list of dictionaries mapping account IDs to their Tao dividends.
+        DividendResult: A list of dictionaries mapping account IDs to their Tao dividends, the block it was read at, and its freshness.
     """
     try:
-        async def exhaust(qmr):
-            """
-            Helper function to exhaust the query map and return results as a list.
-
-            Args:
-                qmr (AsyncIterable): The async query map result to be iterated.
-
-            Returns:
-                list: A list of key-value pairs from the query map.
-            """
-            result = []
-            async for k, v in await qmr:
-                result.append((k, v))
-            return result
-
-        # Connect to Redis
-        redis = await get_redis_connection()
-        cache_key = f"tao_dividend:{netuid}"
-
-        # Check if the value exists in Redis
-        cached_value = await redis.get(cache_key)
-        if cached_value:
-            print("Fetched from Redis cache")
-            return float(cached_value)
+        current_block, current_hash = await get_current_block()
+        cache_key = subnet_cache_key(netuid)
+
+        # Serve from the in-process cache without any network round trip
+        local = read_local(cache_key, current_block)
+        if local is not None:
+            return local
 
-        # If not cached, query the blockchain
-        async with AsyncSubstrateInterface("wss://entrypoint-finney.opentensor.ai:443", ss58_format=SS58_FORMAT) as substrate:
-            block_hash = await substrate.get_chain_head()
-            # Query the blockchain for Tao dividends for the subnet
-            results = [substrate.query_map("SubtensorModule", "TaoDividendsPerSubnet", [netuid], block_hash=block_hash)]
+        # Check if the subnet map exists in Redis
+        cached = await read_cached_subnet_dividends(netuid, current_block)
+        count_redis_lookup(cached is not None and not cached.stale)
+        if cached is not None and not cached.stale:
+            print("Fetched from Redis cache")
+            remember_locally(cache_key, cached.dividend, cached.block, read_time(cached))
+            return cached
 
-            # Process the results to extract account IDs and their dividend values
-            results = [exhaust(result) for result in results]
-            results_dicts_list = []
+        # Scan the subnet once per block, however many callers missed
+        flight_key = f"{cache_key}@{current_block}"
+        fetch = lambda: fetch_subnet_dividends(netuid, current_block, current_hash)
 
-            # Cache the results in Redis for 120 seconds (2 minutes)
-            for future in asyncio.as_completed(results):
-                result = await future
-                results_dicts_list.extend([{decode_account_id(k): v.value} for k, v in result])
+        # Serve a stale map right away and refresh it in the background
+        if cached is not None and DIVIDEND_CACHE_SWR:
+            swr_stats["stale_served"] += 1
+            schedule_refresh(flight_key, fetch)
+            return cached
 
-            return results_dicts_list
+        return await dividend_flights.do(
+            flight_key,
+            fetch,
+            recheck=lambda: read_cached_subnet_dividends(netuid, current_block, fresh_only=True),
+        )
 
     except Exception as e:
         print(f"Error fetching Tao dividends for subnet {netuid}: {e}")
-        return []
+        return DividendResult(dividend=[])
+
+async def stream_subnet_dividends(netuid, current_block, current_hash):
+    """
+    Streams the (hotkey, dividend) entries of a subnet as they are read, without holding
+    the whole map in memory.
+
+    A fresh cached subnet hash is scanned page by page with HSCAN. Otherwise the
+    `TaoDividendsPerSubnet` map is paged from the chain at the given block; every page is
+    also written to a staging hash of its own that replaces the cached hash once the scan
+    completes, so a finished stream leaves the cache warm. The generator only reads the
+    next page when the consumer asks for more rows, so a slow client slows the scan down
+    rather than buffering it; a substrate connection is only held while a page is read.
+
+    If another stream or refresh replaces the cached hash during the scan, the rest of
+    the map is read from the chain instead; the hotkeys already yielded are skipped.
+
+    Args:
+        netuid (int): The network ID.
+        current_block (int): The block number to read at.
+        current_hash (str): The hash of that block.
+
+    Yields:
+        tuple: `(hotkey, dividend)` for every entry of the subnet, once each.
+    """
+    redis = await get_redis_connection()
+    cache_key = subnet_cache_key(netuid)
+
+    # Serve a fresh cached hash without touching the chain
+    yielded = set()
+    block, ts = await redis.hmget(cache_key, [BLOCK_FIELD, TS_FIELD])
+    if block is not None and not cached_result(None, int(block), float(ts) if ts is not None else None, current_block).stale:
+        count_redis_lookup(True)
+        cursor = 0
+        while True:
+            # Read every page together with the block marker, so a hash renamed over the
+            # scanned one mid-scan is noticed before any of its entries are yielded
+            pipe = redis.pipeline(transaction=True)
+            pipe.hscan(cache_key, cursor, count=DIVIDEND_STREAM_PAGE_SIZE)
+            pipe.hget(cache_key, BLOCK_FIELD)
+            (cursor, page), page_block = await pipe.execute()
+            if page_block != block:
+                logger.info(f"Cached dividends of subnet {netuid} were replaced mid-scan; reading the rest from the chain.")
+                break
+            for hotkey, value in page.items():
+                # HSCAN may return an entry more than once
+                if hotkey not in (BLOCK_FIELD, TS_FIELD) and hotkey not in yielded:
+                    yielded.add(hotkey)
+                    yield hotkey, float(value)
+            if cursor == 0:
+                return
+    else:
+        count_redis_lookup(False)
+
+    # Every stream stages its own copy, so concurrent streams never mix or delete each other's pages
+    staging_key = f"{cache_key}:staging:{current_block}:{uuid.uuid4().hex}"
+    completed = False
+    try:
+        start_key = None
+        while True:
+            # Borrow a connection for one page only, so a slow client does not hold a pool slot
+            async with get_substrate_pool().connection() as substrate:
+                qmr = await substrate.query_map(
+                    "SubtensorModule",
+                    "TaoDividendsPerSubnet",
+                    [netuid],
+                    block_hash=current_hash,
+                    page_size=DIVIDEND_STREAM_PAGE_SIZE,
+                    max_results=DIVIDEND_STREAM_PAGE_SIZE,
+                    start_key=start_key,
+                )
+                page = {decode_account_id(k): v.value for k, v in qmr.records}
+                start_key = qmr.last_key
+
+            if page:
+                await redis.hset(staging_key, mapping=page)
+            for hotkey, value in page.items():
+                if hotkey not in yielded:
+                    yield hotkey, value
+            if len(page) < DIVIDEND_STREAM_PAGE_SIZE or start_key is None:
+                break
+
+        # Swap the complete map in place of the cached hash
+        pipe = redis.pipeline(transaction=True)
+        pipe.hset(staging_key, mapping={BLOCK_FIELD: current_block, TS_FIELD: time.time()})
+        pipe.rename(staging_key, cache_key)
+        pipe.expire(cache_key, DIVIDEND_CACHE_TTL)
+        await pipe.execute()
+        await dividend_local_cache.broadcast_invalidation([cache_key])
+        completed = True
+    finally:
+        # A client that disconnected mid-stream leaves an incomplete map behind
+        if not completed:
+            await redis.delete(staging_key)
+
+
+async def get_subnet_netuids():
+    """
+    Fetches the list of live subnets (netuids) from Redis, or from the blockchain if it
+    is not cached. The list is cached because subnets are registered rarely.
+
+    Returns:
+        list: The sorted list of registered netuids.
+    """
+    redis = await get_redis_connection()
+    cached_value = await redis.get(SUBNET_LIST_CACHE_KEY)
+    if cached_value:
+        return json.loads(cached_value)
+
+    netuids = []
+    async with get_substrate_pool().connection() as substrate:
+        block_hash = await substrate.get_chain_head()
+        async for netuid, added in await substrate.query_map("SubtensorModule", "NetworksAdded", block_hash=block_hash):
+            if getattr(added, "value", added):
+                netuids.append(int(getattr(netuid, "value", netuid)))
+    netuids.sort()
+
+    await redis.setex(SUBNET_LIST_CACHE_KEY, SUBNET_LIST_CACHE_TTL, json.dumps(netuids))
+    return netuids
+
+
+async def read_cached_address_dividends(address, netuids, current_block):
+    """
+    Reads every cached (netuid, address) dividend in a single pipeline.
+
+    Args:
+        address (str): The address whose Tao dividends are to be read.
+        netuids (list): The netuids to read.
+        current_block (int): The latest finalized block number.
+
+    Returns:
+        tuple: `(cached, missing)` - a mapping of netuid to `DividendResult` for the
+        cached values (possibly stale), and the netuids that are not cached at all.
+    """
+    redis = await get_redis_connection()
+    pipe = redis.pipeline(transaction=False)
+    for netuid in netuids:
+        queue_cached_dividend_reads(pipe, netuid, address)
+    replies = await pipe.execute()
+
+    cached = {}
+    missing = []
+    for i, netuid in enumerate(netuids):
+        entry = parse_cached_dividend(replies[2 * i], replies[2 * i + 1])
+        if entry is not None:
+            cached[netuid] = cached_result(*entry, current_block)
+        else:
+            missing.append(netuid)
+    return cached, missing
+
+
+async def recheck_address_dividends(address, netuids, current_block):
+    """
+    Returns the (netuid -> dividend) mapping for `netuids` if all of them are now freshly
+    cached, None otherwise. Used while another process fetches them.
+    """
+    cached, missing = await read_cached_address_dividends(address, netuids, current_block)
+    if missing or any(result.stale for result in cached.values()):
+        return None
+    return {netuid: result.dividend for netuid, result in cached.items()}
+
+
+async def fetch_address_dividends(address, netuids, current_block, current_hash):
+    """
+    Fetches the dividends of an address on the given subnets with a single multi-key
+    storage read at the given block and writes them to Redis with a single pipeline.
+
+    Args:
+        address (str): The address whose Tao dividends are to be fetched.
+        netuids (list): The netuids to fetch.
+        current_block (int): The block number to read at.
+        current_hash (str): The hash of that block.
+
+    Returns:
+        dict: A mapping of netuid to Tao dividend value.
+    """
+    # Query every requested key of the storage map at the current finalized block
+    async with get_substrate_pool().connection() as substrate:
+        storage_keys = await asyncio.gather(*[
+            substrate.create_storage_key("SubtensorModule", "TaoDividendsPerSubnet", [netuid, address], block_hash=current_hash)
+            for netuid in netuids
+        ])
+        results = await substrate.query_multi(storage_keys, block_hash=current_hash)
+    now = time.time()
+
+    # Keys absent from storage hold the default dividend of 0
+    fetched = {netuid: 0 for netuid in netuids}
+    for storage_key, result in results:
+        fetched[int(storage_key.params[0])] = getattr(result, "value", result) or 0
+
+    # Write the fetched values back to Redis in one pipeline
+    redis = await get_redis_connection()
+    pipe = redis.pipeline(transaction=False)
+    cache_keys = {netuid: point_cache_key(netuid, address) for netuid in fetched}
+    for netuid, value in fetched.items():
+        pipe.setex(cache_keys[netuid], DIVIDEND_CACHE_TTL, json.dumps({"value": value, "block": current_block, "ts": now}))
+    await pipe.execute()
+
+    # Other workers drop their older copies; this one keeps the values just read
+    await dividend_local_cache.broadcast_invalidation(list(cache_keys.values()))
+    for netuid, value in fetched.items():
+        remember_locally(cache_keys[netuid], value, current_block, now)
+    return fetched
+
 
 async def get_tao_dividends_for_address(address):
     """
-    Fetches the Tao dividends for a given address across multiple netuids (1 to 50).
-    It queries the blockchain for each netuid and returns the results.
-    
+    Fetches the Tao dividends for a given address across every live subnet.
+    Values are served from the in-process cache where possible; the rest (subnet hashes
+    or point keys) are read from Redis with a single pipeline. Stale values are served
+    and refreshed in the background; values missing from the cache are fetched from the
+    blockchain with a single multi-key storage read at the current finalized block and
+    written back with a single pipeline. Concurrent misses for the same address and
+    subnets share a single chain read.
+
     Args:
-        address (str): The address whose Tao dividends are to be fetched across multiple subnets.
+        address (str): The address whose Tao dividends are to be fetched across all subnets.
 
     Returns:
-        list: A list of futures containing Tao dividend values from each subnet (netuid).
+        DividendResult: A mapping of netuid to Tao dividend value, the oldest block any value was read at, and the freshness of the oldest value.
     """
     try:
-        # Create a list of asynchronous tasks to get the Tao dividends for each netuid (1 to 50)
-        results = [get_tao_dividend_from_netuid_address(i, address) for i in range(1, 51)]
-        # Wait for all the tasks to complete
-        return await asyncio.gather(*results)
+        current_block, current_hash = await get_current_block()
+        netuids = await get_subnet_netuids()
+
+        # Serve what we can from the in-process cache
+        results = {}
+        remote = []
+        for netuid in netuids:
+            local = read_local(point_cache_key(netuid, address), current_block)
+            if local is not None:
+                results[netuid] = local
+            else:
+                remote.append(netuid)
+
+        # Read every remaining cached (netuid, address) entry in one round trip
+        missing = []
+        stale = []
+        if remote:
+            cached, missing = await read_cached_address_dividends(address, remote, current_block)
+            for netuid, result in cached.items():
+                count_redis_lookup(not result.stale)
+                if not result.stale:
+                    remember_locally(point_cache_key(netuid, address), result.dividend, result.block, read_time(result))
+                    results[netuid] = result
+                elif DIVIDEND_CACHE_SWR:
+                    results[netuid] = result
+                    stale.append(netuid)
+                else:
+                    missing.append(netuid)
+            for netuid in missing:
+                count_redis_lookup(False)
+
+        # Serve stale values right away and refresh them in the background
+        if stale:
+            swr_stats["stale_served"] += 1
+            schedule_refresh(
+                f"tao_dividend:{address}:{','.join(map(str, stale))}@{current_block}",
+                lambda: fetch_address_dividends(address, stale, current_block, current_hash),
+            )
+
+        # Fetch the missing entries once per block, however many callers missed
+        if missing:
+            missing.sort()
+            fetched = await dividend_flights.do(
+                f"tao_dividend:{address}:{','.join(map(str, missing))}@{current_block}",
+                lambda: fetch_address_dividends(address, missing, current_block, current_hash),
+                recheck=lambda: recheck_address_dividends(address, missing, current_block),
+            )
+            for netuid, value in fetched.items():
+                results[netuid] = fetched_result(value, current_block)
+        elif not stale:
+            print("Fetched from Redis cache")
+
+        ages = [result.age for result in results.values() if result.age is not None]
+        return DividendResult(
+            dividend={netuid: results[netuid].dividend for netuid in sorted(results)},
+            block=min((result.block for result in results.values()), default=current_block),
+            cached=not missing,
+            stale=bool(stale),
+            age=max(ages, default=None),
+        )
 
     except Exception as e:
         print(f"Error fetching Tao dividends for address {address}: {e}")
-        return []
+        return DividendResult(dividend={})
+
+
+async def warm_subnet_dividends(netuid):
+    """
+    Refreshes the cached dividend map of a subnet unless it is fresh. Unlike
+    `get_tao_dividends_for_subnet`, a stale map is refreshed in the foreground and errors
+    propagate, so the cache warmer's concurrency budget covers the chain read.
+
+    Args:
+        netuid (int): The network ID.
+
+    Returns:
+        bool: True if the map was read from the chain, False if it was fresh already.
+    """
+    current_block, current_hash = await get_current_block()
+    if await read_cached_subnet_dividends(netuid, current_block, fresh_only=True) is not None:
+        return False
+    await dividend_flights.do(
+        f"{subnet_cache_key(netuid)}@{current_block}",
+        lambda: fetch_subnet_dividends(netuid, current_block, current_hash),
+        recheck=lambda: read_cached_subnet_dividends(netuid, current_block, fresh_only=True),
+    )
+    return True
+
+
+async def warm_address_dividends(address):
+    """
+    Refreshes the cached dividends of an address on every subnet where they are missing
+    or stale, in the foreground and letting errors propagate (see `warm_subnet_dividends`).
+
+    Args:
+        address (str): The address whose Tao dividends are refreshed.
+
+    Returns:
+        bool: True if any value was read from the chain, False if every value was fresh already.
+    """
+    current_block, current_hash = await get_current_block()
+    netuids = await get_subnet_netuids()
+    cached, missing = await read_cached_address_dividends(address, netuids, current_block)
+    outdated = sorted(missing + [netuid for netuid, result in cached.items() if result.stale])
+    if not outdated:
+        return False
+    await dividend_flights.do(
+        f"tao_dividend:{address}:{','.join(map(str, outdated))}@{current_block}",
+        lambda: fetch_address_dividends(address, outdated, current_block, current_hash),
+        recheck=lambda: recheck_address_dividends(address, outdated, current_block),
+    )
+    return True
+
+
+async def evict_outdated_local_entries(block_number, block_hash):
+    """
+    Block watcher listener: drop in-process entries read before the current block span.
+
+    Args:
+        block_number (int): The new finalized block number.
+        block_hash (str): The hash of that block.
+    """
+    dividend_local_cache.evict_older_than(span_start(block_number))
+
+
+def get_cache_tier_stats() -> dict:
+    """
+    Report hit/miss counters of every cache tier in front of the chain.
+
+    Returns:
+        dict: L1 (in-process) and Redis tier counters, stale-while-revalidate counters, and the number of chain fetches.
+    """
+    return {
+        "l1": dividend_local_cache.stats(),
+        "redis": dict(redis_tier_stats),
+        "stale_while_revalidate": {**swr_stats, "refreshes_in_flight": len(refresh_tasks)},
+        "chain": {"fetches": dividend_flights.leaders},
+    }
+
+
+def get_coalescing_stats() -> dict:
+    """
+    Report how many dividend cache misses were coalesced into shared chain queries.
+
+    Returns:
+        dict: Single-flight statistics of the dividend lookups.
+    """
+    return dividend_flights.stats()
@@ -0,0 +1,192 @@
+import asyncio
+import json
+import logging
+import time
+from async_substrate_interface.async_substrate import AsyncSubstrateInterface
+from bittensor.core.settings import SS58_FORMAT
+from redis_interface import get_redis_connection
+from substrate_pool import get_substrate_pool
+from config import SUBSTRATE_URL, BLOCK_MARKER_TTL, BLOCK_TIME_SECONDS, BLOCK_WATCHER_RECONNECT_DELAY
+
+# Set up logging for subscription lifecycle events
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Redis key holding the latest finalized block ({"number": ..., "hash": ...})
+CURRENT_BLOCK_KEY = "tao:current_block"
+
+# Redis pub/sub channel announcing every new finalized block
+NEW_BLOCK_CHANNEL = "tao:new_block"
+
+
+class BlockWatcher:
+    """
+    Follows finalized chain heads through a websocket subscription.
+
+    Every new finalized block is recorded locally, written to the Redis block marker
+    (so other processes see it) and published on `NEW_BLOCK_CHANNEL`. Registered
+    listeners are awaited with `(block_number, block_hash)` after each update.
+    """
+
+    def __init__(self, url: str = SUBSTRATE_URL, reconnect_delay: float = BLOCK_WATCHER_RECONNECT_DELAY):
+        self.url = url
+        self.reconnect_delay = reconnect_delay
+        self.block_number = None
+        self.block_hash = None
+        self.updated_at = None
+        self._latest_seen = None
+        self._new_head = None
+        self._listeners = []
+        self._tasks = []
+
+    def add_listener(self, callback):
+        """
+        Register an async callback invoked with `(block_number, block_hash)` on every new block.
+
+        Args:
+            callback (Callable): The coroutine function to call.
+        """
+        if callback not in self._listeners:
+            self._listeners.append(callback)
+
+    def is_fresh(self) -> bool:
+        """
+        Whether the locally known block was updated recently enough to be trusted.
+
+        Returns:
+            bool: True if a block is known and younger than `BLOCK_MARKER_TTL`.
+        """
+        return self.updated_at is not None and time.monotonic() - self.updated_at < BLOCK_MARKER_TTL
+
+    async def start(self):
+        """
+        Start the subscription and the task that publishes new heads.
+        """
+        if self._tasks:
+            return
+        self._new_head = asyncio.Event()
+        self._tasks = [
+            asyncio.create_task(self._subscription_loop()),
+            asyncio.create_task(self._publish_loop()),
+        ]
+        logger.info("Block watcher started.")
+
+    async def stop(self):
+        """
+        Cancel the subscription and publishing tasks.
+        """
+        for task in self._tasks:
+            task.cancel()
+        for task in self._tasks:
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        self._tasks = []
+        logger.info("Block watcher stopped.")
+
+    async def _subscription_loop(self):
+        """
+        Keep a dedicated websocket subscribed to finalized heads, reconnecting on failure.
+        """
+        while True:
+            substrate = AsyncSubstrateInterface(self.url, ss58_format=SS58_FORMAT)
+            try:
+                await substrate.initialize()
+                # Blocks until the handler returns a value, i.e. for as long as the socket lives
+                await substrate.subscribe_block_headers(self._on_header, finalized_only=True)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Finalized head subscription failed: {e}")
+            finally:
+                try:
+                    await substrate.close()
+                except Exception:
+                    pass
+            await asyncio.sleep(self.reconnect_delay)
+
+    async def _on_header(self, obj, *args):
+        """
+        Subscription handler: remember the newest block number and wake the publisher.
+        Returning None keeps the subscription open.
+        """
+        number = obj["header"]["number"]
+        if isinstance(number, str):
+            number = int(number, 16)
+        if self._latest_seen is None or number > self._latest_seen:
+            self._latest_seen = number
+            self._new_head.set()
+        return None
+
+    async def _publish_loop(self):
+        """
+        Resolve the hash of every new head, update the Redis marker and notify listeners.
+        Heads arriving while one is being processed are collapsed into the newest one.
+        """
+        while True:
+            await self._new_head.wait()
+            self._new_head.clear()
+            number = self._latest_seen
+            try:
+                async with get_substrate_pool().connection() as substrate:
+                    block_hash = await substrate.get_block_hash(number)
+                self.block_number, self.block_hash = number, block_hash
+                self.updated_at = time.monotonic()
+
+                redis = await get_redis_connection()
+                marker = json.dumps({"number": number, "hash": block_hash})
+                pipe = redis.pipeline(transaction=False)
+                pipe.setex(CURRENT_BLOCK_KEY, BLOCK_MARKER_TTL, marker)
+                pipe.publish(NEW_BLOCK_CHANNEL, marker)
+                await pipe.execute()
+            except Exception as e:
+                logger.error(f"Failed to record finalized block {number}: {e}")
+                continue
+
+            for callback in self._listeners:
+                try:
+                    await callback(number, block_hash)
+                except Exception as e:
+                    logger.error(f"Block listener {callback} failed on block {number}: {e}")
+
+
+# Process-wide watcher started in the app lifespan
+block_watcher = BlockWatcher()
+
+
+def get_block_watcher() -> BlockWatcher:
+    """
+    Return the process-wide block watcher.
+
+    Returns:
+        BlockWatcher: The shared watcher instance.
+    """
+    return block_watcher
+
+
+async def get_current_block():
+    """
+    Return the latest finalized block known to the service.
+
+    The in-process watcher is used when it is running; otherwise the Redis marker
+    written by any watcher is read; as a last resort the finalized head is fetched from
+    the chain and written to the marker, for one block time, for other callers.
+
+    Returns:
+        tuple: `(block_number, block_hash)` of the latest finalized block.
+    """
+    if block_watcher.is_fresh():
+        return block_watcher.block_number, block_watcher.block_hash
+
+    redis = await get_redis_connection()
+    marker = await redis.get(CURRENT_BLOCK_KEY)
+    if marker:
+        marker = json.loads(marker)
+        return marker["number"], marker["hash"]
+
+    async with get_substrate_pool().connection() as substrate:
+        block_hash = await substrate.get_chain_finalised_head()
+        number = await substrate.get_block_number(block_hash)
+    await redis.set(CURRENT_BLOCK_KEY, json.dumps({"number": number, "hash": block_hash}), ex=BLOCK_TIME_SECONDS, nx=True)
+    return number, block_hash
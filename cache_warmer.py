@@ -0,0 +1,169 @@
+import asyncio
+import logging
+import time
+from redis_interface import get_redis_connection
+from substrate_pool import get_substrate_pool
+from bittensor_interface import warm_subnet_dividends, warm_address_dividends
+from config import (
+    BLOCK_TIME_SECONDS,
+    WARM_NETUIDS,
+    WARM_HOTKEYS,
+    WARM_RECENT_WINDOW,
+    WARM_RECENT_LIMIT,
+    WARM_CONCURRENCY,
+    WARM_MAX_POOL_UTILIZATION,
+)
+
+# Set up logging for warm-up runs
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Redis sorted sets of recently requested netuids / hotkeys, scored by last request time
+RECENT_NETUIDS_KEY = "tao:recent_requests:netuids"
+RECENT_HOTKEYS_KEY = "tao:recent_requests:hotkeys"
+
+
+async def record_request(netuid, hotkey):
+    """
+    Remember which subnet / hotkey a dividend request asked for, so the warmer can keep
+    it hot. Meant to run as a background task after the response is sent.
+
+    Args:
+        netuid (int): The requested netuid, or None.
+        hotkey (str): The requested hotkey, or None.
+    """
+    try:
+        redis = await get_redis_connection()
+        now = time.time()
+        pipe = redis.pipeline(transaction=False)
+        if netuid is not None:
+            # Subnet-wide warm-up also serves every point lookup on the subnet
+            pipe.zadd(RECENT_NETUIDS_KEY, {str(netuid): now})
+        elif hotkey is not None:
+            pipe.zadd(RECENT_HOTKEYS_KEY, {hotkey: now})
+        await pipe.execute()
+    except Exception as e:
+        logger.warning(f"Failed to record dividend request for warm-up: {e}")
+
+
+class CacheWarmer:
+    """
+    Refreshes dividend caches for configured and recently requested subnets and hotkeys
+    on every new finalized block.
+
+    Only one worker warms a given block (guarded by a Redis key), at most one run is in
+    progress per process, and jobs are throttled by a concurrency budget and by the
+    substrate pool's utilization so user-facing queries always have capacity.
+    """
+
+    def __init__(self):
+        self._semaphore = asyncio.Semaphore(WARM_CONCURRENCY)
+        self._run_task = None
+        self.runs = 0
+        self.skipped_blocks = 0
+        self.warmed = 0
+        self.already_fresh = 0
+        self.failed = 0
+        self.deferred = 0
+        self.last_block = None
+        self.last_duration = None
+
+    async def on_new_block(self, block_number, block_hash):
+        """
+        Block watcher listener: start a warm-up run for the new block unless one is still running.
+
+        Args:
+            block_number (int): The new finalized block number.
+            block_hash (str): The hash of that block.
+        """
+        if self._run_task is not None and not self._run_task.done():
+            self.skipped_blocks += 1
+            return
+        self._run_task = asyncio.create_task(self._run(block_number))
+
+    async def stop(self):
+        """
+        Cancel the warm-up run in progress, if any.
+        """
+        if self._run_task is not None:
+            self._run_task.cancel()
+            try:
+                await self._run_task
+            except asyncio.CancelledError:
+                pass
+            self._run_task = None
+
+    async def _targets(self, redis):
+        """
+        Collect the netuids and hotkeys to warm: the configured ones plus those requested
+        within the recent-traffic window.
+        """
+        since = time.time() - WARM_RECENT_WINDOW
+        pipe = redis.pipeline(transaction=False)
+        pipe.zremrangebyscore(RECENT_NETUIDS_KEY, "-inf", since)
+        pipe.zremrangebyscore(RECENT_HOTKEYS_KEY, "-inf", since)
+        pipe.zrevrange(RECENT_NETUIDS_KEY, 0, WARM_RECENT_LIMIT - 1)
+        pipe.zrevrange(RECENT_HOTKEYS_KEY, 0, WARM_RECENT_LIMIT - 1)
+        _, _, recent_netuids, recent_hotkeys = await pipe.execute()
+
+        netuids = list(dict.fromkeys(WARM_NETUIDS + [int(netuid) for netuid in recent_netuids]))
+        hotkeys = list(dict.fromkeys(WARM_HOTKEYS + recent_hotkeys))
+        return netuids, hotkeys
+
+    async def _run(self, block_number):
+        redis = await get_redis_connection()
+        # Let exactly one worker warm each block
+        if not await redis.set(f"tao:warmer:{block_number}", 1, ex=BLOCK_TIME_SECONDS * 2, nx=True):
+            return
+
+        started = time.monotonic()
+        netuids, hotkeys = await self._targets(redis)
+        # Refresh in the foreground so the chain reads stay within the budget below
+        jobs = [(warm_subnet_dividends, netuid) for netuid in netuids]
+        jobs += [(warm_address_dividends, hotkey) for hotkey in hotkeys]
+        await asyncio.gather(*[self._warm(fetch, arg) for fetch, arg in jobs])
+
+        self.runs += 1
+        self.last_block = block_number
+        self.last_duration = time.monotonic() - started
+        logger.info(f"Warmed {len(netuids)} subnet(s) and {len(hotkeys)} hotkey(s) for block {block_number} in {self.last_duration:.2f}s")
+
+    async def _warm(self, fetch, arg):
+        """
+        Run one warm-up job within the concurrency budget, backing off while the substrate
+        pool is busy with user-facing queries.
+        """
+        async with self._semaphore:
+            while get_substrate_pool().utilization() >= WARM_MAX_POOL_UTILIZATION:
+                self.deferred += 1
+                await asyncio.sleep(0.1)
+            try:
+                if await fetch(arg):
+                    self.warmed += 1
+                else:
+                    self.already_fresh += 1
+            except Exception as e:
+                self.failed += 1
+                logger.error(f"Cache warm-up job failed: {e}")
+
+    def stats(self) -> dict:
+        """
+        Report warm-up activity.
+
+        Returns:
+            dict: Runs, skipped blocks, jobs warmed / already fresh / failed / deferred, and the last run's block and duration.
+        """
+        return {
+            "runs": self.runs,
+            "skipped_blocks": self.skipped_blocks,
+            "warmed": self.warmed,
+            "already_fresh": self.already_fresh,
+            "failed": self.failed,
+            "deferred": self.deferred,
+            "last_block": self.last_block,
+            "last_duration_seconds": self.last_duration,
+        }
+
+
+# Process-wide warmer registered as a block watcher listener in the app lifespan
+cache_warmer = CacheWarmer()
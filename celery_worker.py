@@ -1,27 +1,148 @@
-from celery import Celery
+from celery import Celery, chord, group
+from celery.signals import worker_process_shutdown
 import asyncio
 import logging
-from sentiment_task import start_sentiment_analysis_periodically
+import threading
+import uuid
+from sentiment_task import (
+    analyze_sentiment,
+    acquire_refresh_lock,
+    release_refresh_lock,
+    fetch_new_tweets,
+    score_tweet_chunk,
+    aggregate_sentiment,
+)
+from trade_jobs import run_trade_job
+from database import trading_log_writer
+from chutes_ai_interface import get_chutes_client
+from config import (
+    CELERY_BROKER_URL,
+    CELERY_RESULT_BACKEND,
+    SENTIMENT_REFRESH_SECONDS,
+    SENTIMENT_CHUNK_SIZE,
+    TWEET_INGEST_INCREMENTAL,
+)
 
-# Create a Celery instance. Redis is used as both the message broker and result backend.
-app = Celery('tasks', broker='redis://localhost:6379/0', backend='redis://localhost:6379/0')
+# Create a Celery instance. Redis is used as both the message broker and result backend by default.
+app = Celery('tasks', broker=CELERY_BROKER_URL, backend=CELERY_RESULT_BACKEND)
+
+# Refresh sentiment on a fixed cadence; run `celery -A celery_worker beat` next to the workers
+app.conf.beat_schedule = {
+    "refresh-sentiment": {
+        "task": "celery_worker.refresh_sentiment",
+        "schedule": SENTIMENT_REFRESH_SECONDS,
+    },
+}
+
+# Redeliver a task whose worker died mid-run; the sentiment steps are idempotent
+app.conf.task_acks_late = True
+app.conf.worker_prefetch_multiplier = 1
 
 # Set up logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Event loop of this worker process, running in a background thread. Tasks submit their
+# coroutines to it so that the Redis / substrate pools and HTTP clients survive across tasks.
+worker_loop = None
+worker_loop_lock = threading.Lock()
+
+
+def get_worker_loop() -> asyncio.AbstractEventLoop:
+    """
+    Return this process's event loop, starting it on first use (i.e. after the fork).
+
+    Returns:
+        asyncio.AbstractEventLoop: The running loop shared by every task of the process.
+    """
+    global worker_loop
+    with worker_loop_lock:
+        if worker_loop is None or worker_loop.is_closed():
+            worker_loop = asyncio.new_event_loop()
+            threading.Thread(target=worker_loop.run_forever, name="celery-asyncio", daemon=True).start()
+    return worker_loop
+
+
+def run_async(coroutine):
+    """
+    Run a coroutine on the worker's event loop and wait for its result.
+    """
+    return asyncio.run_coroutine_threadsafe(coroutine, get_worker_loop()).result()
+
+
+@worker_process_shutdown.connect
+def drain_trading_logs(**kwargs):
+    """
+    Write the buffered trading logs of this process before it exits, and close the HTTP
+    client bound to the worker loop.
+    """
+    if worker_loop is not None and not worker_loop.is_closed():
+        run_async(trading_log_writer.close())
+        run_async(get_chutes_client().close())
+
+
+@app.task
+def refresh_sentiment():
+    """
+    Entry point of a sentiment refresh, triggered by beat.
+
+    Takes the refresh lock (skipping the run if the previous one is still going), ingests
+    new tweets, then fans the scoring out as one task per `SENTIMENT_CHUNK_SIZE` tweets
+    across every worker, with `aggregate_sentiment_task` as the chord callback that
+    publishes the index and releases the lock.
+    """
+    token = uuid.uuid4().hex
+    if not run_async(acquire_refresh_lock(token)):
+        logger.info("A sentiment refresh is already running. Skipping this one.")
+        return
+
+    try:
+        if not TWEET_INGEST_INCREMENTAL:
+            run_async(analyze_sentiment())
+            run_async(release_refresh_lock(token))
+            return
+
+        ids = run_async(fetch_new_tweets())
+        chunks = [ids[i:i + SENTIMENT_CHUNK_SIZE] for i in range(0, len(ids), SENTIMENT_CHUNK_SIZE)]
+        logger.info(f"Scoring {len(ids)} tweets in {len(chunks)} chunk(s).")
+        if not chunks:
+            aggregate_sentiment_task.delay([], token)
+            return
+        chord(group(score_chunk_task.s(chunk) for chunk in chunks))(aggregate_sentiment_task.s(token))
+    except Exception as e:
+        logger.error(f"An error occurred during sentiment refresh: {e}")
+        run_async(release_refresh_lock(token))
+        raise
+
+
 @app.task
-def perform_sentiment_analysis():
+def score_chunk_task(ids):
     """
-    This Celery task is responsible for running the sentiment analysis in a periodic manner.
-    It invokes the `start_sentiment_analysis_periodically()` function that fetches and analyzes tweets.
-    
-    We wrap the async call to `start_sentiment_analysis_periodically()` using `asyncio.run()`.
+    Score one chunk of tweets. Failures are logged and reported as 0 scored tweets so
+    that one bad chunk does not prevent the index from being published.
     """
     try:
-        # Run the async task with asyncio.run, which handles the event loop properly
-        logger.info("Starting sentiment analysis task.")
-        asyncio.run(start_sentiment_analysis_periodically())  # Run the async task synchronously
-        logger.info("Sentiment analysis task completed successfully.")
+        return run_async(score_tweet_chunk(ids))
     except Exception as e:
-        logger.error(f"An error occurred during sentiment analysis: {e}")
+        logger.error(f"An error occurred while scoring a chunk of {len(ids)} tweets: {e}")
+        return 0
+
+
+@app.task
+def aggregate_sentiment_task(scored_counts, token):
+    """
+    Chord callback: recompute and publish the sentiment index, then release the refresh lock.
+    """
+    try:
+        logger.info(f"Scored {sum(scored_counts)} tweets. Aggregating sentiment.")
+        run_async(aggregate_sentiment())
+    finally:
+        run_async(release_refresh_lock(token))
+
+
+@app.task
+def execute_trade_task(job_id):
+    """
+    Execute a trade job queued by the dividends endpoint.
+    """
+    run_async(run_trade_job(job_id))
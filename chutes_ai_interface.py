@@ -1,65 +1,469 @@
-import requests
+import asyncio
+import httpx
 import json
-import os
 import logging
+import random
 import re
-from config import CHUTES_API_KEY
-
-# Set API endpoint and token
-def analyze_tweet(tweet):
-    url = "https://llm.chutes.ai/v1/chat/completions"
-    
-    # Define headers
-    headers = {
-        "Authorization": f"Bearer {CHUTES_API_KEY}",
-        "Content-Type": "application/json"
-    }
-    
-    # Define payload
-    data = {
-        "model": "unsloth/Llama-3.2-3B-Instruct",
-        "messages": [
-            {
-                "role": "user", 
-                "content": f"Evaluate positive or negative score within a range of -100 to 100 for Bittensor trading from following text: {tweet}"
-            }
-        ],
-        "stream": False,
-        "max_tokens": 1024,
-        "temperature": 0.7
-    }
-    
-    try:
-        # Make the POST request
-        response = requests.post(url, headers=headers, json=data, stream=True)
-        
-        # Check if the request was successful (status code 200)
-        if response.status_code == 200:
-            result = response.json()
-            # Extract useful data
-            text = result.get("choices", [{}])[0].get("message", {}).get("content", "")
-            
-            # If there's no content in the response, log and return default score
-            if not text:
-                logging.warning(f"No content returned from Chutes API for tweet: {tweet}")
-                return 0
-            
-            # Use regex to extract numbers from the response text
-            pattern = r'-?\b\d+(\.\d+)?\b'
-            numbers = re.findall(pattern, text)
-            filtered_numbers = [float(num) for num in numbers if -100 <= float(num) <= 100]
-            
-            # Return the first valid number or 0 if no valid number found
-            if filtered_numbers:
-                return filtered_numbers[0]
-            else:
-                logging.warning(f"No valid sentiment score found in response: {text}")
-                return 0
+import time
+from rate_limiter import RedisTokenBucket
+from redis_interface import incr_shared_stats, get_shared_stats
+from config import (
+    CHUTES_API_KEY,
+    CHUTES_API_URL,
+    CHUTES_MODEL,
+    CHUTES_HTTP2,
+    CHUTES_MAX_CONNECTIONS,
+    CHUTES_CONNECT_TIMEOUT,
+    CHUTES_READ_TIMEOUT,
+    CHUTES_MAX_RETRIES,
+    CHUTES_BACKOFF_BASE,
+    CHUTES_BACKOFF_MAX,
+    CHUTES_RATE_LIMIT,
+    CHUTES_RATE_BURST,
+    SENTIMENT_BATCH_SIZE,
+)
+
+# Set up logging for request failures and retries
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Status codes worth retrying: rate limited or a transient server-side failure
+RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504}
+
+# Prompt shared by the single-tweet and batched scoring modes
+SCORING_INSTRUCTION = "Evaluate positive or negative score within a range of -100 to 100 for Bittensor trading from following text"
+
+# Bump whenever the scoring prompts change, so cached scores are not reused across prompts
+SCORING_PROMPT_VERSION = 1
+
+# Scoring modes compared by the usage counters: the batched path against the single-tweet one
+SCORING_MODES = ("single", "batch")
+
+# Redis hash of the tokens, latency and outcome of each scoring mode, for every process
+SCORING_USAGE_KEY = "tao:sentiment_usage"
+
+# Redis hash of the request counters of every process using the Chutes client
+CHUTES_STATS_KEY = "tao:chutes_client_stats"
+
+
+class ChutesError(Exception):
+    """
+    Raised when a completion could not be obtained from the Chutes API.
+    """
+
+
+class ChutesClient:
+    """
+    Async client for the Chutes chat completions API.
+
+    A single pooled `httpx.AsyncClient` (optionally HTTP/2) is shared by every request of
+    the process, so connections are kept alive and reused. Requests are rate limited by a
+    token bucket matching the Chutes quota, shared by every process through Redis, and retried with jittered exponential backoff
+    on 429 / 5xx responses and network errors. Request counters are also added up in
+    Redis, since completions are requested by the Celery worker while metrics are served
+    by the API.
+    """
+
+    def __init__(self, url: str = CHUTES_API_URL, api_key: str = CHUTES_API_KEY):
+        self.url = url
+        self.api_key = api_key
+        self.rate_limiter = RedisTokenBucket("chutes", CHUTES_RATE_LIMIT, CHUTES_RATE_BURST)
+        self._client = None
+        self._loop = None
+        self.requests = 0
+        self.retries = 0
+        self.failures = 0
+
+    def _get_client(self) -> httpx.AsyncClient:
+        """
+        Return the shared HTTP client, creating it on first use.
+
+        The client is bound to the event loop it was created on; a process that runs
+        several loops one after another gets a fresh client per loop, and the client of the
+        previous loop is closed so its pooled sockets are not leaked.
+        """
+        loop = asyncio.get_running_loop()
+        if self._client is not None and self._loop is not loop:
+            self._discard_client(self._client, self._loop)
+            self._client = None
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                http2=CHUTES_HTTP2,
+                headers={
+                    "Authorization": f"Bearer {self.api_key}",
+                    "Content-Type": "application/json"
+                },
+                timeout=httpx.Timeout(CHUTES_READ_TIMEOUT, connect=CHUTES_CONNECT_TIMEOUT),
+                limits=httpx.Limits(max_connections=CHUTES_MAX_CONNECTIONS, max_keepalive_connections=CHUTES_MAX_CONNECTIONS),
+            )
+            self._loop = loop
+        return self._client
+
+    @staticmethod
+    def _discard_client(client: httpx.AsyncClient, loop: asyncio.AbstractEventLoop):
+        """
+        Close a client created on another event loop, on that loop.
+        """
+        if loop.is_running():
+            # The loop runs in another thread: let it close its own sockets
+            asyncio.run_coroutine_threadsafe(client.aclose(), loop)
         else:
-            # If the request fails, log the error and return default score
-            logging.error(f"Error: Received status code {response.status_code} from Chutes API for tweet: {tweet}")
-            return 0
-    except requests.exceptions.RequestException as e:
-        # Handle network-related errors
-        logging.error(f"RequestException occurred: {e} while processing tweet: {tweet}")
-        return 0
+            # A stopped loop cannot be driven from inside the current one; close clients
+            # with `close()` before their loop ends (see the Celery worker shutdown hook)
+            logger.warning("Dropped a Chutes HTTP client whose event loop is no longer running.")
+
+    async def close(self):
+        """
+        Close the pooled connections.
+        """
+        client, self._client = self._client, None
+        if client is not None:
+            await client.aclose()
+
+    @staticmethod
+    def _backoff(attempt: int, response=None) -> float:
+        """
+        Seconds to wait before the next attempt: the server's Retry-After if given,
+        otherwise exponential backoff with full jitter.
+        """
+        retry_after = response.headers.get("Retry-After") if response is not None else None
+        if retry_after is not None:
+            try:
+                return min(float(retry_after), CHUTES_BACKOFF_MAX)
+            except ValueError:
+                pass
+        return random.uniform(0, min(CHUTES_BACKOFF_MAX, CHUTES_BACKOFF_BASE * 2 ** attempt))
+
+    @staticmethod
+    def _parse_completion(response) -> tuple:
+        """
+        Extract the text of the first choice and the token usage from a successful response.
+
+        Raises:
+            ChutesError: If the body is not the expected JSON object.
+        """
+        try:
+            result = response.json()
+            choices = result.get("choices") or [{}]
+            text = (choices[0].get("message") or {}).get("content") or ""
+            usage = result.get("usage") or {}
+        except (ValueError, AttributeError, TypeError, httpx.HTTPError) as e:
+            raise ChutesError(f"Malformed response from Chutes API: {e!r}") from e
+        return text, usage
+
+    async def complete(self, messages: list, max_tokens: int = 1024, temperature: float = 0.7) -> str:
+        """
+        Request a chat completion and return the text of the first choice.
+
+        Args:
+            messages (list): The chat messages to send.
+            max_tokens (int): Maximum number of tokens to generate.
+            temperature (float): Sampling temperature.
+
+        Returns:
+            str: The completion text (empty if the API returned none).
+
+        Raises:
+            ChutesError: If the request still fails after `CHUTES_MAX_RETRIES` retries or is rejected.
+        """
+        text, _ = await self.complete_with_usage(messages, max_tokens, temperature)
+        return text
+
+    async def complete_with_usage(self, messages: list, max_tokens: int = 1024, temperature: float = 0.7):
+        """
+        Request a chat completion and return the text of the first choice together with
+        the token usage reported by the API.
+
+        Args:
+            messages (list): The chat messages to send.
+            max_tokens (int): Maximum number of tokens to generate.
+            temperature (float): Sampling temperature.
+
+        Returns:
+            tuple: `(text, usage)` - the completion text (empty if the API returned none) and the `usage` object (empty if absent).
+
+        Raises:
+            ChutesError: If the request still fails after `CHUTES_MAX_RETRIES` retries, is rejected or gets a malformed answer.
+        """
+        data = {
+            "model": CHUTES_MODEL,
+            "messages": messages,
+            "stream": False,
+            "max_tokens": max_tokens,
+            "temperature": temperature
+        }
+        client = self._get_client()
+        counters = {"requests": 0, "retries": 0, "failures": 0}
+        try:
+            for attempt in range(CHUTES_MAX_RETRIES + 1):
+                await self.rate_limiter.acquire()
+                counters["requests"] += 1
+                response = None
+                try:
+                    response = await client.post(self.url, json=data)
+                except httpx.TransportError as e:
+                    error = repr(e)
+                except httpx.HTTPError as e:
+                    counters["failures"] += 1
+                    raise ChutesError(f"Chutes request failed: {e!r}") from e
+                else:
+                    if response.status_code == 200:
+                        try:
+                            return self._parse_completion(response)
+                        except ChutesError:
+                            counters["failures"] += 1
+                            raise
+                    if response.status_code not in RETRYABLE_STATUS_CODES:
+                        counters["failures"] += 1
+                        raise ChutesError(f"Received status code {response.status_code} from Chutes API")
+                    error = f"status code {response.status_code}"
+
+                if attempt < CHUTES_MAX_RETRIES:
+                    delay = self._backoff(attempt, response)
+                    logger.warning(f"Chutes request failed ({error}), retrying in {delay:.2f}s")
+                    counters["retries"] += 1
+                    await asyncio.sleep(delay)
+
+            counters["failures"] += 1
+            raise ChutesError(f"Chutes request failed after {CHUTES_MAX_RETRIES} retries ({error})")
+        finally:
+            self.requests += counters["requests"]
+            self.retries += counters["retries"]
+            self.failures += counters["failures"]
+            await incr_shared_stats(CHUTES_STATS_KEY, counters)
+
+    async def stats(self) -> dict:
+        """
+        Report request, retry and rate limiting counters.
+
+        Returns:
+            dict: Requests sent, retries and failed completions of every process, those of this process, and token bucket statistics.
+        """
+        shared = await get_shared_stats(CHUTES_STATS_KEY)
+        return {
+            "requests": shared.get("requests", 0),
+            "retries": shared.get("retries", 0),
+            "failures": shared.get("failures", 0),
+            "this_process": {"requests": self.requests, "retries": self.retries, "failures": self.failures},
+            "rate_limiter": self.rate_limiter.stats(),
+        }
+
+
+# Process-wide client shared by every sentiment request
+chutes_client = ChutesClient()
+
+
+def get_chutes_client() -> ChutesClient:
+    """
+    Return the process-wide Chutes client.
+
+    Returns:
+        ChutesClient: The shared client instance.
+    """
+    return chutes_client
+
+
+def parse_score(text):
+    """
+    Extract a sentiment score in the range -100 to 100 from a completion.
+
+    Args:
+        text (str): The completion text.
+
+    Returns:
+        float: The first number within the range, or None if there is none.
+    """
+    # Use regex to extract numbers from the response text
+    pattern = r'-?\b\d+(?:\.\d+)?\b'
+    numbers = re.findall(pattern, text)
+    filtered_numbers = [float(num) for num in numbers if -100 <= float(num) <= 100]
+
+    # Return the first valid number; no number means no score, not a neutral one
+    if filtered_numbers:
+        return filtered_numbers[0]
+    logger.warning(f"No valid sentiment score found in response: {text}")
+    return None
+
+
+async def record_usage(mode, tweets, usage, seconds):
+    """
+    Add a scoring request to the usage counters of its mode.
+    """
+    await incr_shared_stats(SCORING_USAGE_KEY, {
+        f"{mode}:requests": 1,
+        f"{mode}:tweets": tweets,
+        f"{mode}:prompt_tokens": usage.get("prompt_tokens", 0),
+        f"{mode}:completion_tokens": usage.get("completion_tokens", 0),
+        f"{mode}:seconds": float(seconds),
+    })
+
+
+async def analyze_tweet(tweet, timeout=None):
+    """
+    Score the sentiment of a tweet towards Bittensor trading with the Chutes LLM.
+
+    Args:
+        tweet (str): The tweet text.
+        timeout (float, optional): Seconds before the request is abandoned.
+
+    Returns:
+        float: A score between -100 (negative) and 100 (positive); None if the model gave no usable answer.
+
+    Raises:
+        ChutesError: If the Chutes API could not be reached.
+        asyncio.TimeoutError: If the request took longer than `timeout`.
+    """
+    started = time.monotonic()
+    text, usage = await asyncio.wait_for(get_chutes_client().complete_with_usage([
+        {
+            "role": "user",
+            "content": f"{SCORING_INSTRUCTION}: {tweet}"
+        }
+    ]), timeout)
+    await record_usage("single", 1, usage, time.monotonic() - started)
+
+    # If there's no content in the response, log and leave the tweet unscored
+    if not text:
+        logger.warning(f"No content returned from Chutes API for tweet: {tweet}")
+        return None
+    return parse_score(text)
+
+
+def parse_batch_scores(text, count):
+    """
+    Extract the JSON array of scores returned for a batch of tweets.
+
+    Args:
+        text (str): The completion text.
+        count (int): The number of tweets in the batch.
+
+    Returns:
+        list: One score per tweet, in order, or None if the answer is not a valid array of `count` scores in range.
+    """
+    match = re.search(r'\[.*?\]', text or "", re.DOTALL)
+    if match is None:
+        return None
+    try:
+        scores = json.loads(match.group(0))
+    except ValueError:
+        return None
+    if not isinstance(scores, list) or len(scores) != count:
+        return None
+    if not all(isinstance(score, (int, float)) and not isinstance(score, bool) and -100 <= score <= 100 for score in scores):
+        return None
+    return [float(score) for score in scores]
+
+
+async def analyze_tweets(tweets, batch_size=SENTIMENT_BATCH_SIZE, timeout=None, return_exceptions=False):
+    """
+    Score several tweets with as few completions as possible.
+
+    Tweets are packed `batch_size` at a time into one prompt asking for a JSON array of
+    scores, so the instruction is paid for once per batch instead of once per tweet. A
+    batch whose answer cannot be mapped back to its tweets (or whose request fails or
+    times out) is rescored tweet by tweet.
+
+    Args:
+        tweets (list): The tweet texts.
+        batch_size (int): Tweets per completion; 1 uses the single-tweet path.
+        timeout (float, optional): Seconds before a single request (one tweet or one batch) is abandoned.
+        return_exceptions (bool): Return the error of a tweet that could not be scored instead of None.
+
+    Returns:
+        list: One score per tweet, in order; None (or the error) for tweets that could not be scored.
+    """
+    if batch_size <= 1 or len(tweets) == 1:
+        results = await asyncio.gather(*[analyze_tweet(tweet, timeout) for tweet in tweets], return_exceptions=True)
+    else:
+        batches = [tweets[i:i + batch_size] for i in range(0, len(tweets), batch_size)]
+        results = []
+        batch_results = await asyncio.gather(*[analyze_batch(batch, timeout) for batch in batches], return_exceptions=True)
+        for batch, scores in zip(batches, batch_results):
+            # A batch that failed unexpectedly does not take the other batches down with it
+            if isinstance(scores, Exception):
+                logger.error(f"Batched scoring failed, rescoring {len(batch)} tweets one by one: {scores!r}")
+                scores = await rescore_tweets(batch, timeout)
+            results.extend(scores)
+
+    scores = []
+    for tweet, result in zip(tweets, results):
+        if isinstance(result, Exception):
+            logger.error(f"Failed to score tweet: {result!r}")
+            if not return_exceptions:
+                result = None
+        scores.append(result)
+    return scores
+
+
+async def analyze_batch(tweets, timeout=None):
+    """
+    Score one batch of tweets with a single completion, falling back to per-tweet calls.
+
+    Args:
+        tweets (list): The tweet texts of the batch.
+        timeout (float, optional): Seconds before the batched request, and then each per-tweet request, is abandoned.
+
+    Returns:
+        list: One score or exception per tweet, in order.
+    """
+    numbered = "\n".join(f"{i + 1}. {json.dumps(tweet)}" for i, tweet in enumerate(tweets))
+    prompt = (
+        f"{SCORING_INSTRUCTION}s. Answer with only a JSON array of {len(tweets)} numbers, "
+        f"one score per text, in the same order:\n{numbered}"
+    )
+
+    started = time.monotonic()
+    try:
+        text, usage = await asyncio.wait_for(get_chutes_client().complete_with_usage(
+            [{"role": "user", "content": prompt}],
+            max_tokens=16 * len(tweets) + 32,
+            temperature=0,
+        ), timeout)
+        scores = parse_batch_scores(text, len(tweets))
+        await record_usage("batch", len(tweets), usage, time.monotonic() - started)
+        if scores is not None:
+            return scores
+        logger.warning(f"Could not map the batched answer back to {len(tweets)} tweets: {text}")
+    except ChutesError as e:
+        logger.warning(f"Batched scoring request failed: {e}")
+    except asyncio.TimeoutError:
+        logger.warning(f"Batched scoring request timed out after {timeout}s.")
+
+    return await rescore_tweets(tweets, timeout)
+
+
+async def rescore_tweets(tweets, timeout=None):
+    """
+    Score the tweets of a batch whose batched answer was unusable, one request per tweet.
+
+    Args:
+        tweets (list): The tweet texts of the batch.
+        timeout (float, optional): Seconds before each request is abandoned.
+
+    Returns:
+        list: One score or exception per tweet, in order.
+    """
+    await incr_shared_stats(SCORING_USAGE_KEY, {"batch_fallbacks": 1})
+    return await asyncio.gather(*[analyze_tweet(tweet, timeout) for tweet in tweets], return_exceptions=True)
+
+
+async def get_scoring_usage() -> dict:
+    """
+    Report tokens and latency per scored tweet for the single-tweet and batched modes,
+    across every process.
+
+    Returns:
+        dict: Per-mode request / tweet counts, tokens and seconds per tweet, and the number of batch fallbacks.
+    """
+    counters = await get_shared_stats(SCORING_USAGE_KEY)
+    report = {"batch_size": SENTIMENT_BATCH_SIZE, "batch_fallbacks": counters.get("batch_fallbacks", 0)}
+    for mode in SCORING_MODES:
+        tweets = counters.get(f"{mode}:tweets", 0)
+        tokens = counters.get(f"{mode}:prompt_tokens", 0) + counters.get(f"{mode}:completion_tokens", 0)
+        report[mode] = {
+            "requests": counters.get(f"{mode}:requests", 0),
+            "tweets": tweets,
+            "tokens_per_tweet": tokens / (tweets or 1),
+            "seconds_per_tweet": counters.get(f"{mode}:seconds", 0.0) / (tweets or 1),
+        }
+    return report
@@ -29,6 +29,137 @@ CHUTES_API_KEY = os.getenv("CHUTES_API_KEY")
 TESTNET_WALLET_MNE = os.getenv("TESTNET_WALLET_MNE")
 ACCESS_TOKEN_EXPIRE_MINUTES = os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", "60")  # Default to 60 minutes
 
+# Redis connection pool settings
+REDIS_MAX_CONNECTIONS = int(os.getenv("REDIS_MAX_CONNECTIONS", "50"))  # Upper bound on pooled connections per process
+REDIS_POOL_TIMEOUT = float(os.getenv("REDIS_POOL_TIMEOUT", "5"))  # Seconds to wait for a free connection
+REDIS_SOCKET_TIMEOUT = float(os.getenv("REDIS_SOCKET_TIMEOUT", "5"))  # Seconds before a Redis command times out
+REDIS_SOCKET_CONNECT_TIMEOUT = float(os.getenv("REDIS_SOCKET_CONNECT_TIMEOUT", "5"))  # Seconds to establish a connection
+REDIS_HEALTH_CHECK_INTERVAL = int(os.getenv("REDIS_HEALTH_CHECK_INTERVAL", "30"))  # Seconds between idle connection pings
+REDIS_PUBSUB_MAX_CONNECTIONS = int(os.getenv("REDIS_PUBSUB_MAX_CONNECTIONS", "16"))  # Pub/sub subscriptions (listeners and long polls) per process
+
+# Substrate (chain) connection pool settings
+SUBSTRATE_URL = os.getenv("SUBSTRATE_URL", "wss://entrypoint-finney.opentensor.ai:443")
+SUBSTRATE_POOL_SIZE = int(os.getenv("SUBSTRATE_POOL_SIZE", "4"))  # Number of warm websocket connections
+SUBSTRATE_MAX_CONCURRENCY_PER_CONNECTION = int(os.getenv("SUBSTRATE_MAX_CONCURRENCY_PER_CONNECTION", "8"))  # Concurrent queries per connection
+SUBSTRATE_HEALTH_CHECK_INTERVAL = float(os.getenv("SUBSTRATE_HEALTH_CHECK_INTERVAL", "30"))  # Seconds between health checks
+SUBSTRATE_HEALTH_CHECK_TIMEOUT = float(os.getenv("SUBSTRATE_HEALTH_CHECK_TIMEOUT", "10"))  # Seconds before a ping counts as failed
+
+# Dividend cache settings
+SUBNET_LIST_CACHE_TTL = int(os.getenv("SUBNET_LIST_CACHE_TTL", "600"))  # Seconds to cache the list of live subnets
+DIVIDEND_CACHE_TTL = int(os.getenv("DIVIDEND_CACHE_TTL", "120"))  # Hard TTL: upper bound (seconds) on how long dividend entries are kept and may be served
+DIVIDEND_CACHE_SOFT_TTL = float(os.getenv("DIVIDEND_CACHE_SOFT_TTL", "12"))  # Soft TTL: seconds after which a cached entry is refreshed
+DIVIDEND_CACHE_SWR = strtobool(os.getenv("DIVIDEND_CACHE_SWR", "True"))  # Serve stale entries while refreshing them in the background
+DIVIDEND_CACHE_BLOCK_SPAN = int(os.getenv("DIVIDEND_CACHE_BLOCK_SPAN", "1"))  # Blocks a cached entry stays valid for (1 = refresh every block)
+DIVIDEND_STREAM_PAGE_SIZE = int(os.getenv("DIVIDEND_STREAM_PAGE_SIZE", "500"))  # Storage keys / hash fields read per page when streaming a subnet
+
+# Finalized block tracking
+BLOCK_WATCHER_ENABLED = strtobool(os.getenv("BLOCK_WATCHER_ENABLED", "True"))  # Subscribe to finalized heads in the API process
+BLOCK_TIME_SECONDS = int(os.getenv("BLOCK_TIME_SECONDS", "12"))  # Expected chain block time
+BLOCK_MARKER_TTL = int(os.getenv("BLOCK_MARKER_TTL", "60"))  # Seconds the current-block marker survives without updates
+BLOCK_WATCHER_RECONNECT_DELAY = float(os.getenv("BLOCK_WATCHER_RECONNECT_DELAY", "5"))  # Seconds between subscription retries
+
+# In-process (L1) dividend cache settings
+L1_CACHE_MAX_ENTRIES = int(os.getenv("L1_CACHE_MAX_ENTRIES", "10000"))  # Maximum number of cached keys per process
+L1_CACHE_MAX_BYTES = int(os.getenv("L1_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))  # Maximum estimated size of the cache per process
+L1_CACHE_TTL = float(os.getenv("L1_CACHE_TTL", str(BLOCK_TIME_SECONDS * DIVIDEND_CACHE_BLOCK_SPAN)))  # Defaults to one block span
+L1_CACHE_PUBSUB = strtobool(os.getenv("L1_CACHE_PUBSUB", "True"))  # Listen for invalidations broadcast through Redis pub/sub
+
+# Background cache warmer settings
+WARM_ENABLED = strtobool(os.getenv("WARM_ENABLED", "True"))  # Refresh dividend caches on every new block
+WARM_NETUIDS = [int(netuid) for netuid in os.getenv("WARM_NETUIDS", "").split(",") if netuid.strip()]  # Subnets always kept warm
+WARM_HOTKEYS = [hotkey.strip() for hotkey in os.getenv("WARM_HOTKEYS", "").split(",") if hotkey.strip()]  # Hotkeys always kept warm
+WARM_RECENT_WINDOW = int(os.getenv("WARM_RECENT_WINDOW", "900"))  # Seconds a requested subnet / hotkey stays in the warm set
+WARM_RECENT_LIMIT = int(os.getenv("WARM_RECENT_LIMIT", "20"))  # Maximum recently requested subnets / hotkeys to warm
+WARM_CONCURRENCY = int(os.getenv("WARM_CONCURRENCY", "2"))  # Warm-up jobs run at the same time
+WARM_MAX_POOL_UTILIZATION = float(os.getenv("WARM_MAX_POOL_UTILIZATION", "0.5"))  # Pause warm-up above this substrate pool load
+
+# Request coalescing (single-flight) for cache misses
+SINGLEFLIGHT_DISTRIBUTED = strtobool(os.getenv("SINGLEFLIGHT_DISTRIBUTED", "False"))  # Coalesce across workers with a Redis lock
+SINGLEFLIGHT_LOCK_TIMEOUT = float(os.getenv("SINGLEFLIGHT_LOCK_TIMEOUT", "30"))  # Seconds before a fetch lock expires
+SINGLEFLIGHT_WAIT_TIMEOUT = float(os.getenv("SINGLEFLIGHT_WAIT_TIMEOUT", "10"))  # Seconds to wait for another worker's fetch
+SINGLEFLIGHT_POLL_INTERVAL = float(os.getenv("SINGLEFLIGHT_POLL_INTERVAL", "0.05"))  # Seconds between cache re-checks while waiting
+
+# Chutes (LLM) API client settings
+CHUTES_API_URL = os.getenv("CHUTES_API_URL", "https://llm.chutes.ai/v1/chat/completions")
+CHUTES_MODEL = os.getenv("CHUTES_MODEL", "unsloth/Llama-3.2-3B-Instruct")
+CHUTES_HTTP2 = strtobool(os.getenv("CHUTES_HTTP2", "False"))  # Multiplex requests over HTTP/2 (requires the httpx[http2] extra)
+CHUTES_MAX_CONNECTIONS = int(os.getenv("CHUTES_MAX_CONNECTIONS", "20"))  # Pooled keep-alive connections per process
+CHUTES_CONNECT_TIMEOUT = float(os.getenv("CHUTES_CONNECT_TIMEOUT", "5"))  # Seconds to establish a connection
+CHUTES_READ_TIMEOUT = float(os.getenv("CHUTES_READ_TIMEOUT", "30"))  # Seconds to wait for a completion
+CHUTES_MAX_RETRIES = int(os.getenv("CHUTES_MAX_RETRIES", "3"))  # Retries on 429 / 5xx / network errors
+CHUTES_BACKOFF_BASE = float(os.getenv("CHUTES_BACKOFF_BASE", "0.5"))  # Seconds; doubled on every retry, with full jitter
+CHUTES_BACKOFF_MAX = float(os.getenv("CHUTES_BACKOFF_MAX", "10"))  # Upper bound (seconds) of a single backoff
+CHUTES_RATE_LIMIT = float(os.getenv("CHUTES_RATE_LIMIT", "5"))  # Requests per second allowed by our Chutes quota
+CHUTES_RATE_BURST = int(os.getenv("CHUTES_RATE_BURST", "10"))  # Requests that may be sent at once after an idle period
+
+# Datura tweet search settings
+DATURA_QUERY = os.getenv("DATURA_QUERY", "Whats going on with Bittensor")  # Search query of the sentiment tweets
+DATURA_USER = os.getenv("DATURA_USER", "elonmusk")  # Account the tweets are searched from
+DATURA_SEARCHES = [
+    tuple(part.strip() for part in search.split("|", 1))
+    for search in os.getenv("DATURA_SEARCHES", f"{DATURA_QUERY}|{DATURA_USER}").split(";") if "|" in search
+]  # Searches fanned out every run, as "query|user" entries separated by ";"
+DATURA_MAX_WORKERS = int(os.getenv("DATURA_MAX_WORKERS", "4"))  # Datura searches running at the same time, timed out ones included until their request gives up
+DATURA_SEARCH_TIMEOUT = float(os.getenv("DATURA_SEARCH_TIMEOUT", "30"))  # Seconds before a search is abandoned
+DATURA_RATE_LIMIT = float(os.getenv("DATURA_RATE_LIMIT", "2"))  # Searches per second allowed by our Datura quota
+DATURA_RATE_BURST = int(os.getenv("DATURA_RATE_BURST", "4"))  # Searches that may be sent at once after an idle period
+TWEET_INGEST_INCREMENTAL = strtobool(os.getenv("TWEET_INGEST_INCREMENTAL", "True"))  # Fetch only new tweets and keep a rolling score
+TWEET_INGEST_MAX_PAGES = int(os.getenv("TWEET_INGEST_MAX_PAGES", "10"))  # Searches per query and run spent catching up with new tweets
+TWEET_SCORE_LIMIT = int(os.getenv("TWEET_SCORE_LIMIT", "200"))  # Maximum unscored tweets scored per run
+
+# Sentiment analysis settings
+SENTIMENT_TWEET_COUNT = int(os.getenv("SENTIMENT_TWEET_COUNT", "10"))  # Tweets scored per sentiment run
+SENTIMENT_TWEET_DAYS = int(os.getenv("SENTIMENT_TWEET_DAYS", "7"))  # Look-back window (days) of the tweet search
+SENTIMENT_SCORING_CONCURRENCY = int(os.getenv("SENTIMENT_SCORING_CONCURRENCY", "8"))  # Scoring requests in flight at the same time
+SENTIMENT_BATCH_SIZE = int(os.getenv("SENTIMENT_BATCH_SIZE", "10"))  # Tweets packed into one completion (1 = one request per tweet)
+SENTIMENT_SCORING_TIMEOUT = float(os.getenv("SENTIMENT_SCORING_TIMEOUT", "30"))  # Seconds before one scoring request (a tweet or a batch) is abandoned
+
+# Sentiment index settings
+SENTIMENT_BUCKET_SECONDS = int(os.getenv("SENTIMENT_BUCKET_SECONDS", "3600"))  # Width of the time buckets of the index
+SENTIMENT_WINDOW_SECONDS = int(os.getenv("SENTIMENT_WINDOW_SECONDS", str(7 * 24 * 3600)))  # Buckets older than this are dropped
+SENTIMENT_HALF_LIFE_SECONDS = float(os.getenv("SENTIMENT_HALF_LIFE_SECONDS", str(24 * 3600)))  # Age at which a bucket counts half
+
+# Celery sentiment pipeline settings
+CELERY_BROKER_URL = os.getenv("CELERY_BROKER_URL", REDIS_URL or "redis://localhost:6379/0")
+CELERY_RESULT_BACKEND = os.getenv("CELERY_RESULT_BACKEND", CELERY_BROKER_URL)
+SENTIMENT_REFRESH_SECONDS = float(os.getenv("SENTIMENT_REFRESH_SECONDS", "7200"))  # Beat cadence of the sentiment refresh
+SENTIMENT_CHUNK_SIZE = int(os.getenv("SENTIMENT_CHUNK_SIZE", "50"))  # Tweets scored per Celery task
+SENTIMENT_LOCK_TIMEOUT = int(os.getenv("SENTIMENT_LOCK_TIMEOUT", "1800"))  # Seconds before a stuck refresh releases its lock
+
+# Trade job queue settings
+TRADE_JOB_TTL = int(os.getenv("TRADE_JOB_TTL", "86400"))  # Seconds trade job states and idempotency keys are kept
+TRADE_JOB_MAX_WAIT = float(os.getenv("TRADE_JOB_MAX_WAIT", "30"))  # Longest a status request may wait for a job to finish
+
+# Tweet score cache settings
+SCORE_CACHE_ENABLED = strtobool(os.getenv("SCORE_CACHE_ENABLED", "True"))  # Reuse scores of tweets that were already scored
+SCORE_CACHE_TTL = int(os.getenv("SCORE_CACHE_TTL", str(8 * 24 * 3600)))  # Seconds a score is kept (outlives the 7-day search window)
+SCORE_CACHE_MONGO = strtobool(os.getenv("SCORE_CACHE_MONGO", "False"))  # Also persist scores to MongoDB
+
+# Authentication settings
+USER_CACHE_TTL = float(os.getenv("USER_CACHE_TTL", "60"))  # Seconds a user profile is cached per process
+USER_CACHE_MAX_ENTRIES = int(os.getenv("USER_CACHE_MAX_ENTRIES", "1000"))  # Maximum cached user profiles per process
+TOKEN_DENYLIST_ENABLED = strtobool(os.getenv("TOKEN_DENYLIST_ENABLED", "True"))  # Check tokens against the Redis revocation list
+
+# Password hashing and login settings
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))  # bcrypt cost factor; stored hashes are upgraded on login when it changes
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", "2"))  # Threads hashing / verifying passwords per process
+PASSWORD_HASH_MAX_QUEUE = int(os.getenv("PASSWORD_HASH_MAX_QUEUE", "32"))  # Pending hash operations before new ones are refused
+LOGIN_RATE_WINDOW = int(os.getenv("LOGIN_RATE_WINDOW", "60"))  # Seconds of a login rate limiting window
+LOGIN_RATE_LIMIT_PER_USER = int(os.getenv("LOGIN_RATE_LIMIT_PER_USER", "5"))  # Login attempts per username and window
+LOGIN_RATE_LIMIT_PER_IP = int(os.getenv("LOGIN_RATE_LIMIT_PER_IP", "20"))  # Login attempts per client IP and window
+
+# Trading log writer settings
+TRADING_LOG_BATCH_SIZE = int(os.getenv("TRADING_LOG_BATCH_SIZE", "100"))  # Logs written per insert_many
+TRADING_LOG_FLUSH_INTERVAL = float(os.getenv("TRADING_LOG_FLUSH_INTERVAL", "1"))  # Seconds a log may wait for its batch to fill
+TRADING_LOG_MAX_BUFFER = int(os.getenv("TRADING_LOG_MAX_BUFFER", "10000"))  # Buffered logs before writers have to wait
+TRADING_LOG_SPILL_PATH = os.getenv("TRADING_LOG_SPILL_PATH", "trading_logs.spill.jsonl")  # Append-only file of logs MongoDB refused
+TRADING_LOG_DRAIN_TIMEOUT = float(os.getenv("TRADING_LOG_DRAIN_TIMEOUT", "10"))  # Seconds to flush the buffer at shutdown
+
+# Trading history API settings
+TRADES_PAGE_SIZE = int(os.getenv("TRADES_PAGE_SIZE", "100"))  # Trades per page when no limit is given
+TRADES_MAX_PAGE_SIZE = int(os.getenv("TRADES_MAX_PAGE_SIZE", "1000"))  # Largest page of the JSON format (NDJSON is unbounded)
+TRADES_ADMIN_USERS = [user.strip() for user in os.getenv("TRADES_ADMIN_USERS", "").split(",") if user.strip()]  # Users who may read everyone's trades
+
 # Ensure critical environment variables are set
 required_env_vars = [DATABASE_URL, REDIS_URL, SECRET_KEY, ALGORITHM, DATURA_API_KEY, CHUTES_API_KEY]
 missing_vars = [var for var in required_env_vars if var is None]
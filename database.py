@@ -2,25 +2,138 @@ import motor.motor_asyncio
 from pydantic import BaseModel, ValidationError
 from fastapi import FastAPI, HTTPException
 from datetime import datetime
-from models import User, TradingLog
-from typing import Dict, Optional
-from utils import get_hashed_password  # Import from utils
+from models import User, UserProfile, TradingLog
+from typing import AsyncIterator, Dict, List, Optional
+from bson import ObjectId
+from bson.errors import InvalidId
+from pymongo import ASCENDING, DESCENDING, UpdateOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError, OperationFailure
+from utils import hash_password  # Import from utils
 import logging
+import time
+from trading_log_writer import TradingLogWriter
 from config import DATABASE_URL
 # MongoDB client setup (motor)
 client = motor.motor_asyncio.AsyncIOMotorClient(DATABASE_URL)
 db = client.datura_ai_db  # Database
 users_collection = db.users  # Users collection
 trading_logs_collection = db.trading_logs  # Trading logs collection
+tweet_scores_collection = db.tweet_scores  # Cached LLM sentiment scores, keyed by tweet content hash
+tweets_collection = db.tweets  # Ingested tweets (keyed by tweet ID) and their sentiment scores
+
+# Buffers trading logs and writes them in batches (see TradingLogWriter)
+trading_log_writer = TradingLogWriter(trading_logs_collection)
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Indexes of every collection as (keys, options), created at startup by `ensure_indexes`.
+# Indexes get MongoDB's default names; changing the keys of an index therefore creates a
+# new one, and the index it replaces must be listed in `SUPERSEDED_INDEXES`.
+COLLECTION_INDEXES = {
+    "users": [
+        ([("username", ASCENDING)], {"unique": True}),  # Lookups by username; enforces unique usernames
+    ],
+    # `_id` closes every trading log index so that the (timestamp, _id) keyset sort of
+    # `iter_trading_logs` is served by the index, ties on the timestamp included
+    "trading_logs": [
+        ([("user_id", ASCENDING), ("timestamp", DESCENDING), ("_id", DESCENDING)], {}),  # Trading history of a user
+        ([("netuid", ASCENDING), ("hotkey", ASCENDING), ("timestamp", DESCENDING), ("_id", DESCENDING)], {}),  # Trades per subnet / hotkey
+        ([("timestamp", DESCENDING), ("_id", DESCENDING)], {}),  # Trades and totals over a time range
+    ],
+    "tweets": [
+        ([("query", ASCENDING), ("created_at", DESCENDING)], {}),
+        ([("score", ASCENDING), ("created_at", DESCENDING)], {}),  # Unscored tweets, newest first
+        ([("created_at", ASCENDING)], {}),
+    ],
+}
+
+# Indexes of earlier versions, dropped by `ensure_indexes` once the index replacing them
+# (the name it maps to) is ready, so writes stop maintaining them
+SUPERSEDED_INDEXES = {
+    "trading_logs": {
+        "user_id_1_timestamp_-1": "user_id_1_timestamp_-1__id_-1",
+        "netuid_1_hotkey_1_timestamp_-1": "netuid_1_hotkey_1_timestamp_-1__id_-1",
+        "timestamp_-1": "timestamp_-1__id_-1",
+    },
+}
+
+# MongoDB error code of an index that does not exist
+INDEX_NOT_FOUND = 27
+
+# Fields fetched by profile lookups; the password hash is only read by `get_user_credentials`
+USER_FIELDS = {"_id": 0, "username": 1, "full_name": 1, "email": 1}
+CREDENTIAL_FIELDS = {"_id": 0, "username": 1, "hashed_password": 1}
+
+# Build status of every index ("ready" or the error), keyed by "<collection>.<index name>"
+index_status = {}
+
+def index_name(keys: list) -> str:
+    """
+    The name MongoDB gives an index by default, e.g. `netuid_1_hotkey_1_timestamp_-1`.
+    """
+    return "_".join(f"{field}_{direction}" for field, direction in keys)
+
+async def ensure_indexes(collections: Optional[List[str]] = None) -> Dict[str, str]:
+    """
+    Create the indexes of `COLLECTION_INDEXES` that do not exist yet and log the outcome.
+    A failing index is logged and skipped, except unique indexes: without them duplicates
+    could be stored (e.g. two users with the same username), so their failure is raised
+    once every index was attempted. Indexes superseded by a ready one are dropped.
+
+    Args:
+        collections (List[str], optional): Only these collections (default is every collection).
+
+    Returns:
+        Dict[str, str]: The build status of every index.
+
+    Raises:
+        RuntimeError: If a unique index could not be built (e.g. over duplicate values).
+    """
+    failed_unique = []
+    for collection in collections or COLLECTION_INDEXES:
+        for keys, options in COLLECTION_INDEXES[collection]:
+            name = f"{collection}.{index_name(keys)}"
+            started_at = time.monotonic()
+            try:
+                await db[collection].create_index(keys, **options)
+                index_status[name] = "ready"
+                logger.info(f"Index {name} ready ({time.monotonic() - started_at:.2f}s).")
+            except Exception as e:
+                index_status[name] = f"failed: {e}"
+                logger.error(f"Failed to build index {name}: {e}")
+                if options.get("unique"):
+                    failed_unique.append(name)
+        await drop_superseded_indexes(collection)
+    if failed_unique:
+        raise RuntimeError(f"Required unique indexes could not be built: {', '.join(failed_unique)}")
+    return index_status
+
+async def drop_superseded_indexes(collection: str):
+    """
+    Drop the indexes of `SUPERSEDED_INDEXES` whose replacement is ready. Failures are logged.
+
+    Args:
+        collection (str): The collection whose old indexes are dropped.
+    """
+    for old_name, new_name in SUPERSEDED_INDEXES.get(collection, {}).items():
+        if index_status.get(f"{collection}.{new_name}") != "ready":
+            continue
+        try:
+            await db[collection].drop_index(old_name)
+            logger.info(f"Dropped superseded index {collection}.{old_name}.")
+        except OperationFailure as e:
+            if e.code != INDEX_NOT_FOUND:
+                logger.error(f"Failed to drop superseded index {collection}.{old_name}: {e}")
+
 # Function to store a user in MongoDB
 async def store_user(user_data: Dict[str, str]) -> Optional[dict]:
     """
     Store a user in the MongoDB database. If a user with the same username already exists, return an error.
+
+    The insert relies on the unique index on `users.username`, so a single round trip both
+    checks and creates the user, and concurrent registrations cannot both succeed.
     
     Args:
         user_data (Dict[str, str]): The user information including username, full_name, email, and password.
@@ -29,14 +142,8 @@ async def store_user(user_data: Dict[str, str]) -> Optional[dict]:
         Optional[dict]: A result message or error description.
     """
     try:
-        # Check if the user already exists
-        existing_user = await users_collection.find_one({"username": user_data["username"]})
-        if existing_user:
-            logger.warning(f"User with username {user_data['username']} already exists.")
-            return {"error": "User with this username already exists."}
-
         # Hash password and remove the original password field
-        user_data["hashed_password"] = get_hashed_password(user_data["password"])
+        user_data["hashed_password"] = await hash_password(user_data["password"])
         user_data.pop("password", None)
 
         # Create and validate User object
@@ -47,16 +154,24 @@ async def store_user(user_data: Dict[str, str]) -> Optional[dict]:
         logger.info(f"User {user.username} created successfully with ID: {result.inserted_id}")
         return {"message": f"User created successfully with ID: {result.inserted_id}"}
 
+    except DuplicateKeyError:
+        logger.warning(f"User with username {user_data['username']} already exists.")
+        return {"error": "User with this username already exists."}
+
     except ValidationError as e:
         logger.error(f"Validation error: {e.errors()}")
         return {"error": f"Validation error: {e.errors()}"}
     
+    except HTTPException:
+        # The password hashing pool is saturated
+        raise
+    
     except Exception as e:
         logger.error(f"Error occurred while storing the user: {str(e)}")
         return {"error": f"An error occurred while storing the user: {str(e)}"}
 
 # Function to get a user by username
-async def get_user_by_username(username: str) -> Optional[User]:
+async def get_user_by_username(username: str) -> Optional[UserProfile]:
     """
     Retrieve a user from the database by their username.
 
@@ -64,13 +179,13 @@ async def get_user_by_username(username: str) -> Optional[User]:
         username (str): The username of the user to be fetched.
 
     Returns:
-        Optional[User]: The user object if found, or None if not.
+        Optional[UserProfile]: The user's profile (without the password hash) if found, or None if not.
     """
     try:
-        user_data = await users_collection.find_one({"username": username})
+        user_data = await users_collection.find_one({"username": username}, USER_FIELDS)
         if user_data:
             # Return the user as a validated Pydantic model
-            return User(**user_data)
+            return UserProfile(**user_data)
         logger.warning(f"User {username} not found.")
         return None
 
@@ -78,11 +193,52 @@ async def get_user_by_username(username: str) -> Optional[User]:
         logger.error(f"Error occurred while fetching user {username}: {str(e)}")
         raise HTTPException(status_code=500, detail="Error occurred while fetching user.")
 
+# Function to get only what is needed to check a user's password
+async def get_user_credentials(username: str) -> Optional[dict]:
+    """
+    Retrieve the username and password hash of a user, without the rest of the profile.
+
+    Args:
+        username (str): The username of the user to be fetched.
+
+    Returns:
+        Optional[dict]: `username` and `hashed_password` if found, or None if not.
+    """
+    try:
+        credentials = await users_collection.find_one({"username": username}, CREDENTIAL_FIELDS)
+        if credentials is None:
+            logger.warning(f"User {username} not found.")
+        return credentials
+
+    except Exception as e:
+        logger.error(f"Error occurred while fetching user {username}: {str(e)}")
+        raise HTTPException(status_code=500, detail="Error occurred while fetching user.")
+
+# Function to replace the password hash of a user
+async def update_user_password_hash(username: str, hashed_password: str):
+    """
+    Store a new password hash for a user, e.g. after rehashing it with a new cost factor.
+    Failures are logged only: the old hash keeps working.
+
+    Args:
+        username (str): The username of the user.
+        hashed_password (str): The new hashed password.
+    """
+    try:
+        await users_collection.update_one({"username": username}, {"$set": {"hashed_password": hashed_password}})
+        logger.info(f"Password hash of user {username} upgraded.")
+    except Exception as e:
+        logger.error(f"Error occurred while upgrading the password hash of user {username}: {str(e)}")
+
 # Function to log a trading action in MongoDB
 async def log_trading_action(user_id: str, action_type: str, netuid: int, hotkey: str, amount: float, transaction_id: str = None):
     """
     Log a trading action into the trading logs collection.
 
+    The log is handed to the buffered `trading_log_writer`, which writes it with the next
+    batch; this only waits when the buffer is full. A MongoDB outage does not fail the
+    trade: the log is spilled to disk and written later.
+
     Args:
         user_id (str): The ID of the user performing the action.
         action_type (str): The type of action ("stake" or "unstake").
@@ -91,21 +247,233 @@ async def log_trading_action(user_id: str, action_type: str, netuid: int, hotkey
         amount (float): The amount involved in the action.
         transaction_id (str, optional): The transaction ID associated with the action, default is None.
     """
+    timestamp = datetime.utcnow()  # Store the current UTC time as timestamp
+    trading_log = TradingLog(
+        user_id=user_id,
+        action_type=action_type,
+        netuid=netuid,
+        hotkey=hotkey,
+        amount=amount,
+        timestamp=timestamp,
+        transaction_id=transaction_id
+    )
+
+    # Queue the trading log for the next batched insert
+    await trading_log_writer.write(trading_log.dict())
+
+# Whether the indexes of the tweets collection were created by this process
+tweet_indexes_ready = False
+
+async def ensure_tweet_indexes():
+    """
+    Create the indexes used by the incremental tweet ingestion and the rolling sentiment aggregate.
+    Celery workers have no startup hook, so ingestion creates them on first use.
+    """
+    global tweet_indexes_ready
+    if tweet_indexes_ready:
+        return
+    await ensure_indexes(["tweets"])
+    tweet_indexes_ready = True
+
+# Function to store newly ingested tweets in MongoDB
+async def store_tweets(records: List[dict]) -> int:
+    """
+    Insert tweet records, skipping tweets that are already stored.
+
+    Args:
+        records (List[dict]): Tweet records keyed by tweet ID (`_id`).
+
+    Returns:
+        int: The number of tweets inserted.
+    """
+    if not records:
+        return 0
+    await ensure_tweet_indexes()
     try:
-        timestamp = datetime.utcnow()  # Store the current UTC time as timestamp
-        trading_log = TradingLog(
-            user_id=user_id,
-            action_type=action_type,
-            netuid=netuid,
-            hotkey=hotkey,
-            amount=amount,
-            timestamp=timestamp,
-            transaction_id=transaction_id
-        )
-
-        # Insert the trading log into MongoDB
-        result = await trading_logs_collection.insert_one(trading_log.dict())
-        logger.info(f"Trading action logged successfully. Log inserted with ID: {result.inserted_id}")
-    except Exception as e:
-        logger.error(f"Error occurred while logging trading action: {str(e)}")
-        raise HTTPException(status_code=500, detail="Error occurred while logging trading action.")
+        result = await tweets_collection.insert_many(records, ordered=False)
+        return len(result.inserted_ids)
+    except BulkWriteError as e:
+        # Duplicate IDs (tweets ingested by an earlier run) are expected and ignored
+        errors = [error for error in e.details.get("writeErrors", []) if error.get("code") != 11000]
+        if errors:
+            logger.error(f"Error occurred while storing tweets: {errors}")
+            raise
+        return e.details.get("nInserted", 0)
+
+# Function to fetch the stored tweets that still need a sentiment score
+async def get_unscored_tweets(since: datetime, limit: int, ids: Optional[List[str]] = None) -> List[dict]:
+    """
+    Fetch stored tweets without a sentiment score (new, or whose scoring failed earlier).
+
+    Args:
+        since (datetime): Only tweets created after this time.
+        limit (int): Maximum number of tweets to return, newest first.
+        ids (List[str], optional): Only these tweet IDs (default is any tweet).
+
+    Returns:
+        List[dict]: The tweet IDs, texts, creation times and engagement metrics.
+    """
+    query = {"score": None, "created_at": {"$gte": since}}
+    if ids is not None:
+        query["_id"] = {"$in": ids}
+    cursor = tweets_collection.find(
+        query,
+        {"text": 1, "created_at": 1, "metrics": 1},
+    ).sort("created_at", DESCENDING).limit(limit)
+    return await cursor.to_list(length=limit)
+
+# Function to store sentiment scores on the tweets they were computed for
+async def update_tweet_scores(scores: Dict[str, float]):
+    """
+    Store the sentiment scores of tweets.
+
+    Args:
+        scores (Dict[str, float]): A mapping of tweet ID to score.
+    """
+    if not scores:
+        return
+    scored_at = datetime.utcnow()
+    await tweets_collection.bulk_write([
+        UpdateOne({"_id": tweet_id}, {"$set": {"score": score, "scored_at": scored_at}})
+        for tweet_id, score in scores.items()
+    ], ordered=False)
+
+# Fields returned by the trading history queries
+TRADE_FIELDS = {"user_id": 1, "action_type": 1, "netuid": 1, "hotkey": 1, "amount": 1, "timestamp": 1, "transaction_id": 1}
+
+# Groupings of the trade totals: the fields every total is computed per
+TRADE_TOTAL_GROUPS = {
+    "day": {"day": {"$dateToString": {"format": "%Y-%m-%d", "date": "$timestamp"}}},
+    "subnet": {"netuid": "$netuid"},
+    "day_subnet": {"day": {"$dateToString": {"format": "%Y-%m-%d", "date": "$timestamp"}}, "netuid": "$netuid"},
+}
+
+def encode_trade_cursor(trade: dict) -> str:
+    """
+    Encode the position after a trade as an opaque pagination cursor.
+
+    Args:
+        trade (dict): The last trade of a page (with `timestamp` and `_id`).
+
+    Returns:
+        str: The cursor, `<ISO timestamp>_<ObjectId>`.
+    """
+    return f"{trade['timestamp'].isoformat()}_{trade['_id']}"
+
+def decode_trade_cursor(cursor: str) -> tuple:
+    """
+    Decode a pagination cursor made by `encode_trade_cursor`.
+
+    Args:
+        cursor (str): The cursor.
+
+    Returns:
+        tuple: `(timestamp, _id)` of the last trade already returned.
+
+    Raises:
+        ValueError: If the cursor is malformed.
+    """
+    try:
+        timestamp, trade_id = cursor.rsplit("_", 1)
+        return datetime.fromisoformat(timestamp), ObjectId(trade_id)
+    except (InvalidId, TypeError, ValueError) as e:
+        raise ValueError(f"Invalid cursor: {cursor}") from e
+
+def trade_filter(
+    user_id: Optional[str] = None,
+    netuid: Optional[int] = None,
+    hotkey: Optional[str] = None,
+    action_type: Optional[str] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+) -> dict:
+    """
+    Build the MongoDB filter of a trading history query. Every argument is optional.
+
+    Args:
+        user_id (str, optional): Only trades of this user.
+        netuid (int, optional): Only trades on this subnet.
+        hotkey (str, optional): Only trades of this hotkey.
+        action_type (str, optional): Only "stake" or only "unstake" trades.
+        since (datetime, optional): Only trades at or after this (naive UTC) time.
+        until (datetime, optional): Only trades before this (naive UTC) time.
+
+    Returns:
+        dict: The filter.
+    """
+    query = {}
+    for field, value in (("user_id", user_id), ("netuid", netuid), ("hotkey", hotkey), ("action_type", action_type)):
+        if value is not None:
+            query[field] = value
+    if since is not None or until is not None:
+        query["timestamp"] = {}
+        if since is not None:
+            query["timestamp"]["$gte"] = since
+        if until is not None:
+            query["timestamp"]["$lt"] = until
+    return query
+
+# Function to read the trading history, newest first
+async def iter_trading_logs(query: dict, after: Optional[str] = None, limit: Optional[int] = None, batch_size: int = 500) -> AsyncIterator[dict]:
+    """
+    Iterate over trading logs, newest first, with keyset pagination on (timestamp, _id).
+
+    Resuming after a cursor is a range condition on indexed fields, so every page costs the
+    same however deep it is (no `skip`). Logs are read from MongoDB in batches of
+    `batch_size` and yielded one by one, so large ranges are never held in memory.
+
+    Args:
+        query (dict): The filter built by `trade_filter`.
+        after (str, optional): Only logs after this cursor (see `encode_trade_cursor`).
+        limit (int, optional): Maximum number of logs (default is every matching log).
+        batch_size (int): Logs fetched per round trip.
+
+    Yields:
+        dict: The projected trading logs.
+
+    Raises:
+        ValueError: If the cursor is malformed.
+    """
+    if after is not None:
+        timestamp, trade_id = decode_trade_cursor(after)
+        query = {"$and": [query, {"$or": [
+            {"timestamp": {"$lt": timestamp}},
+            {"timestamp": timestamp, "_id": {"$lt": trade_id}},
+        ]}]}
+    cursor = trading_logs_collection.find(query, TRADE_FIELDS).sort([("timestamp", DESCENDING), ("_id", DESCENDING)])
+    if limit is not None:
+        cursor = cursor.limit(limit)
+        batch_size = min(batch_size, limit)
+    async for trade in cursor.batch_size(batch_size):
+        yield trade
+
+# Function to compute stake / unstake totals of the trading history
+async def aggregate_trading_totals(query: dict, group_by: str) -> List[dict]:
+    """
+    Sum the staked and unstaked amounts per day and / or subnet, server-side.
+
+    The filter is applied first, so the pipeline starts from the trading log indexes.
+
+    Args:
+        query (dict): The filter built by `trade_filter`.
+        group_by (str): "day", "subnet" or "day_subnet" (see `TRADE_TOTAL_GROUPS`).
+
+    Returns:
+        List[dict]: Per group: its `day` and / or `netuid`, `staked`, `unstaked`, `stakes` and `unstakes`.
+    """
+    group = TRADE_TOTAL_GROUPS[group_by]
+    is_stake = {"$eq": ["$action_type", "stake"]}
+    is_unstake = {"$eq": ["$action_type", "unstake"]}
+    pipeline = [
+        {"$match": query},
+        {"$group": {
+            "_id": group,
+            "staked": {"$sum": {"$cond": [is_stake, "$amount", 0]}},
+            "unstaked": {"$sum": {"$cond": [is_unstake, "$amount", 0]}},
+            "stakes": {"$sum": {"$cond": [is_stake, 1, 0]}},
+            "unstakes": {"$sum": {"$cond": [is_unstake, 1, 0]}},
+        }},
+        {"$sort": {f"_id.{field}": ASCENDING for field in group}},
+    ]
+    totals = await trading_logs_collection.aggregate(pipeline).to_list(length=None)
+    return [{**total.pop("_id"), **total} for total in totals]
@@ -1,23 +1,350 @@
 from datura_py import Datura
+import asyncio
+import hashlib
+import json
 import os
-from config import DATURA_API_KEY
+from concurrent.futures import ThreadPoolExecutor
+from config import (
+    DATURA_API_KEY,
+    DATURA_SEARCHES,
+    DATURA_MAX_WORKERS,
+    DATURA_SEARCH_TIMEOUT,
+    DATURA_RATE_LIMIT,
+    DATURA_RATE_BURST,
+    TWEET_INGEST_MAX_PAGES,
+)
 import datetime
 import logging
-
-# Initialize Datura client with API key from config
-datura = Datura(api_key=DATURA_API_KEY)
+from redis_interface import get_redis_connection
+from rate_limiter import RedisTokenBucket
+from database import store_tweets
 
 # Set up logging to capture important events, especially errors
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-def get_tweets(count: int, days: int):
+
+class BoundedDatura(Datura):
+    """
+    Datura client whose HTTP requests give up after `DATURA_SEARCH_TIMEOUT` instead of
+    the SDK's fixed 120 seconds, so that a search abandoned by `search_tweets_async`
+    also frees its worker thread.
+    """
+
+    def handle_request(self, request_func, *args, **kwargs):
+        def bounded_request(*request_args, timeout=None, **request_kwargs):
+            return request_func(*request_args, timeout=DATURA_SEARCH_TIMEOUT, **request_kwargs)
+        return super().handle_request(bounded_request, *args, **kwargs)
+
+
+# Initialize Datura client with API key from config
+datura = BoundedDatura(api_key=DATURA_API_KEY)
+
+# Redis key prefix of the per-query ingestion cursors (newest tweet seen)
+TWEET_CURSOR_PREFIX = "tao:tweet_cursor:"
+
+# The Datura client is synchronous: searches run on a bounded pool of worker threads.
+# A timed out search keeps its thread until its HTTP request times out too, i.e. for at
+# most about `DATURA_SEARCH_TIMEOUT` more seconds (the timeout applies to every socket read)
+search_executor = ThreadPoolExecutor(max_workers=DATURA_MAX_WORKERS, thread_name_prefix="datura")
+
+# Paces the searches of every process to stay within the Datura quota
+search_rate_limiter = RedisTokenBucket("datura", DATURA_RATE_LIMIT, DATURA_RATE_BURST)
+
+
+def search_tweets(query: str, user: str, start_date: str, end_date: str, count: int, sort: str = "Top"):
+    """
+    Runs one Datura Twitter search with the filters used for sentiment analysis.
+
+    Args:
+        query (str): The search query.
+        user (str): Only tweets from this account.
+        start_date (str): First day (YYYY-MM-DD) of the search window.
+        end_date (str): Last day (YYYY-MM-DD) of the search window.
+        count (int): The number of tweets to fetch.
+        sort (str): "Top" or "Latest".
+
+    Returns:
+        list: The raw tweet records returned by Datura.
+    """
+    return datura.basic_twitter_search(
+        query=query,  # The search query for tweets
+        sort=sort,  # Sort order of the results
+        user=user,  # Tweets from this user only
+        start_date=start_date,  # Filter tweets from the start date
+        end_date=end_date,  # Filter tweets up to the current date
+        lang="en",  # Only tweets in English
+        verified=True,  # Only verified accounts
+        blue_verified=True,  # Blue verified accounts
+        is_quote=True,  # Include tweets that are quotes
+        is_video=True,  # Include tweets that have video
+        is_image=True,  # Include tweets that have images
+        min_retweets=1,  # Minimum retweets required
+        min_replies=1,  # Minimum replies required
+        min_likes=1,  # Minimum likes required
+        count=count  # Number of tweets to retrieve
+    ) or []
+
+
+async def search_tweets_async(query: str, user: str, start_date: str, end_date: str, count: int, sort: str = "Top"):
+    """
+    Runs one Datura search on the worker thread pool, rate limited and bounded by
+    `DATURA_SEARCH_TIMEOUT`. Cancelling the wait does not stop the thread: the HTTP
+    request of the search is bounded by the same timeout, which releases it.
+
+    Args:
+        query (str): The search query.
+        user (str): Only tweets from this account.
+        start_date (str): First day (YYYY-MM-DD) of the search window.
+        end_date (str): Last day (YYYY-MM-DD) of the search window.
+        count (int): The number of tweets to fetch.
+        sort (str): "Top" or "Latest".
+
+    Returns:
+        list: The raw tweet records returned by Datura.
+
+    Raises:
+        asyncio.TimeoutError: If the search does not answer in time.
+    """
+    await search_rate_limiter.acquire()
+    loop = asyncio.get_running_loop()
+    future = loop.run_in_executor(search_executor, search_tweets, query, user, start_date, end_date, count, sort)
+    return await asyncio.wait_for(future, DATURA_SEARCH_TIMEOUT)
+
+
+async def fan_out(coroutine_fn, searches):
+    """
+    Runs a coroutine for every configured (query, user) search concurrently. A failing
+    or timed out search is logged and skipped.
+
+    Args:
+        coroutine_fn (Callable): Coroutine function called with `(query, user)` and returning a list.
+        searches (list): The `(query, user)` pairs.
+
+    Returns:
+        list: The concatenated results of the searches that succeeded.
+    """
+    results = await asyncio.gather(*[coroutine_fn(query, user) for query, user in searches], return_exceptions=True)
+    merged = []
+    for (query, user), result in zip(searches, results):
+        if isinstance(result, BaseException):
+            logger.error(f"Search {query!r} from {user!r} failed: {result!r}")
+            continue
+        merged.extend(result)
+    return merged
+
+
+def dedupe_by_id(tweets: list, id_field: str = "id") -> list:
+    """
+    Drops tweets found by more than one search, keeping the first occurrence.
+    """
+    seen = set()
+    unique = []
+    for tweet in tweets:
+        tweet_id = str(tweet.get(id_field))
+        if tweet_id in seen:
+            continue
+        seen.add(tweet_id)
+        unique.append(tweet)
+    return unique
+
+
+def parse_tweet_time(value):
+    """
+    Parses a tweet timestamp, either in Twitter's format or ISO 8601.
+
+    Returns:
+        datetime.datetime: The timestamp as naive UTC, or None if it cannot be parsed.
+    """
+    if not value:
+        return None
+    for parse in (
+        lambda v: datetime.datetime.strptime(v, "%a %b %d %H:%M:%S %z %Y"),
+        lambda v: datetime.datetime.fromisoformat(v.replace("Z", "+00:00")),
+    ):
+        try:
+            parsed = parse(value)
+        except (TypeError, ValueError):
+            continue
+        if parsed.tzinfo is not None:
+            parsed = parsed.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+        return parsed
+    return None
+
+
+def to_tweet_record(tweet: dict, query: str) -> dict:
+    """
+    Converts a raw Datura tweet into the record stored in the tweets collection.
+
+    Args:
+        tweet (dict): The raw tweet returned by Datura.
+        query (str): The search query the tweet was found with.
+
+    Returns:
+        dict: The tweet ID (as `_id`), text, author, engagement metrics and timestamps.
+    """
+    author = tweet.get("user") or {}
+    return {
+        "_id": str(tweet["id"]),
+        "text": tweet.get("text", ""),
+        "author": {"id": author.get("id"), "username": author.get("username"), "followers": author.get("followers_count")},
+        "metrics": {
+            "likes": tweet.get("like_count", 0),
+            "retweets": tweet.get("retweet_count", 0),
+            "replies": tweet.get("reply_count", 0),
+            "quotes": tweet.get("quote_count", 0),
+            "views": tweet.get("view_count", 0),
+        },
+        "created_at": parse_tweet_time(tweet.get("created_at")) or datetime.datetime.utcnow(),
+        "query": query,
+        "fetched_at": datetime.datetime.utcnow(),
+        "score": None,
+    }
+
+
+async def ingest_range(query: str, user: str, floor: int, ceiling, start_date: str, end_date: str, count: int, budget: int) -> tuple:
+    """
+    Fetches the tweets of a query with an ID between `floor` and `ceiling`, newest first,
+    paging backwards until a tweet at or below `floor` is reached.
+
+    Datura has no since-id filter, but the query is passed on to the Twitter search, so
+    every further page is requested with a `max_id:` operator below the oldest tweet seen.
+
+    Args:
+        query (str): The search query.
+        user (str): Only tweets from this account.
+        floor (int): Tweets at or below this ID are already stored (-1 for none).
+        ceiling (int, optional): Only tweets below this ID (None for the newest tweets).
+        start_date (str): First day (YYYY-MM-DD) of the search window (the day of the floor tweet).
+        end_date (str): Last day (YYYY-MM-DD) of the search window.
+        count (int): Tweets fetched per search.
+        budget (int): Maximum number of searches.
+
+    Returns:
+        tuple: `(records, oldest_id, closed, searches)` - the tweet records above the floor,
+        the oldest ID fetched, whether the range down to the floor was fully covered and
+        how many searches were used.
+    """
+    records = []
+    oldest_id = ceiling
+    for searches in range(1, budget + 1):
+        page_query = query if oldest_id is None else f"{query} max_id:{oldest_id - 1}"
+        results = await search_tweets_async(page_query, user, start_date, end_date, count, "Latest")
+        page = [to_tweet_record(tweet, query) for tweet in results if tweet.get("id") is not None]
+        if not page:
+            return records, oldest_id, True, searches
+        records.extend(record for record in page if int(record["_id"]) > floor)
+        page_oldest = min(int(record["_id"]) for record in page)
+        # Reached the stored tweets, or the search window has nothing older
+        if page_oldest <= floor or len(results) < count:
+            return records, page_oldest, True, searches
+        if oldest_id is not None and page_oldest >= oldest_id:
+            # The search ignored max_id: paging further would repeat the same page
+            logger.warning(f"Search {query!r} cannot page backwards; some tweets may be missed.")
+            return records, page_oldest, True, searches
+        oldest_id = page_oldest
+    return records, oldest_id, False, budget
+
+
+async def ingest_new_tweets(query: str, user: str, count: int, days: int, max_pages: int = TWEET_INGEST_MAX_PAGES) -> list:
+    """
+    Fetches only the tweets newer than the last ingestion of a query and stores them.
+
+    The newest tweet ID and timestamp seen per (query, user) are kept as a cursor in
+    Redis. The search pages backwards from the newest tweet until it reaches the cursor
+    (or, on the first run, the start of the `days` window), so bursts of more than `count`
+    tweets are ingested completely. When the `max_pages` budget runs out first, the range
+    still missing is remembered in the cursor as a gap and filled by the next runs. New
+    tweets are stored as full records in MongoDB.
+
+    Args:
+        query (str): The search query.
+        user (str): Only tweets from this account.
+        count (int): The number of tweets fetched per search.
+        days (int): The look-back window (days) when no cursor exists yet.
+        max_pages (int): Maximum searches per run.
+
+    Returns:
+        list: The records of the tweets that were not seen before.
+    """
+    redis = await get_redis_connection()
+    cursor_key = TWEET_CURSOR_PREFIX + hashlib.sha1(f"{query}\0{user}".encode("utf-8")).hexdigest()
+    cursor = await redis.get(cursor_key)
+    cursor = json.loads(cursor) if cursor else None
+
+    current_date = datetime.datetime.utcnow()
+    end_date = current_date.strftime("%Y-%m-%d")
+    if cursor is not None:
+        last_id = int(cursor["id"])
+        last_date = datetime.datetime.fromisoformat(cursor["created_at"]).strftime("%Y-%m-%d")
+        gaps = cursor.get("gaps", [])
+    else:
+        last_id = -1
+        last_date = (current_date - datetime.timedelta(days=days)).strftime("%Y-%m-%d")
+        gaps = []
+
+    # Tweets published since the last run
+    new_records, oldest_id, closed, used = await ingest_range(query, user, last_id, None, last_date, end_date, count, max_pages)
+    if not closed:
+        gaps.append({"low": last_id, "low_date": last_date, "high": oldest_id})
+
+    # Ranges an earlier run could not reach, oldest gap last
+    remaining_gaps = []
+    for gap in gaps:
+        if used >= max_pages:
+            remaining_gaps.append(gap)
+            continue
+        records, oldest_id, closed, searches = await ingest_range(
+            query, user, gap["low"], gap["high"], gap["low_date"], end_date, count, max_pages - used
+        )
+        used += searches
+        new_records.extend(records)
+        if not closed:
+            remaining_gaps.append({**gap, "high": oldest_id})
+
+    new_records = dedupe_by_id(new_records, "_id")
+    if new_records:
+        await store_tweets(new_records)
+    newest = max(new_records, key=lambda record: int(record["_id"]), default=None)
+    if newest is not None and int(newest["_id"]) > last_id:
+        cursor = {"id": newest["_id"], "created_at": newest["created_at"].isoformat()}
+    if cursor is not None:
+        cursor["gaps"] = remaining_gaps
+        await redis.set(cursor_key, json.dumps(cursor))
+
+    if remaining_gaps:
+        logger.warning(f"Query {query!r} is {len(remaining_gaps)} range(s) behind; catching up on the next runs.")
+    logger.info(f"Ingested {len(new_records)} new tweets for query {query!r} in {used} search(es).")
+    return new_records
+
+
+async def ingest_all_new_tweets(count: int, days: int, searches: list = DATURA_SEARCHES) -> list:
+    """
+    Runs the incremental ingestion of every configured search concurrently.
+
+    Args:
+        count (int): The maximum number of tweets to fetch per search.
+        days (int): The look-back window (days) for searches without a cursor yet.
+        searches (list): The `(query, user)` pairs to ingest.
+
+    Returns:
+        list: The records of the new tweets, deduplicated by tweet ID.
+    """
+    new_records = await fan_out(lambda query, user: ingest_new_tweets(query, user, count, days), searches)
+    return dedupe_by_id(new_records, "_id")
+
+
+async def get_tweets(count: int, days: int, searches: list = DATURA_SEARCHES):
     """
     Fetches a list of tweet texts based on specific filters from Datura API.
+
+    Every configured search runs concurrently; tweets found by several searches are
+    returned once.
     
     Args:
-        count (int): The number of tweets to fetch.
+        count (int): The number of tweets to fetch per search.
         days (int): The number of past days to consider when fetching tweets.
+        searches (list): The `(query, user)` pairs to search.
     
     Returns:
         list: A list of tweet texts.
@@ -38,24 +365,12 @@ def get_tweets(count: int, days: int):
         start_date = (current_date - datetime.timedelta(days=days)).strftime("%Y-%m-%d")
         end_date = current_date.strftime("%Y-%m-%d")
         
-        # Make the API call to fetch tweets with the given parameters
-        results = datura.basic_twitter_search(
-            query="Whats going on with Bittensor",  # The search query for tweets
-            sort="Top",  # Sort by 'Top' tweets
-            user="elonmusk",  # Tweets from user "elonmusk"
-            start_date=start_date,  # Filter tweets from the start date
-            end_date=end_date,  # Filter tweets up to the current date
-            lang="en",  # Only tweets in English
-            verified=True,  # Only verified accounts
-            blue_verified=True,  # Blue verified accounts
-            is_quote=True,  # Include tweets that are quotes
-            is_video=True,  # Include tweets that have video
-            is_image=True,  # Include tweets that have images
-            min_retweets=1,  # Minimum retweets required
-            min_replies=1,  # Minimum replies required
-            min_likes=1,  # Minimum likes required
-            count=count  # Number of tweets to retrieve
+        # Make the API calls to fetch tweets with the given parameters
+        results = await fan_out(
+            lambda query, user: search_tweets_async(query, user, start_date, end_date, count),
+            searches,
         )
+        results = dedupe_by_id(results)
         
         # Check if results are empty and log if necessary
         if not results:
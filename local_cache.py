@@ -0,0 +1,202 @@
+import asyncio
+import json
+import logging
+import time
+import uuid
+from collections import OrderedDict
+from redis_interface import get_redis_connection, get_pubsub_connection
+from config import L1_CACHE_MAX_ENTRIES, L1_CACHE_MAX_BYTES, L1_CACHE_TTL, DIVIDEND_CACHE_BLOCK_SPAN
+
+# Set up logging for invalidation events
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Redis pub/sub channel carrying the keys to drop from every worker's local cache, as
+# {"origin": ..., "keys": [...]}; the sender ignores its own broadcasts
+L1_INVALIDATE_CHANNEL = "tao:l1_invalidate"
+
+
+class LocalCache:
+    """
+    A bounded in-process LRU cache with per-entry TTL, sitting in front of Redis.
+
+    Entries are keyed like the Redis keys they mirror and remember the block their value
+    was read at, so callers can apply the same block validity rule as for Redis. The
+    cache is bounded both in entries and in (estimated) bytes; the least recently used
+    entries are evicted first. Caches holding different kinds of entries broadcast their
+    invalidations on different channels.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = L1_CACHE_MAX_ENTRIES,
+        max_bytes: int = L1_CACHE_MAX_BYTES,
+        ttl: float = L1_CACHE_TTL,
+        channel: str = L1_INVALIDATE_CHANNEL,
+    ):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.channel = channel
+        self._entries = OrderedDict()
+        self.size_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.origin = uuid.uuid4().hex
+        self._listener_task = None
+
+    @staticmethod
+    def _estimate_size(key, value) -> int:
+        """
+        Rough memory footprint of an entry, based on its JSON encoding.
+        """
+        return len(key) + len(json.dumps(value, default=str))
+
+    def get(self, key, min_block=None):
+        """
+        Look up an entry, dropping it if its TTL has passed or it was read too long ago.
+
+        Args:
+            key (str): The cache key.
+            min_block (int, optional): Entries read before this block count as a miss.
+
+        Returns:
+            tuple: `(value, block)` if present, None otherwise.
+        """
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        value, block, expires_at, size = entry
+        if expires_at <= time.monotonic() or (min_block is not None and block < min_block):
+            self._remove(key)
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return value, block
+
+    def set(self, key, value, block):
+        """
+        Store an entry and evict least recently used entries beyond the size limits.
+
+        Args:
+            key (str): The cache key.
+            value (Any): The cached value (must be JSON serializable).
+            block (int): The block number the value was read at.
+        """
+        size = self._estimate_size(key, value)
+        if size > self.max_bytes:
+            return
+        self._remove(key)
+        self._entries[key] = (value, block, time.monotonic() + self.ttl, size)
+        self.size_bytes += size
+        while len(self._entries) > self.max_entries or self.size_bytes > self.max_bytes:
+            oldest = next(iter(self._entries))
+            self._remove(oldest)
+            self.evictions += 1
+
+    def _remove(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.size_bytes -= entry[3]
+
+    def invalidate(self, keys):
+        """
+        Drop the given keys from this process's cache.
+
+        Args:
+            keys (Iterable[str]): The keys to drop.
+        """
+        for key in keys:
+            self._remove(key)
+
+    def evict_older_than(self, block):
+        """
+        Drop every entry read before the given block.
+
+        Args:
+            block (int): Entries with a smaller block number are dropped.
+        """
+        for key in [key for key, entry in self._entries.items() if entry[1] < block]:
+            self._remove(key)
+
+    async def broadcast_invalidation(self, keys):
+        """
+        Drop keys locally and ask every other worker to drop them too, e.g. once their
+        Redis entries were replaced. A failed broadcast is logged, never raised: the other
+        workers then keep their copies until the TTL or the next block span.
+
+        Args:
+            keys (list): The keys to drop.
+        """
+        self.invalidate(keys)
+        try:
+            redis = await get_redis_connection()
+            await redis.publish(self.channel, json.dumps({"origin": self.origin, "keys": list(keys)}))
+        except Exception as e:
+            logger.error(f"Failed to broadcast the invalidation of {len(keys)} local cache keys: {e}")
+
+    async def start_invalidation_listener(self, new_block_channel: str = None):
+        """
+        Subscribe to invalidation broadcasts and new-block announcements so that every
+        worker drops outdated entries at the same time.
+
+        Args:
+            new_block_channel (str, optional): The channel on which new finalized blocks are published, for caches keyed by block.
+        """
+        if self._listener_task is None:
+            self._listener_task = asyncio.create_task(self._listen(new_block_channel))
+
+    async def stop_invalidation_listener(self):
+        """
+        Stop the pub/sub listener.
+        """
+        if self._listener_task is not None:
+            self._listener_task.cancel()
+            try:
+                await self._listener_task
+            except asyncio.CancelledError:
+                pass
+            self._listener_task = None
+
+    async def _listen(self, new_block_channel):
+        while True:
+            try:
+                # Subscriptions use the pub/sub pool, whose connections do not time out while idle
+                redis = await get_pubsub_connection()
+                async with redis.pubsub() as pubsub:
+                    await pubsub.subscribe(*[channel for channel in (self.channel, new_block_channel) if channel])
+                    async for message in pubsub.listen():
+                        if message["type"] != "message":
+                            continue
+                        payload = json.loads(message["data"])
+                        if message["channel"] == new_block_channel:
+                            # Keep entries that are still valid within the current block span
+                            number = payload["number"]
+                            self.evict_older_than(number - number % DIVIDEND_CACHE_BLOCK_SPAN)
+                        elif payload["origin"] != self.origin:
+                            self.invalidate(payload["keys"])
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Local cache invalidation listener failed: {e}")
+                await asyncio.sleep(1)
+
+    def stats(self) -> dict:
+        """
+        Report the hit/miss counters and current size of the cache.
+
+        Returns:
+            dict: Hits, misses, evictions, entry count and estimated bytes.
+        """
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "entries": len(self._entries),
+            "bytes": self.size_bytes,
+            "max_entries": self.max_entries,
+            "max_bytes": self.max_bytes,
+        }
@@ -1,20 +1,110 @@
+import json
 import logging
-from typing import Optional
-from fastapi import FastAPI, Depends, HTTPException, Query
+from contextlib import asynccontextmanager
+from datetime import datetime, timezone
+from typing import Literal, Optional
+from fastapi import FastAPI, Depends, HTTPException, Query, Header, Request, BackgroundTasks
+from fastapi.responses import StreamingResponse
 from fastapi.security import OAuth2PasswordRequestForm
-from bittensor_interface import get_tao_dividend_from_netuid_address, get_tao_dividends_for_subnet, get_tao_dividends_for_address
-from authenticator import authenticate_user, create_access_token, get_current_user
-from database import store_user
-from trading import trading_process
-from sentiment_task import analyze_sentiment
-
-# Initialize FastAPI app and APScheduler
-app = FastAPI()
+from bittensor_interface import (
+    get_tao_dividend_from_netuid_address,
+    get_tao_dividends_for_subnet,
+    get_tao_dividends_for_address,
+    stream_subnet_dividends,
+    get_coalescing_stats,
+    get_cache_tier_stats,
+    dividend_local_cache,
+    evict_outdated_local_entries,
+)
+from authenticator import (
+    authenticate_user,
+    create_access_token,
+    get_current_user,
+    get_current_user_profile,
+    revoke_token,
+    revoke_user_tokens,
+    user_cache,
+)
+from database import (
+    store_user,
+    ensure_indexes,
+    trading_log_writer,
+    trade_filter,
+    iter_trading_logs,
+    aggregate_trading_totals,
+    encode_trade_cursor,
+)
+from utils import password_hash_pool
+from rate_limiter import hit_fixed_window
+from trade_jobs import submit_trade_job, get_trade_job, wait_for_trade_job
+from celery_worker import execute_trade_task
+from sentiment_task import analyze_sentiment, get_shared_scoring_stats
+from chutes_ai_interface import get_chutes_client, get_scoring_usage
+from score_cache import score_cache
+from sentiment_state import sentiment_mirror
+from substrate_pool import get_substrate_pool
+from redis_interface import init_redis_pool, close_redis_pool, get_redis_pool_stats
+from block_watcher import get_block_watcher, get_current_block, NEW_BLOCK_CHANNEL
+from cache_warmer import cache_warmer, record_request
+from models import Principal, UserProfile, TradeJob
+from config import (
+    BLOCK_WATCHER_ENABLED,
+    L1_CACHE_PUBSUB,
+    WARM_ENABLED,
+    TRADE_JOB_MAX_WAIT,
+    LOGIN_RATE_WINDOW,
+    LOGIN_RATE_LIMIT_PER_USER,
+    LOGIN_RATE_LIMIT_PER_IP,
+    TRADES_PAGE_SIZE,
+    TRADES_MAX_PAGE_SIZE,
+    TRADES_ADMIN_USERS,
+)
 
 # Set up logging for debugging and monitoring
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Open shared resources at startup and release them at shutdown.
+    """
+    # Create the shared Redis pool before anything that might use it
+    init_redis_pool()
+    # Make sure lookups are indexed and usernames unique (existing indexes are left as they are);
+    # refuse to start if usernames cannot be kept unique
+    await ensure_indexes()
+    # Warm up the substrate connection pool so the first request skips the handshake
+    await get_substrate_pool().start()
+    # Follow finalized heads so cached dividends are refreshed exactly when the chain moves
+    get_block_watcher().add_listener(evict_outdated_local_entries)
+    # Refresh configured and recently requested dividends on every new block
+    if WARM_ENABLED:
+        get_block_watcher().add_listener(cache_warmer.on_new_block)
+    if BLOCK_WATCHER_ENABLED:
+        await get_block_watcher().start()
+    # Keep every worker's in-process cache coherent through Redis pub/sub
+    if L1_CACHE_PUBSUB:
+        await dividend_local_cache.start_invalidation_listener(NEW_BLOCK_CHANNEL)
+        await user_cache.start_invalidation_listener()
+    # Mirror the sentiment published by the Celery worker so trades read it locally
+    await sentiment_mirror.start()
+    try:
+        yield
+    finally:
+        await sentiment_mirror.stop()
+        await dividend_local_cache.stop_invalidation_listener()
+        await user_cache.stop_invalidation_listener()
+        await get_block_watcher().stop()
+        await cache_warmer.stop()
+        await trading_log_writer.close()
+        await get_chutes_client().close()
+        await get_substrate_pool().close()
+        await close_redis_pool()
+
+# Initialize FastAPI app and APScheduler
+app = FastAPI(lifespan=lifespan)
+
 # Root endpoint to guide users to the Swagger documentation
 @app.get("/")
 def read_root():
@@ -23,6 +113,43 @@ def read_root():
     """
     return {"message": "Please refer to the Swagger doc at /docs"}
 
+# Metrics endpoint exposing connection pool statistics for capacity planning
+@app.get("/api/v1/metrics")
+async def get_metrics():
+    """
+    Report runtime statistics of the shared connection pools.
+
+    Returns:
+        - redis_pool: In-use / idle connections and wait counts of the Redis pool.
+        - substrate_pool: Health and in-flight queries per substrate connection.
+        - dividend_coalescing: Cache misses served by a shared in-flight chain query.
+        - dividend_cache: Hit/miss counters of the in-process, Redis and chain tiers.
+        - cache_warmer: Activity of the per-block cache warm-up.
+        - sentiment_scoring: Outcome and per-tweet latencies of the last tweet scoring batch (any worker).
+        - chutes_client: Requests and retries of the Chutes API client (all workers) and its rate limiting.
+        - sentiment_usage: Tokens and seconds per tweet of the single-tweet and batched scoring modes (all workers).
+        - tweet_score_cache: Hit rate of the content-addressed tweet score cache (all workers).
+        - sentiment: Version, age and global value of the sentiment mirrored by this worker.
+        - user_cache: Hit/miss counters of this worker's user profile cache.
+        - password_hashing: Queued / running bcrypt operations, failures and their wait and run times.
+        - trading_log_writer: Buffered, written and spilled trading logs of this process.
+    """
+    return {
+        "redis_pool": get_redis_pool_stats(),
+        "substrate_pool": get_substrate_pool().stats(),
+        "dividend_coalescing": get_coalescing_stats(),
+        "dividend_cache": get_cache_tier_stats(),
+        "cache_warmer": cache_warmer.stats(),
+        "sentiment_scoring": await get_shared_scoring_stats(),
+        "chutes_client": await get_chutes_client().stats(),
+        "sentiment_usage": await get_scoring_usage(),
+        "tweet_score_cache": await score_cache.stats(),
+        "sentiment": sentiment_mirror.stats(),
+        "user_cache": user_cache.stats(),
+        "password_hashing": password_hash_pool.stats(),
+        "trading_log_writer": trading_log_writer.stats(),
+    }
+
 # Register endpoint to create a new user
 @app.post("/api/v1/register")
 async def register(
@@ -55,17 +182,33 @@ async def register(
 
 # Login endpoint to authenticate a user and return a JWT token
 @app.post("/api/v1/login")
-async def login(form_data: OAuth2PasswordRequestForm = Depends()):
+async def login(request: Request, form_data: OAuth2PasswordRequestForm = Depends()):
     """
     Authenticate a user and return a JWT access token.
+    Login attempts are rate limited per username and per client IP.
 
     Parameters:
+        - request: The incoming request, used for the client IP.
         - form_data: The OAuth2 password request form containing the username and password.
 
     Returns:
         - access_token: The JWT token for the authenticated user.
         - token_type: The type of the token, which is 'bearer'.
     """
+    # Refuse bursts before spending any bcrypt time on them
+    client_ip = request.client.host if request.client else "unknown"
+    for key, limit in (
+        (f"login:user:{form_data.username}", LOGIN_RATE_LIMIT_PER_USER),
+        (f"login:ip:{client_ip}", LOGIN_RATE_LIMIT_PER_IP),
+    ):
+        allowed, retry_after = await hit_fixed_window(key, limit, LOGIN_RATE_WINDOW)
+        if not allowed:
+            raise HTTPException(
+                status_code=429,
+                detail="Too many login attempts, please retry later",
+                headers={"Retry-After": str(retry_after)},
+            )
+
     # Authenticate the user with the provided username and password
     
     user = await authenticate_user(form_data.username, form_data.password)
@@ -74,70 +217,309 @@ async def login(form_data: OAuth2PasswordRequestForm = Depends()):
         raise HTTPException(status_code=400, detail="Incorrect username or password")
     
     # Generate an access token for the authenticated user
-    access_token = create_access_token(data={"sub": user.username})
+    access_token = create_access_token(data={"sub": user["username"]})
     print(access_token)
     return {"access_token": access_token, "token_type": "bearer"}
 
+# Logout endpoint to revoke the current JWT token
+@app.post("/api/v1/logout")
+async def logout(user: Principal = Depends(get_current_user)):
+    """
+    Revoke the access token used for this request.
+
+    Parameters:
+        - user: Current authenticated user (automatically passed by Depends).
+
+    Returns:
+        - message: Confirmation that the token was revoked.
+    """
+    await revoke_token(user)
+    return {"message": "Token revoked"}
+
+# Logout endpoint to revoke every JWT token of the current user (all sessions)
+@app.post("/api/v1/logout/all")
+async def logout_all(user: Principal = Depends(get_current_user)):
+    """
+    Revoke every access token issued to the current user so far, e.g. after a device was lost.
+
+    Parameters:
+        - user: Current authenticated user (automatically passed by Depends).
+
+    Returns:
+        - message: Confirmation that the tokens were revoked.
+    """
+    await revoke_user_tokens(user.username)
+    return {"message": "All tokens revoked"}
+
+# Profile endpoint returning the stored data of the current user
+@app.get("/api/v1/users/me")
+async def read_current_user(user: UserProfile = Depends(get_current_user_profile)):
+    """
+    Return the profile of the authenticated user.
+
+    Parameters:
+        - user: The stored profile of the current user (automatically passed by Depends).
+
+    Returns:
+        - username, full_name and email of the user.
+    """
+    return user.dict()
+
 @app.get("/api/v1/tao_dividends")
 async def get_tao_dividends(
+    background_tasks: BackgroundTasks,
     netuid: Optional[int] = Query(None, description="Filter by netuid"),
     hotkey: Optional[str] = Query(None, description="Filter by hotkey"),
     trade: bool = Query(False, description="Include trade data in the response"),
-    user: dict = Depends(get_current_user)  # Ensure the user is authenticated
+    idempotency_key: Optional[str] = Header(None, description="Requests with the same key queue a single trade"),
+    user: Principal = Depends(get_current_user)  # Ensure the user is authenticated
 ):
     """
     Fetch TAO dividends based on optional netuid and hotkey filters.
-    The function also triggers trade actions if the trade parameter is set to True.
+    The function also queues a trade action if the trade parameter is set to True; the trade
+    runs on a Celery worker and its progress is read from `/api/v1/trade_jobs/{job_id}`.
     
     Parameters:
+        - background_tasks: Used to record the request for the cache warmer after responding.
         - netuid: Optional filter by netuid (integer).
         - hotkey: Optional filter by hotkey (string).
         - trade: Boolean flag indicating if trade data should be included in the response.
+        - idempotency_key: Optional `Idempotency-Key` header; without it, one trade is queued per
+          user, netuid, hotkey and finalized block.
         - user: Current authenticated user (automatically passed by Depends).
     
     Returns:
-        - A JSON response with the relevant dividend data and additional metadata.
+        - A JSON response with the relevant dividend data, the finalized block it was read at,
+          whether it was served from the cache, its staleness and age, whether a trade was queued
+          and its job ID, and additional metadata.
     """
-    stake_tx_triggered = False  # Flag to track if a trade action is triggered
+    stake_tx_triggered = False  # Flag to track if a trade action is queued
+    trade_job_id = None
     
-    # If 'trade' is true, attempt to trigger a trade action with netuid and hotkey
+    # If 'trade' is true, queue a trade action with netuid and hotkey
     if trade:
         if netuid is not None and hotkey is not None:
-            stake_tx_triggered = await trading_process(netuid, hotkey, user)
+            # Trade on the sentiment seen now; a zero score would not trade anyway
+            score = sentiment_mirror.get(netuid)
+            if score != 0:
+                if idempotency_key is None:
+                    current_block, _ = await get_current_block()
+                    idempotency_key = f"{netuid}:{hotkey}:{current_block}"
+                trade_job_id, _ = await submit_trade_job(
+                    user.username, netuid, hotkey, score, idempotency_key,
+                    dispatch=lambda job_id: execute_trade_task.apply_async(args=[job_id], task_id=job_id),
+                )
+                stake_tx_triggered = True
     
     # Handle different cases based on the presence of netuid and hotkey
     if netuid is None and hotkey is None:
         return {"message": "No netuid or hotkey provided"}
+
+    # Let the cache warmer learn which subnets / hotkeys are in demand, after responding
+    background_tasks.add_task(record_request, netuid, hotkey)
     
-    elif netuid is not None and hotkey is not None:
+    if netuid is not None and hotkey is not None:
         # Fetch dividends based on both netuid and hotkey
-        value = await get_tao_dividend_from_netuid_address(netuid=netuid, address=hotkey)
-        return {
-            "netuid": netuid,
-            "hotkey": hotkey,
-            "dividend": value,
-            "cached": True,
-            "stake_tx_triggered": stake_tx_triggered
-        }
+        result = await get_tao_dividend_from_netuid_address(netuid=netuid, address=hotkey)
     
     elif netuid is not None:
         # Fetch dividends for the entire subnet associated with netuid
-        values = await get_tao_dividends_for_subnet(netuid)
-        return {
-            "netuid": netuid,
-            "hotkey": hotkey,
-            "dividend": values,
-            "cached": True,
-            "stake_tx_triggered": stake_tx_triggered
-        }
+        result = await get_tao_dividends_for_subnet(netuid)
     
     else:
-        # Fetch dividends for a specific hotkey
-        values = await get_tao_dividends_for_address(hotkey)
-        return {
-            "netuid": netuid,
-            "hotkey": hotkey,
-            "dividend": values,
-            "cached": True,
-            "stake_tx_triggered": stake_tx_triggered
-        }
+        # Fetch dividends for a specific hotkey across every subnet
+        result = await get_tao_dividends_for_address(hotkey)
+
+    return {
+        "netuid": netuid,
+        "hotkey": hotkey,
+        "dividend": result.dividend,
+        "block": result.block,
+        "cached": result.cached,
+        "stale": result.stale,
+        "age": result.age,
+        "stake_tx_triggered": stake_tx_triggered,
+        "trade_job_id": trade_job_id
+    }
+
+@app.get("/api/v1/trade_jobs/{job_id}", response_model=TradeJob)
+async def get_trade_job_status(
+    job_id: str,
+    wait: float = Query(0, ge=0, description="Seconds to wait for the job to finish before answering"),
+    user: Principal = Depends(get_current_user)  # Ensure the user is authenticated
+):
+    """
+    Report the progress of a queued trade.
+
+    Parameters:
+        - job_id: The job ID returned by `/api/v1/tao_dividends`.
+        - wait: Optional long-poll: answer as soon as the job succeeds or fails, or after this
+          many seconds (at most `TRADE_JOB_MAX_WAIT`).
+        - user: Current authenticated user (automatically passed by Depends).
+
+    Returns:
+        - The job: its status ('queued', 'running', 'succeeded' or 'failed'), the trade it makes and,
+          once finished, whether a stake / unstake was executed.
+    """
+    if wait > 0:
+        job = await wait_for_trade_job(job_id, min(wait, TRADE_JOB_MAX_WAIT))
+    else:
+        job = await get_trade_job(job_id)
+
+    # Jobs of other users are reported as missing
+    if job is None or job["username"] != user.username:
+        raise HTTPException(status_code=404, detail="Trade job not found")
+    return job
+
+@app.get("/api/v1/tao_dividends/stream")
+async def stream_tao_dividends(
+    background_tasks: BackgroundTasks,
+    netuid: int = Query(..., description="The netuid whose dividends are streamed"),
+    user: Principal = Depends(get_current_user)  # Ensure the user is authenticated
+):
+    """
+    Stream the TAO dividends of a whole subnet as newline-delimited JSON.
+
+    Rows are sent as soon as they are read from the cache or the chain, so large subnets
+    neither wait for the full scan nor hold it in memory. The finalized block the rows
+    are read at is sent up front in the `X-Block-Number` / `X-Block-Hash` headers.
+
+    Parameters:
+        - background_tasks: Used to record the request for the cache warmer after responding.
+        - netuid: The netuid whose dividends are streamed.
+        - user: Current authenticated user (automatically passed by Depends).
+
+    Returns:
+        - An `application/x-ndjson` stream of `{"hotkey": ..., "dividend": ...}` rows.
+    """
+    current_block, current_hash = await get_current_block()
+    background_tasks.add_task(record_request, netuid, None)
+
+    async def rows():
+        async for hotkey, dividend in stream_subnet_dividends(netuid, current_block, current_hash):
+            yield json.dumps({"hotkey": hotkey, "dividend": dividend}) + "\n"
+
+    return StreamingResponse(
+        rows(),
+        media_type="application/x-ndjson",
+        headers={"X-Block-Number": str(current_block), "X-Block-Hash": current_hash},
+    )
+
+def to_naive_utc(value: Optional[datetime]) -> Optional[datetime]:
+    """
+    Convert a query time to naive UTC, the way MongoDB stores trading log timestamps.
+    """
+    if value is not None and value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+def trade_history_filter(user: Principal, user_id, netuid, hotkey, action_type, since, until) -> dict:
+    """
+    Build the trading history filter of a request. Users listed in `TRADES_ADMIN_USERS`
+    may read any user's trades; everyone else only reads their own.
+    """
+    if user.username not in TRADES_ADMIN_USERS:
+        if user_id is not None and user_id != user.username:
+            raise HTTPException(status_code=403, detail="Not allowed to read the trades of other users")
+        user_id = user.username
+    return trade_filter(user_id, netuid, hotkey, action_type, to_naive_utc(since), to_naive_utc(until))
+
+def trade_to_json(trade: dict) -> dict:
+    """
+    Convert a trading log document to its JSON representation.
+    """
+    trade = dict(trade)
+    trade["id"] = str(trade.pop("_id"))
+    trade["timestamp"] = trade["timestamp"].isoformat()
+    return trade
+
+# Trading history endpoint with keyset pagination
+@app.get("/api/v1/trades")
+async def get_trades(
+    user_id: Optional[str] = Query(None, description="Filter by user (defaults to the current user)"),
+    netuid: Optional[int] = Query(None, description="Filter by netuid"),
+    hotkey: Optional[str] = Query(None, description="Filter by hotkey"),
+    action_type: Optional[Literal["stake", "unstake"]] = Query(None, description="Filter by action type"),
+    since: Optional[datetime] = Query(None, description="Only trades at or after this time (ISO 8601)"),
+    until: Optional[datetime] = Query(None, description="Only trades before this time (ISO 8601)"),
+    cursor: Optional[str] = Query(None, description="The next_cursor of the previous page"),
+    limit: Optional[int] = Query(None, ge=1, description="Maximum number of trades"),
+    format: Literal["json", "ndjson"] = Query("json", description="json pages or an NDJSON stream"),
+    user: Principal = Depends(get_current_user)  # Ensure the user is authenticated
+):
+    """
+    Read the trading history, newest first.
+
+    Pages are cut on (timestamp, id) rather than with an offset, so deep pages are as cheap
+    as the first one and trades logged meanwhile do not shift them.
+
+    Parameters:
+        - user_id, netuid, hotkey, action_type: Optional filters.
+        - since, until: Optional time range.
+        - cursor: Resume after the last trade of the previous page.
+        - limit: Page size for `json` (default `TRADES_PAGE_SIZE`, at most `TRADES_MAX_PAGE_SIZE`);
+          optional cap for `ndjson`.
+        - format: `json` returns one page; `ndjson` streams every matching trade, one per line.
+        - user: Current authenticated user (automatically passed by Depends).
+
+    Returns:
+        - json: `trades` and `next_cursor` (None on the last page).
+        - ndjson: An `application/x-ndjson` stream of trades.
+    """
+    query = trade_history_filter(user, user_id, netuid, hotkey, action_type, since, until)
+
+    if format == "ndjson":
+        trades = iter_trading_logs(query, after=cursor, limit=limit)
+        # Read the first trade now so a bad cursor is reported as a 400, not a broken stream
+        try:
+            first = await anext(trades, None)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+        async def rows():
+            if first is None:
+                return
+            yield json.dumps(trade_to_json(first)) + "\n"
+            async for trade in trades:
+                yield json.dumps(trade_to_json(trade)) + "\n"
+
+        return StreamingResponse(rows(), media_type="application/x-ndjson")
+
+    page_size = min(limit or TRADES_PAGE_SIZE, TRADES_MAX_PAGE_SIZE)
+    try:
+        # Read one trade more than the page to know whether another page follows
+        trades = [trade async for trade in iter_trading_logs(query, after=cursor, limit=page_size + 1)]
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    next_cursor = encode_trade_cursor(trades[page_size - 1]) if len(trades) > page_size else None
+    return {
+        "trades": [trade_to_json(trade) for trade in trades[:page_size]],
+        "next_cursor": next_cursor,
+    }
+
+# Trading totals endpoint computed with a MongoDB aggregation pipeline
+@app.get("/api/v1/trades/totals")
+async def get_trade_totals(
+    group_by: Literal["day", "subnet", "day_subnet"] = Query("day", description="Compute totals per day, subnet or both"),
+    user_id: Optional[str] = Query(None, description="Filter by user (defaults to the current user)"),
+    netuid: Optional[int] = Query(None, description="Filter by netuid"),
+    hotkey: Optional[str] = Query(None, description="Filter by hotkey"),
+    since: Optional[datetime] = Query(None, description="Only trades at or after this time (ISO 8601)"),
+    until: Optional[datetime] = Query(None, description="Only trades before this time (ISO 8601)"),
+    user: Principal = Depends(get_current_user)  # Ensure the user is authenticated
+):
+    """
+    Sum the staked and unstaked amounts of the trading history per day and / or subnet.
+
+    Parameters:
+        - group_by: `day` (UTC), `subnet` or `day_subnet`.
+        - user_id, netuid, hotkey: Optional filters.
+        - since, until: Optional time range.
+        - user: Current authenticated user (automatically passed by Depends).
+
+    Returns:
+        - totals: Per group, its `day` and / or `netuid`, the `staked` and `unstaked` amounts and
+          the number of `stakes` and `unstakes`.
+    """
+    query = trade_history_filter(user, user_id, netuid, hotkey, None, since, until)
+    return {"group_by": group_by, "totals": await aggregate_trading_totals(query, group_by)}
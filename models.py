@@ -1,23 +1,47 @@
 from pydantic import BaseModel, EmailStr, Field
 from datetime import datetime
-from typing import Optional
+from typing import Any, Optional
 
-class User(BaseModel):
+class UserProfile(BaseModel):
     """
-    Represents a user in the system.
+    Represents the public profile of a user, without credentials.
     
     Attributes:
         username (str): The unique username of the user.
         full_name (str): The full name of the user.
         email (EmailStr): The email of the user, validated to be in the correct email format.
-        hashed_password (str): The hashed password of the user.
     """
     username: str
     full_name: str
     email: EmailStr  # Email field with automatic validation for valid email format.
+
+
+class User(UserProfile):
+    """
+    Represents a user in the system, as stored.
+    
+    Attributes:
+        hashed_password (str): The hashed password of the user.
+    """
     hashed_password: str
 
 
+class Principal(BaseModel):
+    """
+    Represents the authenticated caller, built from the claims of a verified access token.
+
+    Attributes:
+        username (str): The username the token was issued to (`sub` claim).
+        token_id (str): The unique ID of the token (`jti` claim), used to revoke it.
+        issued_at (datetime): When the token was issued (`iat` claim).
+        expires_at (datetime): When the token expires (`exp` claim).
+    """
+    username: str
+    token_id: str
+    issued_at: datetime
+    expires_at: datetime
+
+
 class TradingLog(BaseModel):
     """
     Represents a trading action log in the system.
@@ -40,3 +64,47 @@ class TradingLog(BaseModel):
     transaction_id: Optional[str] = None  # Transaction ID is optional (default is None)
 
 
+class DividendResult(BaseModel):
+    """
+    Represents a dividend lookup together with where and when it was read.
+
+    Attributes:
+        dividend (Any): The dividend value, subnet list or netuid -> dividend mapping.
+        block (int, optional): The finalized block number the value was read at (default is None).
+        cached (bool): Whether the value was served from the cache rather than the chain.
+        stale (bool): Whether a cached value is past its soft TTL or block span and is being refreshed.
+        age (float, optional): Seconds since the value was read from the chain (default is None).
+    """
+    dividend: Any = None
+    block: Optional[int] = None
+    cached: bool = False
+    stale: bool = False
+    age: Optional[float] = None
+
+
+class TradeJob(BaseModel):
+    """
+    Represents a queued trade and its progress.
+
+    Attributes:
+        job_id (str): The unique identifier of the job.
+        status (str): 'queued', 'running', 'succeeded' or 'failed'.
+        username (str): The user the trade is made for.
+        netuid (int): The network unique ID of the trade.
+        hotkey (str): The hotkey staked to or unstaked from.
+        score (float): The sentiment score the trade is based on.
+        created_at (float): UNIX time the job was queued.
+        updated_at (float): UNIX time of the last status change.
+        stake_tx_triggered (bool, optional): Whether a stake / unstake was executed, once the job finished (default is None).
+        error (str, optional): Why the job failed (default is None).
+    """
+    job_id: str
+    status: str
+    username: str
+    netuid: int
+    hotkey: str
+    score: float
+    created_at: float
+    updated_at: float
+    stake_tx_triggered: Optional[bool] = None
+    error: Optional[str] = None
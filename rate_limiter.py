@@ -0,0 +1,149 @@
+import asyncio
+import logging
+import time
+from redis_interface import get_redis_connection
+
+# Set up logging for Redis failures of the shared limiters
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Refills a shared bucket and reserves one token. A caller that finds the bucket empty
+# still takes its token (the balance goes negative) and is told how long to wait, so
+# callers across every process are served in arrival order with one round trip each.
+TOKEN_BUCKET_SCRIPT = """
+local rate = tonumber(ARGV[1])
+local capacity = tonumber(ARGV[2])
+local now = tonumber(ARGV[3])
+local tokens = tonumber(redis.call('hget', KEYS[1], 'tokens'))
+local updated = tonumber(redis.call('hget', KEYS[1], 'updated'))
+if tokens == nil or updated == nil then
+    tokens = capacity
+    updated = now
+end
+tokens = math.min(capacity, tokens + math.max(0, now - updated) * rate)
+local wait = 0
+if tokens < 1 then
+    wait = (1 - tokens) / rate
+end
+tokens = tokens - 1
+redis.call('hset', KEYS[1], 'tokens', tokens, 'updated', now)
+redis.call('expire', KEYS[1], math.ceil((capacity - tokens) / rate) + 1)
+return tostring(wait)
+"""
+
+
+class TokenBucket:
+    """
+    An in-process token bucket rate limiter for outgoing API calls.
+
+    Tokens are refilled continuously at `rate` per second up to `capacity`; every call
+    takes one token and waits until one is available. Waiters are served in order.
+    """
+
+    def __init__(self, rate: float, capacity: int):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = float(capacity)
+        self._updated_at = time.monotonic()
+        self._lock = None
+        self.waited = 0
+        self.wait_time = 0.0
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated_at) * self.rate)
+        self._updated_at = now
+
+    async def acquire(self):
+        """
+        Take one token, waiting for the bucket to refill if it is empty.
+        """
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            self._refill()
+            if self._tokens < 1:
+                delay = (1 - self._tokens) / self.rate
+                self.waited += 1
+                self.wait_time += delay
+                await asyncio.sleep(delay)
+                self._refill()
+            self._tokens -= 1
+
+    def stats(self) -> dict:
+        """
+        Report the configured limit and how often callers had to wait for it.
+
+        Returns:
+            dict: Rate, capacity, number of throttled calls and total seconds spent waiting.
+        """
+        return {
+            "rate_per_second": self.rate,
+            "capacity": self.capacity,
+            "throttled": self.waited,
+            "throttled_seconds": round(self.wait_time, 3),
+        }
+
+
+class RedisTokenBucket(TokenBucket):
+    """
+    A token bucket shared by every process (API and Celery workers) through Redis, so
+    that the configured rate is the total sent to the upstream API rather than the rate
+    of each process.
+
+    If Redis cannot be reached, calls fall back to the in-process bucket of the same rate.
+    """
+
+    def __init__(self, name: str, rate: float, capacity: int):
+        super().__init__(rate, capacity)
+        self.key = f"tao:rate_bucket:{name}"
+        self.fallbacks = 0
+
+    async def acquire(self):
+        """
+        Take one token from the shared bucket, waiting for the bucket to refill if it is empty.
+        """
+        try:
+            redis = await get_redis_connection()
+            delay = float(await redis.eval(TOKEN_BUCKET_SCRIPT, 1, self.key, self.rate, self.capacity, time.time()))
+        except Exception as e:
+            self.fallbacks += 1
+            logger.error(f"Shared rate limiter {self.key} unavailable, limiting this process only: {e}")
+            await super().acquire()
+            return
+        if delay > 0:
+            self.waited += 1
+            self.wait_time += delay
+            await asyncio.sleep(delay)
+
+    def stats(self) -> dict:
+        """
+        Report the configured limit and how often callers of this process had to wait for it.
+
+        Returns:
+            dict: Rate, capacity, throttled calls, seconds spent waiting and Redis fallbacks.
+        """
+        return {**super().stats(), "shared": True, "redis_fallbacks": self.fallbacks}
+
+
+async def hit_fixed_window(key: str, limit: int, window: int) -> tuple:
+    """
+    Count one attempt against a limit shared by every worker, in fixed Redis windows.
+
+    Args:
+        key (str): The limited subject (e.g. `login:user:alice`).
+        limit (int): Attempts allowed per window.
+        window (int): Window length in seconds.
+
+    Returns:
+        tuple: `(allowed, retry_after)` - whether the attempt is within the limit and the
+        seconds until the window resets.
+    """
+    now = time.time()
+    window_start = int(now // window * window)
+    redis = await get_redis_connection()
+    pipe = redis.pipeline(transaction=True)
+    pipe.incr(f"tao:rate_limit:{key}:{window_start}")
+    pipe.expire(f"tao:rate_limit:{key}:{window_start}", window)
+    count, _ = await pipe.execute()
+    return count <= limit, max(int(window_start + window - now), 1)
@@ -1,29 +1,218 @@
+import time
 import redis.asyncio as aioredis
-from config import REDIS_URL
+from config import (
+    REDIS_URL,
+    REDIS_MAX_CONNECTIONS,
+    REDIS_POOL_TIMEOUT,
+    REDIS_SOCKET_TIMEOUT,
+    REDIS_SOCKET_CONNECT_TIMEOUT,
+    REDIS_HEALTH_CHECK_INTERVAL,
+    REDIS_PUBSUB_MAX_CONNECTIONS,
+)
 import logging
 
 # Set up logger for connection issues or general use
 logger = logging.getLogger(__name__)
 logging.basicConfig(level=logging.INFO)
 
+
+class InstrumentedConnectionPool(aioredis.BlockingConnectionPool):
+    """
+    A blocking Redis connection pool that records how often callers had to wait for a
+    free connection and for how long, so the pool can be sized from real traffic.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.waits = 0
+        self.wait_time = 0.0
+        self.acquired = 0
+
+    async def get_connection(self, command_name, *keys, **options):
+        # A caller waits only when every connection is checked out and the pool is full
+        must_wait = not self.can_get_connection()
+        started = time.monotonic()
+        connection = await super().get_connection(command_name, *keys, **options)
+        self.acquired += 1
+        if must_wait:
+            self.waits += 1
+            self.wait_time += time.monotonic() - started
+        return connection
+
+
+# Process-wide pool and client, created in the app lifespan (or lazily on first use)
+redis_pool = None
+redis_client = None
+
+# Separate pool for pub/sub subscriptions. A subscription holds its connection while it
+# waits for messages, so it must neither time out like a command (no socket timeout) nor
+# take connections away from the command pool.
+pubsub_pool = None
+pubsub_client = None
+
+
+def init_redis_pool() -> aioredis.Redis:
+    """
+    Create the process-wide Redis connection pool and the client bound to it.
+
+    Calling this more than once returns the existing client.
+
+    Returns:
+        aioredis.Redis: The shared Redis client.
+    """
+    global redis_pool, redis_client
+    if redis_client is None:
+        redis_pool = InstrumentedConnectionPool.from_url(
+            REDIS_URL,
+            decode_responses=True,
+            max_connections=REDIS_MAX_CONNECTIONS,
+            timeout=REDIS_POOL_TIMEOUT,
+            socket_timeout=REDIS_SOCKET_TIMEOUT,
+            socket_connect_timeout=REDIS_SOCKET_CONNECT_TIMEOUT,
+            health_check_interval=REDIS_HEALTH_CHECK_INTERVAL,
+        )
+        redis_client = aioredis.Redis(connection_pool=redis_pool)
+        logger.info(f"Redis connection pool created (max_connections={REDIS_MAX_CONNECTIONS}).")
+    return redis_client
+
+
+def init_pubsub_pool() -> aioredis.Redis:
+    """
+    Create the process-wide pub/sub connection pool and the client bound to it.
+
+    Calling this more than once returns the existing client.
+
+    Returns:
+        aioredis.Redis: The client to open subscriptions with (`client.pubsub()`).
+    """
+    global pubsub_pool, pubsub_client
+    if pubsub_client is None:
+        pubsub_pool = aioredis.BlockingConnectionPool.from_url(
+            REDIS_URL,
+            decode_responses=True,
+            max_connections=REDIS_PUBSUB_MAX_CONNECTIONS,
+            timeout=REDIS_POOL_TIMEOUT,
+            socket_timeout=None,  # Idle subscriptions wait indefinitely for the next message
+            socket_connect_timeout=REDIS_SOCKET_CONNECT_TIMEOUT,
+            socket_keepalive=True,  # Let the kernel detect dead peers instead
+            health_check_interval=REDIS_HEALTH_CHECK_INTERVAL,
+        )
+        pubsub_client = aioredis.Redis(connection_pool=pubsub_pool)
+    return pubsub_client
+
+
+async def close_redis_pool():
+    """
+    Close the shared clients and disconnect every pooled connection.
+    """
+    global redis_pool, redis_client, pubsub_pool, pubsub_client
+    if redis_client is not None:
+        await redis_client.aclose()
+        await redis_pool.disconnect()
+        logger.info("Redis connection pool closed.")
+    if pubsub_client is not None:
+        await pubsub_client.aclose()
+        await pubsub_pool.disconnect()
+    redis_pool = None
+    redis_client = None
+    pubsub_pool = None
+    pubsub_client = None
+
+
 async def get_redis_connection():
     """
-    Establish an asynchronous connection to Redis using the provided URL from the config.
-    
-    This function uses the `aioredis` library to asynchronously connect to the Redis server.
-    
+    Return the shared Redis client backed by the process-wide connection pool.
+
+    Every caller shares the same pool, so no sockets are opened per call. Connections are
+    checked out per command and returned to the pool automatically.
+
     Returns:
-        aioredis.Redis: A Redis connection object for interacting with the Redis server.
-    
+        aioredis.Redis: A Redis client for interacting with the Redis server.
+
     Raises:
-        ConnectionError: If unable to connect to Redis.
+        ConnectionError: If the pool cannot be created.
     """
     try:
-        # Attempt to establish a Redis connection
-        redis_conn = await aioredis.from_url(REDIS_URL, decode_responses=True)
-        logger.info("Successfully connected to Redis.")
-        return redis_conn
+        return init_redis_pool()
     except Exception as e:
         # Log the exception and raise a ConnectionError with details
-        logger.error(f"Failed to connect to Redis: {e}")
+        logger.error(f"Failed to create Redis connection pool: {e}")
+        raise ConnectionError(f"Could not connect to Redis at {REDIS_URL}.") from e
+
+
+async def get_pubsub_connection():
+    """
+    Return the Redis client dedicated to pub/sub subscriptions.
+
+    Returns:
+        aioredis.Redis: A client whose `pubsub()` connections never time out while idle.
+
+    Raises:
+        ConnectionError: If the pool cannot be created.
+    """
+    try:
+        return init_pubsub_pool()
+    except Exception as e:
+        logger.error(f"Failed to create Redis pub/sub connection pool: {e}")
         raise ConnectionError(f"Could not connect to Redis at {REDIS_URL}.") from e
+
+
+async def incr_shared_stats(key: str, counters: dict):
+    """
+    Add to counters kept in a Redis hash, so that every process (API and Celery workers)
+    reports the same totals. Failures are logged, never raised.
+
+    Args:
+        key (str): The Redis hash holding the counters.
+        counters (dict): Amount to add per field; floats are added with HINCRBYFLOAT.
+    """
+    try:
+        redis = await get_redis_connection()
+        pipe = redis.pipeline(transaction=False)
+        for field, amount in counters.items():
+            if isinstance(amount, float):
+                pipe.hincrbyfloat(key, field, amount)
+            elif amount:
+                pipe.hincrby(key, field, amount)
+        await pipe.execute()
+    except Exception as e:
+        logger.error(f"Error while updating the shared statistics {key}: {e}")
+
+
+async def get_shared_stats(key: str) -> dict:
+    """
+    Read counters kept with `incr_shared_stats`.
+
+    Args:
+        key (str): The Redis hash holding the counters.
+
+    Returns:
+        dict: The value of every field (empty if Redis cannot be reached).
+    """
+    try:
+        redis = await get_redis_connection()
+        counters = await redis.hgetall(key)
+    except Exception as e:
+        logger.error(f"Error while reading the shared statistics {key}: {e}")
+        return {}
+    return {field: float(value) if "." in value else int(value) for field, value in counters.items()}
+
+
+def get_redis_pool_stats() -> dict:
+    """
+    Report the usage of the shared Redis connection pool.
+
+    Returns:
+        dict: Configured limit, connections in use and idle, and wait statistics.
+    """
+    if redis_pool is None:
+        return {"initialized": False, "max_connections": REDIS_MAX_CONNECTIONS}
+    return {
+        "initialized": True,
+        "max_connections": redis_pool.max_connections,
+        "in_use": len(redis_pool._in_use_connections),
+        "idle": len(redis_pool._available_connections),
+        "acquired": redis_pool.acquired,
+        "waits": redis_pool.waits,
+        "wait_time_seconds": round(redis_pool.wait_time, 6),
+    }
@@ -0,0 +1,168 @@
+import hashlib
+import logging
+import re
+import unicodedata
+from datetime import datetime, timedelta
+from pymongo import UpdateOne
+from redis_interface import get_redis_connection
+from database import tweet_scores_collection
+from config import CHUTES_MODEL, SCORE_CACHE_TTL, SCORE_CACHE_MONGO
+
+# Set up logging for cache backend failures
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Redis key prefix of cached tweet scores; the suffix is the content hash
+SCORE_CACHE_PREFIX = "tao:tweet_score:"
+
+# Redis hash of hit/miss counters, shared by every process using the cache
+SCORE_CACHE_STATS_KEY = "tao:tweet_score_stats"
+
+
+def normalize_tweet(text: str) -> str:
+    """
+    Normalize a tweet so that copies differing only in Unicode form or whitespace hash alike.
+
+    Args:
+        text (str): The tweet text.
+
+    Returns:
+        str: The NFKC-normalized text with whitespace collapsed.
+    """
+    return re.sub(r"\s+", " ", unicodedata.normalize("NFKC", text)).strip()
+
+
+def score_key(text: str, prompt_version: int, model: str = CHUTES_MODEL) -> str:
+    """
+    Content hash identifying the score of a tweet under a given model and prompt.
+
+    Args:
+        text (str): The tweet text.
+        prompt_version (int): Version of the scoring prompt; bump it to invalidate every score.
+        model (str): The LLM the tweet is scored with.
+
+    Returns:
+        str: A hex SHA-256 digest.
+    """
+    payload = f"{model}\0{prompt_version}\0{normalize_tweet(text)}"
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class ScoreCache:
+    """
+    Content-addressed cache of LLM sentiment scores.
+
+    Scores are stored in Redis under the hash of the normalized tweet, the model and the
+    prompt version, and expire after `SCORE_CACHE_TTL`. With `SCORE_CACHE_MONGO` enabled
+    they are also persisted to MongoDB (with a TTL index), which backs Redis after a
+    flush or eviction; Mongo hits are copied back to Redis. Hit/miss counters are kept
+    in Redis because scoring runs in the Celery worker while metrics are served by the API.
+    """
+
+    def __init__(self, ttl: int = SCORE_CACHE_TTL, use_mongo: bool = SCORE_CACHE_MONGO):
+        self.ttl = ttl
+        self.use_mongo = use_mongo
+        self._indexes_ready = False
+
+    async def _collection(self):
+        """
+        Return the Mongo collection of scores, creating its TTL index on first use.
+        """
+        if not self._indexes_ready:
+            await tweet_scores_collection.create_index("expires_at", expireAfterSeconds=0)
+            self._indexes_ready = True
+        return tweet_scores_collection
+
+    async def get_many(self, keys: list) -> dict:
+        """
+        Look up the cached scores of several tweets.
+
+        Args:
+            keys (list): Content hashes from `score_key`.
+
+        Returns:
+            dict: A mapping of content hash to score for the tweets found in the cache.
+        """
+        if not keys:
+            return {}
+        redis = await get_redis_connection()
+        values = await redis.mget([SCORE_CACHE_PREFIX + key for key in keys])
+        found = {key: float(value) for key, value in zip(keys, values) if value is not None}
+        hits = len(found)
+        mongo_hits = 0
+
+        missing = [key for key in keys if key not in found]
+        if missing and self.use_mongo:
+            try:
+                collection = await self._collection()
+                backfill = {}
+                async for doc in collection.find({"_id": {"$in": missing}, "expires_at": {"$gt": datetime.utcnow()}}, {"score": 1}):
+                    backfill[doc["_id"]] = doc["score"]
+                if backfill:
+                    mongo_hits = len(backfill)
+                    found.update(backfill)
+                    await self._set_redis(backfill)
+            except Exception as e:
+                logger.error(f"Error while reading tweet scores from MongoDB: {e}")
+
+        pipe = redis.pipeline(transaction=False)
+        pipe.hincrby(SCORE_CACHE_STATS_KEY, "hits", hits)
+        pipe.hincrby(SCORE_CACHE_STATS_KEY, "mongo_hits", mongo_hits)
+        pipe.hincrby(SCORE_CACHE_STATS_KEY, "misses", len(keys) - len(found))
+        await pipe.execute()
+        return found
+
+    async def set_many(self, scores: dict):
+        """
+        Store freshly computed scores.
+
+        Args:
+            scores (dict): A mapping of content hash to score.
+        """
+        if not scores:
+            return
+        await self._set_redis(scores)
+        if self.use_mongo:
+            try:
+                collection = await self._collection()
+                now = datetime.utcnow()
+                expires_at = now + timedelta(seconds=self.ttl)
+                await collection.bulk_write([
+                    UpdateOne({"_id": key}, {"$set": {"score": score, "model": CHUTES_MODEL, "created_at": now, "expires_at": expires_at}}, upsert=True)
+                    for key, score in scores.items()
+                ], ordered=False)
+            except Exception as e:
+                logger.error(f"Error while writing tweet scores to MongoDB: {e}")
+
+    async def _set_redis(self, scores: dict):
+        redis = await get_redis_connection()
+        pipe = redis.pipeline(transaction=False)
+        for key, score in scores.items():
+            pipe.setex(SCORE_CACHE_PREFIX + key, self.ttl, score)
+        await pipe.execute()
+
+    async def stats(self) -> dict:
+        """
+        Report hit/miss counters of the score cache across every process.
+
+        Returns:
+            dict: Redis hits, Mongo hits, misses and the overall hit rate.
+        """
+        try:
+            redis = await get_redis_connection()
+            counters = await redis.hgetall(SCORE_CACHE_STATS_KEY)
+        except Exception as e:
+            logger.error(f"Error while reading tweet score cache statistics: {e}")
+            counters = {}
+        hits, mongo_hits, misses = (int(counters.get(field, 0)) for field in ("hits", "mongo_hits", "misses"))
+        lookups = hits + mongo_hits + misses
+        return {
+            "hits": hits,
+            "mongo_hits": mongo_hits,
+            "misses": misses,
+            "hit_rate": (hits + mongo_hits) / lookups if lookups else None,
+        }
+
+
+# Process-wide score cache used by the sentiment task
+score_cache = ScoreCache()
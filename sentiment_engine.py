@@ -0,0 +1,168 @@
+import logging
+import math
+import re
+import time
+from datetime import timezone
+import numpy as np
+from redis_interface import get_redis_connection
+from sentiment_state import GLOBAL_SERIES
+from config import (
+    SENTIMENT_BUCKET_SECONDS,
+    SENTIMENT_WINDOW_SECONDS,
+    SENTIMENT_HALF_LIFE_SECONDS,
+)
+
+# Set up logging for index updates
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Redis hashes of the time buckets of a series (bucket start -> weighted score sum / weight sum)
+SCORE_SUM_KEY = "tao:sentiment:score_sum:{series}"
+WEIGHT_SUM_KEY = "tao:sentiment:weight_sum:{series}"
+
+# Redis set of every series that received a score
+SERIES_KEY = "tao:sentiment:series"
+
+# Mentions of a subnet in a tweet: "SN19", "subnet 19", "netuid 19", "sn 19"
+NETUID_PATTERN = re.compile(r"\b(?:sn|subnet|netuid)\s*#?\s*(\d{1,3})\b", re.IGNORECASE)
+
+
+def mentioned_netuids(text: str) -> set:
+    """
+    Find the subnets a tweet talks about.
+
+    Args:
+        text (str): The tweet text.
+
+    Returns:
+        set: The netuids mentioned in the tweet.
+    """
+    return {int(netuid) for netuid in NETUID_PATTERN.findall(text or "")}
+
+
+def engagement_weights(likes, retweets) -> np.ndarray:
+    """
+    Weight of each tweet in the index: logarithmic in its engagement, so viral tweets
+    count more without drowning everything else. A tweet without engagement weighs 1.
+
+    Args:
+        likes (array-like): Like counts.
+        retweets (array-like): Retweet counts (each counts as two likes).
+
+    Returns:
+        np.ndarray: One weight per tweet.
+    """
+    likes = np.asarray(likes, dtype=float)
+    retweets = np.asarray(retweets, dtype=float)
+    return 1.0 + np.log1p(np.maximum(likes, 0) + 2 * np.maximum(retweets, 0))
+
+
+def decayed_index(bucket_starts, score_sums, weight_sums, now: float, half_life: float = SENTIMENT_HALF_LIFE_SECONDS):
+    """
+    Combine the time buckets of a series into one index value, decaying every bucket
+    exponentially with the age of its midpoint.
+
+    Args:
+        bucket_starts (array-like): UNIX start time of every bucket.
+        score_sums (array-like): Sum of weight * score of every bucket.
+        weight_sums (array-like): Sum of weights of every bucket.
+        now (float): The current UNIX time.
+        half_life (float): Seconds after which a bucket counts half as much.
+
+    Returns:
+        float: The decayed weighted mean score, or None if the series is empty.
+    """
+    bucket_starts = np.asarray(bucket_starts, dtype=float)
+    if bucket_starts.size == 0:
+        return None
+    ages = np.maximum(now - (bucket_starts + SENTIMENT_BUCKET_SECONDS / 2), 0)
+    decay = np.exp(-math.log(2) * ages / half_life)
+    total_weight = np.dot(decay, np.asarray(weight_sums, dtype=float))
+    if total_weight <= 0:
+        return None
+    return float(np.dot(decay, np.asarray(score_sums, dtype=float)) / total_weight)
+
+
+class SentimentEngine:
+    """
+    A time-bucketed, engagement-weighted and exponentially decayed sentiment index.
+
+    Scored tweets are added once, into the bucket of their creation time, for the global
+    series and for every subnet they mention. Each series keeps only two sums per bucket
+    in Redis, so an update touches the new tweets only and recomputing the index is a
+    vectorized pass over the buckets of the window. The resulting values are published
+    through `sentiment_state`, from which every API worker and the trader read them.
+    """
+
+    async def add_scored_tweets(self, tweets: list):
+        """
+        Add freshly scored tweets to the bucket sums of their series.
+
+        Args:
+            tweets (list): Tweet records with `score`, `created_at`, `text` and `metrics`.
+        """
+        if not tweets:
+            return
+        metrics = [tweet.get("metrics") or {} for tweet in tweets]
+        weights = engagement_weights([m.get("likes", 0) for m in metrics], [m.get("retweets", 0) for m in metrics])
+        scores = np.array([tweet["score"] for tweet in tweets], dtype=float)
+        # MongoDB returns naive UTC datetimes
+        created = np.array([tweet["created_at"].replace(tzinfo=timezone.utc).timestamp() for tweet in tweets], dtype=float)
+        buckets = (created // SENTIMENT_BUCKET_SECONDS * SENTIMENT_BUCKET_SECONDS).astype(int)
+        weighted = weights * scores
+
+        redis = await get_redis_connection()
+        pipe = redis.pipeline(transaction=False)
+        for tweet, bucket, weighted_score, weight in zip(tweets, buckets, weighted, weights):
+            for series in [GLOBAL_SERIES, *sorted(mentioned_netuids(tweet.get("text")))]:
+                pipe.hincrbyfloat(SCORE_SUM_KEY.format(series=series), int(bucket), float(weighted_score))
+                pipe.hincrbyfloat(WEIGHT_SUM_KEY.format(series=series), int(bucket), float(weight))
+                pipe.sadd(SERIES_KEY, series)
+        await pipe.execute()
+
+    async def recompute(self) -> dict:
+        """
+        Drop buckets that left the window and recompute the index of every series.
+
+        Returns:
+            dict: The index value of every series (global and per netuid).
+        """
+        now = time.time()
+        oldest_bucket = (now - SENTIMENT_WINDOW_SECONDS) // SENTIMENT_BUCKET_SECONDS * SENTIMENT_BUCKET_SECONDS
+
+        redis = await get_redis_connection()
+        series_names = sorted(await redis.smembers(SERIES_KEY))
+        pipe = redis.pipeline(transaction=False)
+        for series in series_names:
+            pipe.hgetall(SCORE_SUM_KEY.format(series=series))
+            pipe.hgetall(WEIGHT_SUM_KEY.format(series=series))
+        replies = await pipe.execute()
+
+        index = {}
+        pipe = redis.pipeline(transaction=False)
+        for i, series in enumerate(series_names):
+            score_sums, weight_sums = replies[2 * i], replies[2 * i + 1]
+            buckets = np.array(sorted(int(bucket) for bucket in weight_sums), dtype=float)
+            expired = buckets[buckets < oldest_bucket]
+            live = buckets[buckets >= oldest_bucket]
+            if expired.size:
+                fields = [str(int(bucket)) for bucket in expired]
+                pipe.hdel(SCORE_SUM_KEY.format(series=series), *fields)
+                pipe.hdel(WEIGHT_SUM_KEY.format(series=series), *fields)
+            value = decayed_index(
+                live,
+                [float(score_sums.get(str(int(bucket)), 0)) for bucket in live],
+                [float(weight_sums[str(int(bucket))]) for bucket in live],
+                now,
+            )
+            if value is None:
+                pipe.srem(SERIES_KEY, series)
+            else:
+                index[series] = value
+        await pipe.execute()
+        logger.info(f"Sentiment index updated for {len(index)} series.")
+        return index
+
+
+# Process-wide engine used by the sentiment task
+sentiment_engine = SentimentEngine()
@@ -0,0 +1,170 @@
+import asyncio
+import json
+import logging
+import time
+from redis_interface import get_redis_connection, get_pubsub_connection
+
+# Set up logging for publication and mirror events
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Redis hash holding the published sentiment (series -> value) with its version and time
+SENTIMENT_STATE_KEY = "tao:sentiment:state"
+VERSION_FIELD = "__version__"
+UPDATED_AT_FIELD = "__updated_at__"
+
+# Redis counter issuing the versions of published sentiment
+SENTIMENT_VERSION_KEY = "tao:sentiment:version"
+
+# Redis pub/sub channel carrying every published sentiment state
+SENTIMENT_CHANNEL = "tao:sentiment:updated"
+
+# Series of the whole market; per-subnet series are named after their netuid
+GLOBAL_SERIES = "all"
+
+
+async def publish_sentiment(index: dict) -> int:
+    """
+    Publish a new sentiment state to every process.
+
+    The state replaces the previous one in Redis atomically, tagged with a new version
+    and the publication time, and is broadcast on `SENTIMENT_CHANNEL` so that mirrors
+    update without polling.
+
+    Args:
+        index (dict): The value of every series (`"all"` and per netuid).
+
+    Returns:
+        int: The version of the published state.
+    """
+    redis = await get_redis_connection()
+    version = await redis.incr(SENTIMENT_VERSION_KEY)
+    updated_at = time.time()
+    payload = {"version": version, "updated_at": updated_at, "index": index}
+
+    pipe = redis.pipeline(transaction=True)
+    pipe.delete(SENTIMENT_STATE_KEY)
+    pipe.hset(SENTIMENT_STATE_KEY, mapping={**index, VERSION_FIELD: version, UPDATED_AT_FIELD: updated_at})
+    pipe.publish(SENTIMENT_CHANNEL, json.dumps(payload))
+    await pipe.execute()
+    logger.info(f"Published sentiment version {version} for {len(index)} series.")
+    return version
+
+
+async def read_sentiment_state() -> dict:
+    """
+    Read the published sentiment state from Redis.
+
+    Returns:
+        dict: `version`, `updated_at` and `index` (series -> value); version 0 if nothing was published yet.
+    """
+    redis = await get_redis_connection()
+    fields = await redis.hgetall(SENTIMENT_STATE_KEY)
+    version = int(fields.pop(VERSION_FIELD, 0))
+    updated_at = fields.pop(UPDATED_AT_FIELD, None)
+    return {
+        "version": version,
+        "updated_at": float(updated_at) if updated_at is not None else None,
+        "index": {series: float(value) for series, value in fields.items()},
+    }
+
+
+class SentimentMirror:
+    """
+    A per-process copy of the published sentiment, kept current through Redis pub/sub.
+
+    The mirror loads the state once when started and then applies every broadcast state
+    whose version is newer than its own, so reading the sentiment (e.g. when trading)
+    costs no network round trip and every worker sees the same version.
+    """
+
+    def __init__(self):
+        self.index = {}
+        self.version = 0
+        self.updated_at = None
+        self.updates = 0
+        self._listener_task = None
+
+    def apply(self, state: dict):
+        """
+        Adopt a sentiment state unless it is older than the current one.
+
+        Args:
+            state (dict): `version`, `updated_at` and `index` as published.
+        """
+        if state["version"] < self.version:
+            return
+        self.index = {str(series): float(value) for series, value in state["index"].items()}
+        self.version = state["version"]
+        self.updated_at = state["updated_at"]
+        self.updates += 1
+
+    def get(self, netuid=None) -> float:
+        """
+        Current sentiment of a subnet, falling back to the whole market.
+
+        Args:
+            netuid (int, optional): The subnet; None for the global series.
+
+        Returns:
+            float: The sentiment score (0 if nothing was published yet).
+        """
+        if netuid is not None and str(netuid) in self.index:
+            return self.index[str(netuid)]
+        return self.index.get(GLOBAL_SERIES, 0)
+
+    async def start(self):
+        """
+        Start following published sentiment states.
+        """
+        if self._listener_task is None:
+            self._listener_task = asyncio.create_task(self._listen())
+
+    async def stop(self):
+        """
+        Stop the pub/sub listener.
+        """
+        if self._listener_task is not None:
+            self._listener_task.cancel()
+            try:
+                await self._listener_task
+            except asyncio.CancelledError:
+                pass
+            self._listener_task = None
+
+    async def _listen(self):
+        while True:
+            try:
+                # Subscriptions use the pub/sub pool, whose connections do not time out while idle
+                redis = await get_pubsub_connection()
+                async with redis.pubsub() as pubsub:
+                    await pubsub.subscribe(SENTIMENT_CHANNEL)
+                    # Load the current state after subscribing so no update falls in between
+                    self.apply(await read_sentiment_state())
+                    async for message in pubsub.listen():
+                        if message["type"] == "message":
+                            self.apply(json.loads(message["data"]))
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Sentiment mirror listener failed: {e}")
+                await asyncio.sleep(1)
+
+    def stats(self) -> dict:
+        """
+        Report the state held by this process.
+
+        Returns:
+            dict: Version, age in seconds, number of series and the global value.
+        """
+        return {
+            "version": self.version,
+            "age_seconds": time.time() - self.updated_at if self.updated_at is not None else None,
+            "series": len(self.index),
+            "global": self.index.get(GLOBAL_SERIES),
+            "updates": self.updates,
+        }
+
+
+# Process-wide mirror started in the app lifespan
+sentiment_mirror = SentimentMirror()
@@ -1,72 +1,353 @@
 import logging
 import asyncio
-from datetime import datetime
-from datura_ai_interface import get_tweets
-from chutes_ai_interface import analyze_tweet
+import json
+import time
+from datetime import datetime, timedelta
+from datura_ai_interface import get_tweets, ingest_all_new_tweets
+from database import get_unscored_tweets, update_tweet_scores
+from sentiment_engine import sentiment_engine
+from redis_interface import get_redis_connection
+from sentiment_state import publish_sentiment, sentiment_mirror, GLOBAL_SERIES
+from chutes_ai_interface import analyze_tweets, SCORING_PROMPT_VERSION
+from score_cache import score_cache, score_key
+from config import (
+    SENTIMENT_TWEET_COUNT,
+    SENTIMENT_TWEET_DAYS,
+    SENTIMENT_SCORING_CONCURRENCY,
+    SENTIMENT_SCORING_TIMEOUT,
+    SENTIMENT_BATCH_SIZE,
+    SCORE_CACHE_ENABLED,
+    TWEET_INGEST_INCREMENTAL,
+    TWEET_SCORE_LIMIT,
+    SENTIMENT_CHUNK_SIZE,
+    SENTIMENT_LOCK_TIMEOUT,
+)
 
-# Global variable to store the fetched sentiment score
-sentiment_score = 0
+# Outcome and per-tweet latencies (seconds) of the last scoring batch
+scoring_stats = {"scored": 0, "cached": 0, "failed": 0, "timed_out": 0, "latencies": [], "duration": None}
+
+# Redis key of the statistics of the last scoring batch, written by whichever process scored it
+SCORING_STATS_KEY = "tao:sentiment_scoring_stats"
 
 # Set up logging configuration
 logging.basicConfig(level=logging.INFO)  # Set log level to INFO for application logs
 logger = logging.getLogger(__name__)
 
+async def score_batch(batch, semaphore):
+    """
+    Score a batch of tweets within the concurrency budget. The timeout applies to every
+    Chutes request on its own (the batched completion, then each per-tweet fallback), so a
+    slow batch is rescored tweet by tweet instead of being abandoned as a whole.
+
+    Args:
+        batch (list): The tweet texts to score together (one completion when batching is enabled).
+        semaphore (asyncio.Semaphore): Limits how many batches are scored at once.
+
+    Returns:
+        list: `(score, latency)` per tweet, where `score` is None if scoring failed or timed out.
+    """
+    async with semaphore:
+        started = time.monotonic()
+        try:
+            results = await analyze_tweets(batch, timeout=SENTIMENT_SCORING_TIMEOUT, return_exceptions=True)
+        except Exception as e:
+            logger.error(f"Error while scoring {len(batch)} tweet(s): {e}")
+            results = [e] * len(batch)
+        scores = []
+        for result in results:
+            if isinstance(result, asyncio.TimeoutError):
+                scoring_stats["timed_out"] += 1
+                result = None
+            elif isinstance(result, Exception) or result is None:
+                scoring_stats["failed"] += 1
+                result = None
+            scores.append(result)
+        latency = time.monotonic() - started
+        return [(score, latency) for score in scores]
+
+
+async def score_tweets(tweets):
+    """
+    Score tweets concurrently, `SENTIMENT_BATCH_SIZE` per completion, tolerating
+    individual failures. Tweets whose content was already scored with the current model
+    and prompt are served from the score cache and never sent to Chutes again.
+
+    Args:
+        tweets (list): The tweet texts to score.
+
+    Returns:
+        list: One score per tweet, in order; None for tweets that could not be scored.
+    """
+    scoring_stats.update(scored=0, cached=0, failed=0, timed_out=0, latencies=[], duration=None)
+    started = time.monotonic()
+
+    # Identical tweets share one content hash and are scored once
+    keys = [score_key(tweet, SCORING_PROMPT_VERSION) for tweet in tweets]
+    cached = {}
+    if SCORE_CACHE_ENABLED:
+        try:
+            cached = await score_cache.get_many(list(dict.fromkeys(keys)))
+        except Exception as e:
+            logger.error(f"Error while reading the tweet score cache: {e}")
+    pending = {key: tweet for key, tweet in zip(keys, tweets) if key not in cached}
+
+    semaphore = asyncio.Semaphore(SENTIMENT_SCORING_CONCURRENCY)
+    batch_size = max(SENTIMENT_BATCH_SIZE, 1)
+    pending_keys = list(pending)
+    batches = [pending_keys[i:i + batch_size] for i in range(0, len(pending_keys), batch_size)]
+    results = await asyncio.gather(*[score_batch([pending[key] for key in batch], semaphore) for batch in batches])
+
+    fresh = {}
+    for batch, batch_results in zip(batches, results):
+        for key, (score, latency) in zip(batch, batch_results):
+            scoring_stats["latencies"].append(latency)
+            if score is not None:
+                fresh[key] = score
+
+    # Remember the new scores for the next runs
+    if SCORE_CACHE_ENABLED and fresh:
+        try:
+            await score_cache.set_many(fresh)
+        except Exception as e:
+            logger.error(f"Error while writing the tweet score cache: {e}")
+
+    scores = [cached.get(key, fresh.get(key)) for key in keys]
+    scoring_stats["scored"] = len(fresh)
+    scoring_stats["cached"] = len(cached)
+    scoring_stats["duration"] = time.monotonic() - started
+    await publish_scoring_stats()
+    return scores
+
+
+def get_scoring_stats() -> dict:
+    """
+    Report the outcome and latency distribution of the last scoring batch.
+
+    Returns:
+        dict: Scored / cached / failed / timed out counts, batch duration and per-tweet latency percentiles.
+    """
+    latencies = sorted(scoring_stats["latencies"])
+    percentile = lambda q: latencies[min(int(q * len(latencies)), len(latencies) - 1)] if latencies else None
+    return {
+        "scored": scoring_stats["scored"],
+        "cached": scoring_stats["cached"],
+        "failed": scoring_stats["failed"],
+        "timed_out": scoring_stats["timed_out"],
+        "batch_duration_seconds": scoring_stats["duration"],
+        "latency_p50_seconds": percentile(0.5),
+        "latency_p95_seconds": percentile(0.95),
+        "latency_max_seconds": latencies[-1] if latencies else None,
+    }
+
+async def publish_scoring_stats():
+    """
+    Store the statistics of the last scoring batch in Redis, since batches are scored by
+    the Celery worker while metrics are served by the API.
+    """
+    try:
+        redis = await get_redis_connection()
+        await redis.set(SCORING_STATS_KEY, json.dumps(get_scoring_stats()))
+    except Exception as e:
+        logger.error(f"Error while publishing tweet scoring statistics: {e}")
+
+
+async def get_shared_scoring_stats() -> dict:
+    """
+    Report the statistics of the last scoring batch, whichever process scored it.
+
+    Returns:
+        dict: The statistics of `get_scoring_stats`, or those of this process if none were published.
+    """
+    try:
+        redis = await get_redis_connection()
+        published = await redis.get(SCORING_STATS_KEY)
+    except Exception as e:
+        logger.error(f"Error while reading tweet scoring statistics: {e}")
+        published = None
+    return json.loads(published) if published else get_scoring_stats()
+
+# Redis key of the lock preventing overlapping sentiment refreshes
+SENTIMENT_LOCK_KEY = "tao:sentiment:refresh_lock"
+
+# Deletes the lock only if it is still held by the given token
+RELEASE_LOCK_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+
+
+async def acquire_refresh_lock(token: str) -> bool:
+    """
+    Take the sentiment refresh lock so that runs never overlap, across every worker.
+
+    Args:
+        token (str): Identifies the run; needed to release the lock.
+
+    Returns:
+        bool: True if the lock was taken, False if another run holds it.
+    """
+    redis = await get_redis_connection()
+    return bool(await redis.set(SENTIMENT_LOCK_KEY, token, ex=SENTIMENT_LOCK_TIMEOUT, nx=True))
+
+
+async def release_refresh_lock(token: str):
+    """
+    Release the sentiment refresh lock if it is still held by this run.
+
+    Args:
+        token (str): The token the lock was taken with.
+    """
+    redis = await get_redis_connection()
+    await redis.eval(RELEASE_LOCK_SCRIPT, 1, SENTIMENT_LOCK_KEY, token)
+
+
+async def fetch_new_tweets() -> list:
+    """
+    Ingest the tweets published since the last run of every search.
+
+    Tweets whose scoring failed in an earlier run are still unscored in MongoDB and are
+    returned together with the new ones.
+
+    Returns:
+        list: The IDs of the stored tweets that still need a score, newest first.
+    """
+    since = datetime.utcnow() - timedelta(days=SENTIMENT_TWEET_DAYS)
+
+    # Fetch and store only the tweets newer than the cursors of every search
+    await ingest_all_new_tweets(SENTIMENT_TWEET_COUNT, SENTIMENT_TWEET_DAYS)
+    pending = await get_unscored_tweets(since, TWEET_SCORE_LIMIT)
+    return [tweet["_id"] for tweet in pending]
+
+
+async def score_tweet_chunk(ids: list) -> int:
+    """
+    Score a chunk of stored tweets and add them to the sentiment index.
+
+    Only tweets that are still unscored are loaded, so running a chunk twice (e.g. after
+    a task redelivery) does not count its tweets twice.
+
+    Args:
+        ids (list): The tweet IDs of the chunk.
+
+    Returns:
+        int: The number of tweets scored.
+    """
+    since = datetime.utcnow() - timedelta(days=SENTIMENT_TWEET_DAYS)
+    pending = await get_unscored_tweets(since, len(ids), ids=ids)
+    if not pending:
+        return 0
+    scores = await score_tweets([tweet["text"] for tweet in pending])
+    scored = [{**tweet, "score": score} for tweet, score in zip(pending, scores) if score is not None]
+    await update_tweet_scores({tweet["_id"]: tweet["score"] for tweet in scored})
+    await sentiment_engine.add_scored_tweets(scored)
+    logger.info(f"Scored {len(scored)}/{len(pending)} new tweets in {scoring_stats['duration']:.2f}s")
+    return len(scored)
+
+
+async def aggregate_sentiment() -> dict:
+    """
+    Recompute the sentiment index and publish it.
+
+    The index is recomputed even without new tweets so that older buckets keep decaying.
+
+    Returns:
+        dict: The index value of every series (global and per netuid); empty if no scored tweet is in the window.
+    """
+    index = await sentiment_engine.recompute()
+    if GLOBAL_SERIES not in index:
+        logger.warning("No scored tweets in the look-back window. Keeping the previous sentiment score.")
+        return index
+    await publish_sentiment(index)
+    logger.info(f"Sentiment analysis complete. Sentiment index: {index[GLOBAL_SERIES]:.2f}")
+    return index
+
+
+async def incremental_sentiment():
+    """
+    Ingest the tweets published since the last run, score only those, add them to the
+    sentiment index and publish it, all in this process. The Celery pipeline runs the
+    same steps as separate tasks.
+
+    Returns:
+        dict: The index value of every series (global and per netuid); empty if no scored tweet is in the window.
+    """
+    ids = await fetch_new_tweets()
+    for i in range(0, len(ids), SENTIMENT_CHUNK_SIZE):
+        await score_tweet_chunk(ids[i:i + SENTIMENT_CHUNK_SIZE])
+    return await aggregate_sentiment()
+
+
 # Function to fetch and analyze sentiment from tweets
 async def analyze_sentiment():
     """
-    Fetch tweets from Datura API, analyze their sentiment, and update the global sentiment score.
+    Fetch tweets from Datura API, analyze their sentiment, and publish the sentiment score
+    to every process through Redis (see `sentiment_state`).
 
-    This function simulates fetching tweets for sentiment analysis, aggregates the results,
-    and calculates the average sentiment score from the tweets. It runs asynchronously.
+    In incremental mode (`TWEET_INGEST_INCREMENTAL`), only tweets newer than the last run
+    are fetched and scored, and the score is the global series of the time-decayed,
+    engagement-weighted sentiment index (see `sentiment_engine`). Otherwise the most recent tweets are fetched and
+    scored every run and the score is their average. Tweets are scored
+    `SENTIMENT_BATCH_SIZE` per completion, concurrently (bounded by
+    `SENTIMENT_SCORING_CONCURRENCY`); tweets that fail or time out are left out of the average. It runs asynchronously.
 
     It also handles errors gracefully by logging any exceptions that occur during the process.
     """
-    global sentiment_score  # Use the global variable to store the sentiment score
-    
     try:
         # Log the start of the data fetching process
         logger.info("Fetching new data from Datura API...")
+
+        if TWEET_INGEST_INCREMENTAL:
+            await incremental_sentiment()
+            return
         
-        # Fetch the most recent 10 tweets from the past 7 days
-        tweets = await get_tweets(count=10, days=7)
+        # Fetch the most recent tweets from the look-back window
+        tweets = await get_tweets(count=SENTIMENT_TWEET_COUNT, days=SENTIMENT_TWEET_DAYS)
         
         # If no tweets are fetched, log a warning and skip analysis
         if not tweets:
             logger.warning("No tweets fetched. Skipping sentiment analysis.")
             return
         
-        # Initialize variable to accumulate sentiment scores
-        score_sum = 0
+        # Analyze the sentiment of every tweet using the Chutes API, in parallel
+        scores = [score for score in await score_tweets(tweets) if score is not None]
         
-        # Loop through the fetched tweets and analyze each one
-        for tweet in tweets:
-            # Analyze the sentiment of the tweet using the Chutes API
-            sub_score = await analyze_tweet(tweet)
-            score_sum += sub_score  # Accumulate the sentiment scores
+        # Keep the previous score if no tweet could be scored
+        if not scores:
+            logger.warning("No tweet could be scored. Keeping the previous sentiment score.")
+            return
         
-        # Calculate the average sentiment score
-        sentiment_score = score_sum / len(tweets)
+        # Calculate and publish the average sentiment score
+        sentiment_score = sum(scores) / len(scores)
+        await publish_sentiment({GLOBAL_SERIES: sentiment_score})
         
         # Log the sentiment analysis result
-        logger.info(f"Sentiment analysis complete. Average sentiment score: {sentiment_score:.2f}")
+        logger.info(
+            f"Sentiment analysis complete. Average sentiment score: {sentiment_score:.2f} "
+            f"({len(scores)}/{len(tweets)} tweets scored in {scoring_stats['duration']:.2f}s)"
+        )
 
     except Exception as e:
         # Log any error that occurs during sentiment analysis
         logger.error(f"Error occurred while analyzing sentiment: {e}")
         
 
-def get_sentiment_score():
+def get_sentiment_score(netuid=None):
     """
     Get the current sentiment score.
 
-    This function returns the latest sentiment score calculated by `analyze_sentiment`.
-    The score represents the average sentiment of the fetched tweets.
+    This function returns the latest sentiment score published by `analyze_sentiment`,
+    from this process's mirror of the shared state, so it costs no network round trip
+    and is the same in every worker.
+
+    Args:
+        netuid (int, optional): The subnet whose score is wanted; the global score is used if it has none.
 
     Returns:
-        float: The current sentiment score (average sentiment of fetched tweets).
+        float: The current sentiment score (0 until a score has been published).
     """
-    global sentiment_score  # Access the global sentiment score
-    return sentiment_score
+    return sentiment_mirror.get(netuid)
 
 # Optional: Function to start the sentiment analysis periodically
 async def start_sentiment_analysis_periodically():
@@ -0,0 +1,119 @@
+import asyncio
+import logging
+import time
+from redis.exceptions import LockError
+from redis_interface import get_redis_connection
+from config import (
+    SINGLEFLIGHT_DISTRIBUTED,
+    SINGLEFLIGHT_LOCK_TIMEOUT,
+    SINGLEFLIGHT_WAIT_TIMEOUT,
+    SINGLEFLIGHT_POLL_INTERVAL,
+)
+
+# Set up logging for coalescing events
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls for the same key into a single execution.
+
+    The first caller for a key (the leader) runs the fetch in its own task; every caller
+    arriving while it is in flight awaits the same task. When `distributed` is enabled,
+    the leader additionally takes a Redis lock so that only one process across all
+    workers fetches a key; leaders in other processes wait for the cache to be filled
+    instead of fetching themselves.
+    """
+
+    def __init__(self, name: str, distributed: bool = SINGLEFLIGHT_DISTRIBUTED):
+        self.name = name
+        self.distributed = distributed
+        self._inflight = {}
+        self.leaders = 0
+        self.coalesced = 0
+        self.remote_coalesced = 0
+        self.remote_fallbacks = 0
+
+    async def do(self, key: str, fetch, recheck=None):
+        """
+        Run `fetch()` once per key, sharing its result with every concurrent caller.
+
+        Args:
+            key (str): Identifies the work; callers with the same key share one execution.
+            fetch (Callable): Coroutine function producing the result.
+            recheck (Callable, optional): Coroutine function returning the cached result or
+                None. Required for the distributed mode, where it is polled while another
+                process holds the lock.
+
+        Returns:
+            Any: The result of the shared execution.
+        """
+        task = self._inflight.get(key)
+        if task is None:
+            self.leaders += 1
+            task = asyncio.create_task(self._lead(key, fetch, recheck))
+            self._inflight[key] = task
+            task.add_done_callback(lambda t: self._finish(key, t))
+        else:
+            self.coalesced += 1
+        # Shield the shared task so one cancelled caller does not cancel it for the others
+        return await asyncio.shield(task)
+
+    def _finish(self, key, task):
+        """
+        Drop a finished task and mark its exception as retrieved.
+        """
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        if not task.cancelled():
+            task.exception()
+
+    async def _lead(self, key, fetch, recheck):
+        """
+        Execute the fetch as leader, behind a Redis lock when running distributed.
+        """
+        if not self.distributed or recheck is None:
+            return await fetch()
+
+        redis = await get_redis_connection()
+        lock = redis.lock(f"singleflight:{self.name}:{key}", timeout=SINGLEFLIGHT_LOCK_TIMEOUT)
+        if await lock.acquire(blocking=False):
+            try:
+                return await fetch()
+            finally:
+                try:
+                    await lock.release()
+                except LockError:
+                    logger.warning(f"Single-flight lock for {key} expired before the fetch finished.")
+
+        # Another process is fetching this key: wait for it to fill the cache
+        deadline = time.monotonic() + SINGLEFLIGHT_WAIT_TIMEOUT
+        while time.monotonic() < deadline:
+            await asyncio.sleep(SINGLEFLIGHT_POLL_INTERVAL)
+            result = await recheck()
+            if result is not None:
+                self.remote_coalesced += 1
+                return result
+            if not await lock.locked():
+                break
+
+        # The other process gave up or failed without caching anything
+        self.remote_fallbacks += 1
+        return await fetch()
+
+    def stats(self) -> dict:
+        """
+        Report how many calls were coalesced.
+
+        Returns:
+            dict: Leader executions, in-process and cross-process coalesced calls, fallbacks and keys in flight.
+        """
+        return {
+            "distributed": self.distributed,
+            "leaders": self.leaders,
+            "coalesced": self.coalesced,
+            "remote_coalesced": self.remote_coalesced,
+            "remote_fallbacks": self.remote_fallbacks,
+            "in_flight": len(self._inflight),
+        }
@@ -0,0 +1,312 @@
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+from async_substrate_interface.async_substrate import AsyncSubstrateInterface
+from websockets.exceptions import ConnectionClosed
+from bittensor.core.settings import SS58_FORMAT
+from config import (
+    SUBSTRATE_URL,
+    SUBSTRATE_POOL_SIZE,
+    SUBSTRATE_MAX_CONCURRENCY_PER_CONNECTION,
+    SUBSTRATE_HEALTH_CHECK_INTERVAL,
+    SUBSTRATE_HEALTH_CHECK_TIMEOUT,
+)
+
+# Set up logging for connection lifecycle events
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Errors that mean the websocket itself is broken. Anything else (e.g. a malformed hotkey
+# rejected while encoding a storage key) is the query's fault and leaves the connection alone.
+TRANSPORT_ERRORS = (ConnectionClosed, ConnectionError, OSError, asyncio.TimeoutError)
+
+
+class PooledSubstrateConnection:
+    """
+    A single warm websocket connection to the chain, owned by the pool.
+
+    Attributes:
+        index (int): Position of the connection inside the pool (used in logs).
+        substrate (AsyncSubstrateInterface): The initialized substrate client, or None while disconnected.
+        semaphore (asyncio.Semaphore): Limits how many queries may run on this connection at once.
+        in_flight (int): Number of queries currently borrowing the connection.
+        healthy (bool): False once a query or health check failed, until the connection is rebuilt.
+
+    A connection is only rebuilt while no query uses it, and borrowers wait while it is
+    being rebuilt, so a rebuild never closes the websocket under a running query.
+    """
+
+    def __init__(self, index: int, url: str, max_concurrency: int):
+        self.index = index
+        self.url = url
+        self.substrate = None
+        self.semaphore = asyncio.Semaphore(max_concurrency)
+        self.in_flight = 0
+        self.healthy = False
+        self._ready = asyncio.Event()  # Cleared while the connection is being rebuilt
+        self._ready.set()
+        self._idle = asyncio.Event()  # Set while no query uses the connection
+        self._idle.set()
+
+    @property
+    def available(self) -> bool:
+        """
+        Whether the connection can take a query right away.
+        """
+        return self.healthy and self.substrate is not None and self._ready.is_set()
+
+    @property
+    def rebuildable(self) -> bool:
+        """
+        Whether the connection may be rebuilt now: no query uses it and no rebuild runs.
+        """
+        return self.in_flight == 0 and self._ready.is_set()
+
+    async def connect(self):
+        """
+        Open the websocket and fetch the runtime metadata once.
+        """
+        substrate = AsyncSubstrateInterface(self.url, ss58_format=SS58_FORMAT)
+        await substrate.initialize()
+        self.substrate = substrate
+        self.healthy = True
+        logger.info(f"Substrate connection #{self.index} established to {self.url}")
+
+    async def disconnect(self):
+        """
+        Close the websocket if it is open. Errors while closing are logged and ignored.
+        """
+        substrate, self.substrate = self.substrate, None
+        self.healthy = False
+        if substrate is not None:
+            try:
+                await substrate.close()
+            except Exception as e:
+                logger.warning(f"Error while closing substrate connection #{self.index}: {e}")
+
+    async def rebuild(self):
+        """
+        Tear down and rebuild the connection, holding it exclusively: borrowers wait until
+        the rebuild is done. Callers must check `rebuildable` right before, without awaiting
+        anything in between.
+        """
+        self._ready.clear()
+        try:
+            await self.disconnect()
+            await self.connect()
+        finally:
+            self._ready.set()
+
+    @asynccontextmanager
+    async def borrow(self):
+        """
+        Run a query on the connection within its concurrency limit. A broken connection is
+        rebuilt first, as soon as no other query uses it; until then the borrower waits
+        instead of being handed a connection known to be broken.
+
+        Yields:
+            AsyncSubstrateInterface: A ready-to-use substrate client.
+
+        Raises:
+            Exception: If the connection had to be rebuilt and could not be opened.
+        """
+        async with self.semaphore:
+            while not self.available:
+                if not self._ready.is_set():
+                    await self._ready.wait()
+                elif self.in_flight == 0:
+                    await self.rebuild()
+                else:
+                    await self._idle.wait()
+            self.in_flight += 1
+            self._idle.clear()
+            try:
+                yield self.substrate
+            except TRANSPORT_ERRORS as e:
+                logger.warning(f"Substrate connection #{self.index} failed: {e!r}")
+                self.healthy = False
+                raise
+            finally:
+                self.in_flight -= 1
+                if self.in_flight == 0:
+                    self._idle.set()
+
+    async def check_health(self, timeout: float) -> bool:
+        """
+        Ping the chain head like any other query (within the concurrency limit) and mark
+        the connection unhealthy if it does not answer in time.
+
+        Args:
+            timeout (float): Seconds to wait for the chain head before giving up.
+
+        Returns:
+            bool: True if the connection answered, False otherwise.
+        """
+        try:
+            async with self.borrow() as substrate:
+                await asyncio.wait_for(substrate.get_chain_head(), timeout)
+        except Exception as e:
+            logger.warning(f"Health check failed for substrate connection #{self.index}: {e!r}")
+            self.healthy = False
+        return self.healthy
+
+
+class SubstratePool:
+    """
+    A fixed-size pool of long-lived `AsyncSubstrateInterface` connections.
+
+    Connections are opened once (normally at application startup) and reused by every
+    query. Each connection accepts a bounded number of concurrent queries, a background
+    task pings them periodically, and a connection that fails is rebuilt before it is
+    handed out again.
+    """
+
+    def __init__(
+        self,
+        url: str = SUBSTRATE_URL,
+        size: int = SUBSTRATE_POOL_SIZE,
+        max_concurrency: int = SUBSTRATE_MAX_CONCURRENCY_PER_CONNECTION,
+        health_check_interval: float = SUBSTRATE_HEALTH_CHECK_INTERVAL,
+        health_check_timeout: float = SUBSTRATE_HEALTH_CHECK_TIMEOUT,
+    ):
+        self.url = url
+        self.size = size
+        self.max_concurrency = max_concurrency
+        self.health_check_interval = health_check_interval
+        self.health_check_timeout = health_check_timeout
+        self.connections = []
+        self._started = False
+        self._start_lock = None
+        self._health_task = None
+
+    async def start(self):
+        """
+        Open every connection in the pool and start the health check loop.
+        Connections that fail to open are retried lazily when they are borrowed.
+        """
+        if self._start_lock is None:
+            self._start_lock = asyncio.Lock()
+        async with self._start_lock:
+            if self._started:
+                return
+            self.connections = [
+                PooledSubstrateConnection(i, self.url, self.max_concurrency) for i in range(self.size)
+            ]
+            results = await asyncio.gather(*[conn.connect() for conn in self.connections], return_exceptions=True)
+            for conn, result in zip(self.connections, results):
+                if isinstance(result, Exception):
+                    logger.error(f"Failed to open substrate connection #{conn.index}: {result}")
+            self._health_task = asyncio.create_task(self._health_check_loop())
+            self._started = True
+            logger.info(f"Substrate pool started with {self.size} connection(s).")
+
+    async def close(self):
+        """
+        Stop the health check loop and close every connection.
+        """
+        if not self._started:
+            return
+        if self._health_task is not None:
+            self._health_task.cancel()
+            try:
+                await self._health_task
+            except asyncio.CancelledError:
+                pass
+            self._health_task = None
+        await asyncio.gather(*[conn.disconnect() for conn in self.connections])
+        self.connections = []
+        self._started = False
+        self._start_lock = None
+        logger.info("Substrate pool closed.")
+
+    async def _health_check_loop(self):
+        """
+        Periodically ping every connection and rebuild the ones that stopped answering.
+        """
+        while True:
+            await asyncio.sleep(self.health_check_interval)
+            for conn in self.connections:
+                # Skip busy connections; a failing query marks them unhealthy anyway
+                if conn.in_flight:
+                    continue
+                if await conn.check_health(self.health_check_timeout):
+                    continue
+                # A borrower may have taken the connection during the ping: only rebuild it idle
+                if not conn.rebuildable:
+                    continue
+                try:
+                    await conn.rebuild()
+                except Exception as e:
+                    logger.error(f"Failed to reconnect substrate connection #{conn.index}: {e}")
+
+    def _pick_connection(self) -> PooledSubstrateConnection:
+        """
+        Choose the least loaded connection, preferring working ones, then broken ones that
+        can be rebuilt right away over broken ones still in use.
+        """
+        available = [conn for conn in self.connections if conn.available]
+        rebuildable = [conn for conn in self.connections if conn.rebuildable]
+        candidates = available or rebuildable or self.connections
+        return min(candidates, key=lambda conn: conn.in_flight)
+
+    @asynccontextmanager
+    async def connection(self):
+        """
+        Borrow a connection from the pool for the duration of an `async with` block.
+
+        The pool is started lazily if the application lifespan did not start it (e.g. in
+        the Celery worker). If the block fails with a transport error, the connection is
+        marked unhealthy; it is rebuilt once no query uses it anymore, so queries still
+        running on it are never cut off.
+
+        Yields:
+            AsyncSubstrateInterface: A ready-to-use substrate client.
+        """
+        if not self._started:
+            await self.start()
+
+        conn = self._pick_connection()
+        async with conn.borrow() as substrate:
+            yield substrate
+
+    def utilization(self) -> float:
+        """
+        Fraction of the pool's query capacity currently in use.
+
+        Returns:
+            float: In-flight queries divided by `size * max_concurrency` (0 when not started).
+        """
+        capacity = len(self.connections) * self.max_concurrency
+        if not capacity:
+            return 0.0
+        return sum(conn.in_flight for conn in self.connections) / capacity
+
+    def stats(self) -> dict:
+        """
+        Report the state of every connection in the pool.
+
+        Returns:
+            dict: Pool size, limits and per-connection health / in-flight counts.
+        """
+        return {
+            "size": self.size,
+            "max_concurrency_per_connection": self.max_concurrency,
+            "connections": [
+                {"index": conn.index, "healthy": conn.healthy, "in_flight": conn.in_flight}
+                for conn in self.connections
+            ],
+        }
+
+
+# Process-wide pool shared by every query in `bittensor_interface`
+substrate_pool = SubstratePool()
+
+
+def get_substrate_pool() -> SubstratePool:
+    """
+    Return the process-wide substrate connection pool.
+
+    Returns:
+        SubstratePool: The shared pool instance.
+    """
+    return substrate_pool
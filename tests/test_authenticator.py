@@ -0,0 +1,104 @@
+import json
+import time
+import pytest
+from datetime import datetime, timedelta, timezone
+from unittest.mock import patch
+from authenticator import (
+    USER_CACHE_INVALIDATE_CHANNEL,
+    create_access_token,
+    get_current_user,
+    is_revoked,
+    revoke_token,
+    revoke_user_tokens,
+    user_cache,
+)
+from models import Principal
+
+
+class FakePipeline:
+    """Queues the commands used by the revocation check"""
+
+    def __init__(self, redis):
+        self.redis = redis
+        self.commands = []
+
+    def exists(self, key):
+        self.commands.append(lambda: int(key in self.redis.data))
+
+    def get(self, key):
+        self.commands.append(lambda: self.redis.data.get(key))
+
+    async def execute(self):
+        return [command() for command in self.commands]
+
+
+class FakeRedis:
+    """In-memory stand-in for the Redis commands of the revocation list"""
+
+    def __init__(self):
+        self.data = {}
+        self.published = []
+
+    def pipeline(self, transaction=True):
+        return FakePipeline(self)
+
+    async def set(self, key, value, ex=None, nx=False):
+        self.data[key] = str(value)
+        return True
+
+    async def publish(self, channel, message):
+        self.published.append((channel, json.loads(message)))
+        return 0
+
+
+@pytest.fixture
+def redis():
+    fake = FakeRedis()
+    with patch("authenticator.get_redis_connection", return_value=fake), patch("local_cache.get_redis_connection", return_value=fake):
+        yield fake
+
+
+def make_principal(username="alice", issued_at=None, token_id="token-1"):
+    issued_at = issued_at or datetime.now(timezone.utc)
+    return Principal(username=username, token_id=token_id, issued_at=issued_at, expires_at=issued_at + timedelta(minutes=30))
+
+
+@pytest.mark.asyncio
+async def test_revoke_token_revokes_only_that_token(redis):
+    """Test that logging out revokes the token used, not the other tokens of the user"""
+    principal = make_principal()
+    await revoke_token(principal)
+    assert await is_revoked(principal)
+    assert not await is_revoked(make_principal(token_id="token-2"))
+
+@pytest.mark.asyncio
+async def test_revoke_user_tokens_revokes_earlier_tokens_only(redis):
+    """Test that revoking a user rejects the tokens issued before, but not those issued after"""
+    before = make_principal(issued_at=datetime.now(timezone.utc) - timedelta(seconds=1))
+    await revoke_user_tokens("alice")
+    after = make_principal(issued_at=datetime.now(timezone.utc) + timedelta(milliseconds=1))
+    assert await is_revoked(before)
+    assert not await is_revoked(after)
+    assert not await is_revoked(make_principal(username="bob", issued_at=before.issued_at))
+
+@pytest.mark.asyncio
+async def test_token_issued_right_after_revocation_is_accepted(redis):
+    """Test that logging in again in the same second as a revocation works"""
+    await revoke_user_tokens("alice")
+    principal = await get_current_user(create_access_token({"sub": "alice"}))
+    assert principal.username == "alice"
+
+@pytest.mark.asyncio
+async def test_revoke_user_tokens_drops_the_profile_in_every_worker(redis):
+    """Test that the cached profile is dropped here and the drop is broadcast"""
+    user_cache.set("alice", {"username": "alice"}, 0)
+    await revoke_user_tokens("alice")
+    assert user_cache.get("alice") is None
+    assert redis.published == [(USER_CACHE_INVALIDATE_CHANNEL, {"origin": user_cache.origin, "keys": ["alice"]})]
+
+@pytest.mark.asyncio
+async def test_user_revocation_stores_the_fractional_time(redis):
+    """Test that the per-user entry keeps the sub-second revocation time"""
+    started = time.time()
+    await revoke_user_tokens("alice")
+    assert started <= float(redis.data["tao:auth:revoked_user:alice"]) <= time.time()
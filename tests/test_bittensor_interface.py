@@ -0,0 +1,200 @@
+import asyncio
+import json
+import time
+import pytest
+from contextlib import asynccontextmanager
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, patch
+from bittensor_interface import (
+    BLOCK_FIELD,
+    TS_FIELD,
+    cached_result,
+    fetched_result,
+    get_tao_dividends_for_subnet,
+    is_current_block,
+    parse_cached_dividend,
+    refresh_tasks,
+    span_start,
+    stream_subnet_dividends,
+    subnet_cache_key,
+    swr_stats,
+)
+from singleflight import SingleFlight
+
+
+class FakePipeline:
+    """Queues commands and runs them on the fake Redis when executed"""
+
+    def __init__(self, redis):
+        self.redis = redis
+        self.commands = []
+
+    def __getattr__(self, name):
+        return lambda *args, **kwargs: self.commands.append((name, args, kwargs))
+
+    async def execute(self):
+        replies = [await getattr(self.redis, name)(*args, **kwargs) for name, args, kwargs in self.commands]
+        self.redis.executed += 1
+        if self.redis.on_execute is not None:
+            self.redis.on_execute(self.redis)
+        return replies
+
+
+class FakeRedis:
+    """In-memory stand-in for the Redis hash commands used by the dividend cache"""
+
+    def __init__(self):
+        self.hashes = {}
+        self.executed = 0
+        self.on_execute = None
+
+    def pipeline(self, transaction=True):
+        return FakePipeline(self)
+
+    async def hmget(self, key, fields):
+        return [self.hashes.get(key, {}).get(field) for field in fields]
+
+    async def hgetall(self, key):
+        return dict(self.hashes.get(key, {}))
+
+    async def hget(self, key, field):
+        return self.hashes.get(key, {}).get(field)
+
+    async def hset(self, key, mapping):
+        self.hashes.setdefault(key, {}).update({field: str(value) for field, value in mapping.items()})
+
+    async def hscan(self, key, cursor, count):
+        items = sorted(self.hashes.get(key, {}).items())
+        page = dict(items[cursor:cursor + count])
+        return (cursor + count if cursor + count < len(items) else 0), page
+
+    async def rename(self, source, destination):
+        self.hashes[destination] = self.hashes.pop(source)
+
+    async def expire(self, key, seconds):
+        pass
+
+    async def delete(self, key):
+        self.hashes.pop(key, None)
+
+    async def publish(self, channel, message):
+        return 0
+
+
+class FakeSubstrate:
+    """Pages a storage map the way `query_map` does"""
+
+    def __init__(self, storage):
+        self.storage = sorted(storage.items())
+
+    async def query_map(self, module, storage, params, block_hash=None, page_size=None, max_results=None, start_key=None):
+        start = start_key or 0
+        records = [(hotkey, SimpleNamespace(value=value)) for hotkey, value in self.storage[start:start + max_results]]
+        last_key = start + max_results if start + max_results < len(self.storage) else None
+        return SimpleNamespace(records=records, last_key=last_key)
+
+
+class FakePool:
+    def __init__(self, substrate):
+        self.substrate = substrate
+
+    @asynccontextmanager
+    async def connection(self):
+        yield self.substrate
+
+
+@pytest.fixture
+def redis():
+    fake = FakeRedis()
+    with patch("bittensor_interface.get_redis_connection", return_value=fake), patch("local_cache.get_redis_connection", return_value=fake):
+        yield fake
+
+
+def cache_subnet(redis, netuid, dividends, block):
+    redis.hashes[subnet_cache_key(netuid)] = {
+        **{hotkey: str(value) for hotkey, value in dividends.items()},
+        BLOCK_FIELD: str(block),
+        TS_FIELD: str(time.time()),
+    }
+
+
+async def collect(stream):
+    return [row async for row in stream]
+
+
+@pytest.mark.asyncio
+@patch("bittensor_interface.DIVIDEND_STREAM_PAGE_SIZE", 3)
+@patch("bittensor_interface.decode_account_id", lambda key: key)
+async def test_stream_falls_back_to_the_chain_when_the_hash_is_replaced(redis):
+    """Test that a hash renamed over the scanned one is not mixed into the stream"""
+    chain = {"a": 10, "b": 20, "c": 30, "d": 40}
+    cache_subnet(redis, 1, {hotkey: value - 1 for hotkey, value in chain.items()}, block=100)
+
+    def replace_after_first_page(redis):
+        if redis.executed == 1:
+            cache_subnet(redis, 1, {hotkey: value + 1 for hotkey, value in chain.items()}, block=101)
+
+    redis.on_execute = replace_after_first_page
+    with patch("bittensor_interface.get_substrate_pool", return_value=FakePool(FakeSubstrate(chain))):
+        rows = await collect(stream_subnet_dividends(1, 100, "0x00"))
+
+    # The first page (markers and "a") came from the old hash, the rest from the chain
+    assert rows == [("a", 9.0), ("b", 20), ("c", 30), ("d", 40)]
+    assert redis.hashes[subnet_cache_key(1)]["a"] == "10"
+
+@pytest.mark.asyncio
+@patch("bittensor_interface.DIVIDEND_STREAM_PAGE_SIZE", 3)
+async def test_stream_serves_a_fresh_hash_once_per_entry(redis):
+    """Test that a fresh cached hash is streamed without the markers, zeros included"""
+    cache_subnet(redis, 1, {"a": 1.5, "b": 0, "c": 2, "d": 3}, block=100)
+    rows = await collect(stream_subnet_dividends(1, 100, "0x00"))
+    assert sorted(rows) == [("a", 1.5), ("b", 0.0), ("c", 2.0), ("d", 3.0)]
+
+@patch("bittensor_interface.DIVIDEND_CACHE_BLOCK_SPAN", 5)
+def test_entries_are_versioned_by_block_span():
+    """Test that an entry stays current until the chain enters the next block span"""
+    assert span_start(12) == 10
+    assert is_current_block(10, 14)
+    assert not is_current_block(9, 14)
+    assert not is_current_block(14, 15)
+    assert not is_current_block(None, 14)
+
+@patch("bittensor_interface.DIVIDEND_CACHE_BLOCK_SPAN", 1)
+@patch("bittensor_interface.DIVIDEND_CACHE_SOFT_TTL", 12)
+def test_cached_result_is_stale_after_a_new_block_or_the_soft_ttl():
+    """Test that an entry is stale once the block moved on or its soft TTL passed"""
+    now = time.time()
+    assert not cached_result(1.0, 100, now - 1, 100).stale
+    assert cached_result(1.0, 99, now - 1, 100).stale
+    assert cached_result(1.0, 100, now - 60, 100).stale
+    assert not cached_result(1.0, 100, None, 100).stale  # Entries without a read time age by block only
+
+def test_parse_cached_dividend_prefers_the_newest_block():
+    """Test that the subnet hash and the point key are resolved by block"""
+    point = json.dumps({"value": 2.0, "block": 101, "ts": 50.0})
+    assert parse_cached_dividend(["1.0", "100", "40.0"], point) == (2.0, 101, 50.0)
+    assert parse_cached_dividend(["1.0", "102", "60.0"], point) == (1.0, 102, 60.0)
+
+def test_parse_cached_dividend_of_an_address_missing_from_the_hash_is_zero():
+    """Test that an address absent from a cached subnet hash has a dividend of 0"""
+    assert parse_cached_dividend([None, "100", "40.0"], None) == (0.0, 100, 40.0)
+    assert parse_cached_dividend([None, None, None], None) is None
+
+@pytest.mark.asyncio
+@patch("bittensor_interface.DIVIDEND_CACHE_SWR", True)
+@patch("bittensor_interface.dividend_flights", SingleFlight("test", distributed=False))
+async def test_stale_subnet_is_served_while_refreshed_once(redis):
+    """Test that a stale subnet map is returned at once and refreshed by a single background task"""
+    cache_subnet(redis, 7, {"a": 1.0}, block=100)
+    fetch = AsyncMock(return_value=fetched_result([{"a": 2.0}], 101))
+    refreshes = swr_stats["refreshes"]
+    deduplicated = swr_stats["refreshes_deduplicated"]
+    with patch("bittensor_interface.get_current_block", return_value=(101, "0x01")), patch("bittensor_interface.fetch_subnet_dividends", fetch):
+        first, second = await asyncio.gather(get_tao_dividends_for_subnet(7), get_tao_dividends_for_subnet(7))
+        assert first.stale and second.stale
+        assert first.dividend == [{"a": 1.0}]
+        await asyncio.gather(*refresh_tasks.values())
+    fetch.assert_awaited_once_with(7, 101, "0x01")
+    assert swr_stats["refreshes"] == refreshes + 1
+    assert swr_stats["refreshes_deduplicated"] == deduplicated + 1
+    assert not refresh_tasks
@@ -0,0 +1,49 @@
+import pytest
+from chutes_ai_interface import ChutesClient, ChutesError, parse_batch_scores, parse_score
+
+
+class FakeResponse:
+    """Stand-in for an httpx response with a given JSON body"""
+
+    def __init__(self, body):
+        self.body = body
+
+    def json(self):
+        if isinstance(self.body, Exception):
+            raise self.body
+        return self.body
+
+
+def test_parse_batch_scores():
+    """Test that a JSON array of scores is extracted from the answer"""
+    assert parse_batch_scores("[10, -20.5, 0]", 3) == [10.0, -20.5, 0.0]
+    assert parse_batch_scores("Here are the scores:\n[100, -100]\nHope this helps.", 2) == [100.0, -100.0]
+
+def test_parse_batch_scores_rejects_unusable_answers():
+    """Test that answers which cannot be mapped back to the tweets are refused"""
+    assert parse_batch_scores("[10, 20]", 3) is None  # Wrong count
+    assert parse_batch_scores("[10, 200]", 2) is None  # Out of range
+    assert parse_batch_scores("[true, 10]", 2) is None  # Not a number
+    assert parse_batch_scores('["10", 10]', 2) is None  # Not a number
+    assert parse_batch_scores("[10, oops]", 2) is None  # Not JSON
+    assert parse_batch_scores("No scores here", 2) is None
+    assert parse_batch_scores(None, 2) is None
+
+def test_parse_score_without_a_score_is_none():
+    """Test that an answer without a score in range leaves the tweet unscored instead of neutral"""
+    assert parse_score("I would rate this 75 out of 100.") == 75.0
+    assert parse_score("Score: -40") == -40.0
+    assert parse_score("I cannot evaluate this text.") is None
+    assert parse_score("It scores 250.") is None
+
+def test_parse_completion():
+    """Test that the text and usage of the first choice are returned"""
+    response = FakeResponse({"choices": [{"message": {"content": "[1, 2]"}}], "usage": {"prompt_tokens": 5}})
+    assert ChutesClient._parse_completion(response) == ("[1, 2]", {"prompt_tokens": 5})
+    assert ChutesClient._parse_completion(FakeResponse({"choices": []})) == ("", {})
+
+@pytest.mark.parametrize("body", [ValueError("not JSON"), ["not", "an", "object"], {"choices": ["not a choice"]}])
+def test_parse_completion_rejects_malformed_bodies(body):
+    """Test that malformed answers raise a ChutesError, which callers fall back on"""
+    with pytest.raises(ChutesError):
+        ChutesClient._parse_completion(FakeResponse(body))
@@ -0,0 +1,28 @@
+import pytest
+from datetime import datetime, timezone
+from bson import ObjectId
+from database import COLLECTION_INDEXES, SUPERSEDED_INDEXES, encode_trade_cursor, decode_trade_cursor, index_name
+
+
+def test_trade_cursor_round_trip():
+    """Test that a cursor decodes to the timestamp and ID of the trade it was made from"""
+    trade = {"timestamp": datetime(2025, 3, 1, 12, 30, 15, 250000, tzinfo=timezone.utc), "_id": ObjectId()}
+    assert decode_trade_cursor(encode_trade_cursor(trade)) == (trade["timestamp"], trade["_id"])
+
+@pytest.mark.parametrize("cursor", [
+    "",
+    "not-a-cursor",
+    "2025-03-01T12:30:15_not-an-object-id",
+    f"yesterday_{ObjectId()}",
+])
+def test_malformed_trade_cursor_is_refused(cursor):
+    """Test that malformed cursors raise a ValueError"""
+    with pytest.raises(ValueError):
+        decode_trade_cursor(cursor)
+
+def test_superseded_indexes_name_their_replacements():
+    """Test that every superseded index maps to an index that is still built"""
+    for collection, superseded in SUPERSEDED_INDEXES.items():
+        built = {index_name(keys) for keys, _ in COLLECTION_INDEXES[collection]}
+        assert set(superseded.values()) <= built
+        assert not set(superseded) & built
@@ -0,0 +1,79 @@
+import re
+import pytest
+from unittest.mock import AsyncMock, patch
+from datura_ai_interface import ingest_new_tweets, ingest_range
+
+
+class FakeTimeline:
+    """Answers Datura searches from a list of tweets, honouring the `max_id:` operator"""
+
+    def __init__(self, ids):
+        self.ids = list(ids)
+        self.queries = []
+
+    def publish(self, *ids):
+        self.ids.extend(ids)
+
+    async def search(self, query, user, start_date, end_date, count, sort):
+        self.queries.append(query)
+        match = re.search(r"max_id:(\d+)", query)
+        max_id = int(match.group(1)) if match else None
+        ids = sorted((i for i in self.ids if max_id is None or i <= max_id), reverse=True)[:count]
+        return [{"id": i, "text": f"tweet {i}", "created_at": f"2025-03-01T00:00:{i:02d}Z"} for i in ids]
+
+
+class FakeRedis:
+    """In-memory stand-in for the Redis commands of the ingestion cursor"""
+
+    def __init__(self):
+        self.data = {}
+
+    async def get(self, key):
+        return self.data.get(key)
+
+    async def set(self, key, value):
+        self.data[key] = value
+
+
+def ids_of(records):
+    return [int(record["_id"]) for record in records]
+
+
+@pytest.mark.asyncio
+async def test_ingest_range_pages_backwards_down_to_the_floor():
+    """Test that every page after the first asks for tweets below the oldest one seen"""
+    timeline = FakeTimeline(range(1, 11))
+    with patch("datura_ai_interface.search_tweets_async", timeline.search):
+        records, oldest_id, closed, searches = await ingest_range("tao", "user", 3, None, "2025-03-01", "2025-03-01", 3, 10)
+    assert ids_of(records) == [10, 9, 8, 7, 6, 5, 4]
+    assert (oldest_id, closed, searches) == (2, True, 3)
+    assert timeline.queries == ["tao", "tao max_id:7", "tao max_id:4"]
+
+@pytest.mark.asyncio
+async def test_ingest_range_reports_the_range_left_when_the_budget_runs_out():
+    """Test that a range is reported open, with the oldest ID reached, when searches run out"""
+    timeline = FakeTimeline(range(1, 11))
+    with patch("datura_ai_interface.search_tweets_async", timeline.search):
+        records, oldest_id, closed, searches = await ingest_range("tao", "user", -1, None, "2025-03-01", "2025-03-01", 3, 2)
+    assert ids_of(records) == [10, 9, 8, 7, 6, 5]
+    assert (oldest_id, closed, searches) == (5, False, 2)
+
+@pytest.mark.asyncio
+async def test_ingest_new_tweets_fills_gaps_on_later_runs():
+    """Test that new tweets come first and the gaps left by a short budget are filled later, each tweet once"""
+    timeline = FakeTimeline(range(1, 11))
+    redis = FakeRedis()
+    store_tweets = AsyncMock()
+    with patch("datura_ai_interface.search_tweets_async", timeline.search), \
+            patch("datura_ai_interface.get_redis_connection", return_value=redis), \
+            patch("datura_ai_interface.store_tweets", store_tweets):
+        assert ids_of(await ingest_new_tweets("tao", "user", 3, 1, max_pages=2)) == [10, 9, 8, 7, 6, 5]
+        timeline.publish(11, 12)
+        assert ids_of(await ingest_new_tweets("tao", "user", 3, 1, max_pages=2)) == [12, 11, 4, 3, 2]
+        assert ids_of(await ingest_new_tweets("tao", "user", 3, 1, max_pages=2)) == [1]
+        assert await ingest_new_tweets("tao", "user", 3, 1, max_pages=2) == []
+
+    stored = [i for call in store_tweets.await_args_list for i in ids_of(call.args[0])]
+    assert sorted(stored) == list(range(1, 13))
+    [cursor] = redis.data.values()
+    assert '"id": "12"' in cursor and '"gaps": []' in cursor
@@ -0,0 +1,65 @@
+from local_cache import LocalCache
+
+
+def test_get_returns_value_and_block():
+    """Test that a stored entry is returned with the block it was read at"""
+    cache = LocalCache(max_entries=10, max_bytes=10_000, ttl=60)
+    cache.set("key", {"value": 1}, 100)
+    assert cache.get("key") == ({"value": 1}, 100)
+    assert cache.get("missing") is None
+    assert cache.stats()["hits"] == 1
+    assert cache.stats()["misses"] == 1
+
+def test_expired_entries_are_misses():
+    """Test that entries past their TTL are dropped"""
+    cache = LocalCache(max_entries=10, max_bytes=10_000, ttl=0)
+    cache.set("key", 1, 100)
+    assert cache.get("key") is None
+    assert cache.stats()["entries"] == 0
+
+def test_entries_older_than_min_block_are_misses():
+    """Test that entries read before the requested block are dropped"""
+    cache = LocalCache(max_entries=10, max_bytes=10_000, ttl=60)
+    cache.set("key", 1, 100)
+    assert cache.get("key", min_block=101) is None
+    assert cache.get("key") is None
+
+def test_least_recently_used_entry_is_evicted():
+    """Test that the entry limit evicts the least recently used entry"""
+    cache = LocalCache(max_entries=2, max_bytes=10_000, ttl=60)
+    cache.set("a", 1, 100)
+    cache.set("b", 2, 100)
+    cache.get("a")  # "b" is now the least recently used
+    cache.set("c", 3, 100)
+    assert cache.get("a") is not None
+    assert cache.get("b") is None
+    assert cache.get("c") is not None
+    assert cache.stats()["evictions"] == 1
+
+def test_byte_limit_is_enforced():
+    """Test that the byte limit evicts entries and refuses oversized ones"""
+    cache = LocalCache(max_entries=100, max_bytes=40, ttl=60)  # Room for one 23-byte entry
+    cache.set("a", "x" * 20, 100)
+    cache.set("b", "y" * 20, 100)
+    assert cache.get("a") is None
+    assert cache.get("b") is not None
+    assert cache.stats()["bytes"] <= 40
+
+    cache.set("huge", "z" * 100, 100)
+    assert cache.get("huge") is None
+    assert cache.get("b") is not None
+
+def test_invalidate_and_evict_older_than():
+    """Test explicit invalidation and eviction by block"""
+    cache = LocalCache(max_entries=10, max_bytes=10_000, ttl=60)
+    cache.set("a", 1, 100)
+    cache.set("b", 2, 105)
+    cache.set("c", 3, 110)
+
+    cache.invalidate(["a"])
+    assert cache.get("a") is None
+
+    cache.evict_older_than(110)
+    assert cache.get("b") is None
+    assert cache.get("c") == (3, 110)
+    assert cache.stats()["bytes"] == cache._estimate_size("c", 3)
@@ -1,7 +1,10 @@
 import pytest
+from datetime import datetime, timedelta, timezone
 from fastapi.testclient import TestClient
 from main import app  # Assuming your FastAPI app is in a file named `main.py`
 from unittest.mock import patch
+from authenticator import get_current_user
+from models import DividendResult, Principal
 
 # Create a TestClient for the FastAPI app
 client = TestClient(app)
@@ -43,44 +46,83 @@ async def test_login(mock_authenticate, user_data):
     assert "access_token" in response.json()
     assert response.json()["token_type"] == "bearer"
 
-@pytest.mark.asyncio
-@patch("authenticator.get_current_user")
-@patch("trading.trading_process")
-@patch("bittensor_interface.get_tao_dividend_from_netuid_address")
-async def test_get_tao_dividends(mock_get_tao, mock_trading_process, mock_get_current_user):
+@pytest.fixture
+def current_user():
+    """Fixture to authenticate every request as a test user"""
+    now = datetime.now(timezone.utc)
+    app.dependency_overrides[get_current_user] = lambda: Principal(
+        username="testuser", token_id="token-1", issued_at=now, expires_at=now + timedelta(minutes=30)
+    )
+    yield
+    app.dependency_overrides.pop(get_current_user, None)
+
+@patch("main.record_request")
+@patch("main.submit_trade_job")
+@patch("main.sentiment_mirror.get")
+@patch("main.get_tao_dividend_from_netuid_address")
+@patch("main.get_tao_dividends_for_subnet")
+@patch("main.get_tao_dividends_for_address")
+def test_get_tao_dividends(mock_get_tao_for_address, mock_get_tao_for_subnet, mock_get_tao, mock_get_sentiment, mock_submit_trade_job, mock_record_request, current_user):
     """Test the endpoint for fetching TAO dividends"""
     
-    # Mocking the current user to simulate authentication
-    mock_get_current_user.return_value = {"username": "testuser"}
-    
-    # Mock the return value of the trading process and TAO dividend fetching
-    mock_trading_process.return_value = True
-    mock_get_tao.return_value = 100.0  # Mock dividend value
+    # Mock the sentiment, the trade queue and TAO dividend fetching
+    mock_get_sentiment.return_value = 0.5
+    mock_submit_trade_job.return_value = ("job-1", True)
+    mock_get_tao.return_value = DividendResult(dividend=100.0, block=10, cached=True)  # Mock dividend value
+    mock_get_tao_for_subnet.return_value = DividendResult(dividend=[100.0], block=10, cached=True)  # Mock subnet dividends
+    mock_get_tao_for_address.return_value = DividendResult(dividend={1: 100.0}, block=10, cached=True, stale=True, age=30.0)  # Mock stale netuid -> dividend mapping
 
     # Test when netuid and hotkey are provided, and trading is enabled
-    response = await client.get("/api/v1/tao_dividends?netuid=1&hotkey=testhotkey&trade=true")
+    response = client.get("/api/v1/tao_dividends?netuid=1&hotkey=testhotkey&trade=true", headers={"Idempotency-Key": "key-1"})
     assert response.status_code == 200
     data = response.json()
     assert data["netuid"] == 1
     assert data["hotkey"] == "testhotkey"
     assert data["dividend"] == 100.0
-    assert data["stake_tx_triggered"] is True
+    assert data["stake_tx_triggered"] is True  # The trade is queued, not executed in the request
+    assert data["trade_job_id"] == "job-1"
+    assert mock_submit_trade_job.call_args.args[0] == "testuser"
+    assert mock_submit_trade_job.call_args.args[4] == "key-1"
 
     # Test when netuid is provided, but hotkey is not
-    response = await client.get("/api/v1/tao_dividends?netuid=1")
+    response = client.get("/api/v1/tao_dividends?netuid=1")
     assert response.status_code == 200
     data = response.json()
     assert data["netuid"] == 1
     assert data["dividend"] == [100.0]  # Mocked value for the subnet
 
     # Test when no parameters are provided
-    response = await client.get("/api/v1/tao_dividends")
+    response = client.get("/api/v1/tao_dividends")
     assert response.status_code == 200
     assert response.json()["message"] == "No netuid or hotkey provided"
 
     # Test when only hotkey is provided
-    response = await client.get("/api/v1/tao_dividends?hotkey=testhotkey")
+    response = client.get("/api/v1/tao_dividends?hotkey=testhotkey")
     assert response.status_code == 200
     data = response.json()
     assert data["hotkey"] == "testhotkey"
-    assert data["dividend"] == 100.0  # Mocked value for the hotkey
+    assert data["dividend"] == {"1": 100.0}  # Mocked netuid -> dividend mapping for the hotkey
+    assert data["block"] == 10
+    assert data["stale"] is True  # Served while a background refresh runs
+    assert data["age"] == 30.0
+
+def test_get_tao_dividends_requires_authentication():
+    """Test that dividends are refused without a token"""
+    response = client.get("/api/v1/tao_dividends?netuid=1")
+    assert response.status_code == 401
+
+@patch("main.revoke_user_tokens")
+def test_logout_all(mock_revoke_user_tokens, current_user):
+    """Test that every token of the current user is revoked"""
+    response = client.post("/api/v1/logout/all")
+    assert response.status_code == 200
+    mock_revoke_user_tokens.assert_awaited_once_with("testuser")
+
+def test_get_metrics():
+    """Test that pool statistics are exposed"""
+    response = client.get("/api/v1/metrics")
+    assert response.status_code == 200
+    data = response.json()
+    assert "redis_pool" in data
+    assert "max_connections" in data["redis_pool"]
+    assert "substrate_pool" in data
@@ -0,0 +1,49 @@
+import time
+import pytest
+from unittest.mock import AsyncMock, patch
+from rate_limiter import TokenBucket, RedisTokenBucket
+
+
+@pytest.mark.asyncio
+async def test_burst_is_served_without_waiting():
+    """Test that up to `capacity` calls pass at once"""
+    bucket = TokenBucket(rate=1, capacity=3)
+    for _ in range(3):
+        await bucket.acquire()
+    assert bucket.stats()["throttled"] == 0
+
+@pytest.mark.asyncio
+async def test_empty_bucket_waits_for_a_refill():
+    """Test that a call beyond the burst waits about one refill interval"""
+    bucket = TokenBucket(rate=20, capacity=1)
+    await bucket.acquire()
+    started = time.monotonic()
+    await bucket.acquire()
+    assert time.monotonic() - started >= 0.04
+    assert bucket.stats()["throttled"] == 1
+    assert bucket.stats()["throttled_seconds"] > 0
+
+@pytest.mark.asyncio
+@patch("rate_limiter.get_redis_connection", side_effect=ConnectionError("Redis unavailable"))
+async def test_shared_bucket_falls_back_to_the_local_bucket(mock_get_redis_connection):
+    """Test that the shared bucket still limits this process when Redis is unavailable"""
+    bucket = RedisTokenBucket("test", rate=100, capacity=1)
+    await bucket.acquire()
+    stats = bucket.stats()
+    assert stats["shared"] is True
+    assert stats["redis_fallbacks"] == 1
+    assert stats["throttled"] == 0
+
+@pytest.mark.asyncio
+async def test_shared_bucket_waits_the_delay_the_script_returns():
+    """Test that the wait computed by the Redis script is slept and counted"""
+    redis = AsyncMock()
+    redis.eval.return_value = "0.05"
+    bucket = RedisTokenBucket("test", rate=20, capacity=1)
+    with patch("rate_limiter.get_redis_connection", return_value=redis):
+        started = time.monotonic()
+        await bucket.acquire()
+    assert time.monotonic() - started >= 0.04
+    assert redis.eval.await_args.args[1:5] == (1, "tao:rate_bucket:test", 20, 1)
+    stats = bucket.stats()
+    assert (stats["throttled"], stats["redis_fallbacks"]) == (1, 0)
@@ -0,0 +1,35 @@
+import pytest
+from config import SENTIMENT_BUCKET_SECONDS
+from sentiment_engine import decayed_index, engagement_weights, mentioned_netuids
+
+
+def test_engagement_weights():
+    """Test that weights grow logarithmically with engagement, starting at 1"""
+    weights = engagement_weights([0, 10, 1000, -5], [0, 0, 0, 0])
+    assert weights[0] == pytest.approx(1.0)
+    assert weights[0] < weights[1] < weights[2]
+    assert weights[3] == pytest.approx(1.0)  # Negative counts are ignored
+    assert engagement_weights([0], [1])[0] == pytest.approx(engagement_weights([2], [0])[0])  # A retweet counts as two likes
+
+def test_decayed_index_of_a_single_bucket_is_its_mean():
+    """Test that one bucket yields its weighted mean score, whatever its age"""
+    assert decayed_index([0], [150.0], [3.0], now=10 * SENTIMENT_BUCKET_SECONDS) == pytest.approx(50.0)
+
+def test_decayed_index_halves_older_buckets():
+    """Test that a bucket one half-life older counts half as much"""
+    half_life = 3600.0
+    recent = 100 * SENTIMENT_BUCKET_SECONDS
+    now = recent + SENTIMENT_BUCKET_SECONDS / 2  # The recent bucket has no age
+    index = decayed_index([recent - half_life, recent], [-100.0, 100.0], [1.0, 1.0], now=now, half_life=half_life)
+    assert index == pytest.approx((0.5 * -100 + 100) / 1.5)
+
+def test_decayed_index_without_weight_is_none():
+    """Test that empty series have no index"""
+    assert decayed_index([], [], [], now=0) is None
+    assert decayed_index([0], [0.0], [0.0], now=0) is None
+
+def test_mentioned_netuids():
+    """Test that subnet mentions are recognized"""
+    assert mentioned_netuids("Bullish on SN19 and subnet 8, not netuid #3") == {19, 8, 3}
+    assert mentioned_netuids("No subnet here") == set()
+    assert mentioned_netuids(None) == set()
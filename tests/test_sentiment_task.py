@@ -0,0 +1,38 @@
+import pytest
+from unittest.mock import patch
+from sentiment_task import RELEASE_LOCK_SCRIPT, SENTIMENT_LOCK_KEY, acquire_refresh_lock, release_refresh_lock
+
+
+class FakeRedis:
+    """In-memory stand-in for the Redis commands of the refresh lock"""
+
+    def __init__(self):
+        self.data = {}
+
+    async def set(self, key, value, ex=None, nx=False):
+        if nx and key in self.data:
+            return None
+        self.data[key] = value
+        return True
+
+    async def eval(self, script, numkeys, *args):
+        # Same effect as the Lua script, which only a real Redis can run
+        assert script == RELEASE_LOCK_SCRIPT and numkeys == 1
+        key, token = args
+        if self.data.get(key) != token:
+            return 0
+        del self.data[key]
+        return 1
+
+
+@pytest.mark.asyncio
+async def test_refresh_lock_is_released_only_by_its_holder():
+    """Test that runs never overlap and a run cannot release the lock of another"""
+    redis = FakeRedis()
+    with patch("sentiment_task.get_redis_connection", return_value=redis):
+        assert await acquire_refresh_lock("run-1")
+        assert not await acquire_refresh_lock("run-2")
+        await release_refresh_lock("run-2")  # e.g. a run whose lock expired and was taken over
+        assert redis.data[SENTIMENT_LOCK_KEY] == "run-1"
+        await release_refresh_lock("run-1")
+        assert await acquire_refresh_lock("run-2")
@@ -0,0 +1,76 @@
+import asyncio
+import pytest
+from singleflight import SingleFlight
+
+
+@pytest.mark.asyncio
+async def test_concurrent_calls_share_one_fetch():
+    """Test that concurrent calls for the same key run the fetch once"""
+    flights = SingleFlight("test", distributed=False)
+    calls = []
+
+    async def fetch():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return 42
+
+    results = await asyncio.gather(*[flights.do("key", fetch) for _ in range(5)])
+    assert results == [42] * 5
+    assert len(calls) == 1
+    assert flights.stats()["leaders"] == 1
+    assert flights.stats()["coalesced"] == 4
+    assert flights.stats()["in_flight"] == 0
+
+@pytest.mark.asyncio
+async def test_different_keys_fetch_separately():
+    """Test that calls for different keys are not coalesced"""
+    flights = SingleFlight("test", distributed=False)
+
+    async def fetch_for(value):
+        await asyncio.sleep(0.01)
+        return value
+
+    results = await asyncio.gather(flights.do("a", lambda: fetch_for(1)), flights.do("b", lambda: fetch_for(2)))
+    assert results == [1, 2]
+    assert flights.stats()["leaders"] == 2
+
+@pytest.mark.asyncio
+async def test_cancelled_caller_does_not_cancel_the_others():
+    """Test that cancelling one caller leaves the shared fetch running for the rest"""
+    flights = SingleFlight("test", distributed=False)
+    started = asyncio.Event()
+
+    async def fetch():
+        started.set()
+        await asyncio.sleep(0.05)
+        return "done"
+
+    first = asyncio.create_task(flights.do("key", fetch))
+    await started.wait()
+    second = asyncio.create_task(flights.do("key", fetch))
+    await asyncio.sleep(0)
+    first.cancel()
+
+    assert await second == "done"
+    with pytest.raises(asyncio.CancelledError):
+        await first
+
+@pytest.mark.asyncio
+async def test_errors_are_shared_and_not_cached():
+    """Test that a failed fetch fails every waiter and the next call fetches again"""
+    flights = SingleFlight("test", distributed=False)
+    calls = []
+
+    async def failing_fetch():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        raise RuntimeError("chain unavailable")
+
+    results = await asyncio.gather(flights.do("key", failing_fetch), flights.do("key", failing_fetch), return_exceptions=True)
+    assert all(isinstance(result, RuntimeError) for result in results)
+    assert len(calls) == 1
+
+    async def fetch():
+        return 7
+
+    assert await flights.do("key", fetch) == 7
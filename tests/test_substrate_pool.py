@@ -0,0 +1,73 @@
+import asyncio
+import pytest
+from unittest.mock import patch
+from substrate_pool import SubstratePool
+
+
+class FakeSubstrate:
+    """Stand-in for AsyncSubstrateInterface that records when it is closed"""
+
+    def __init__(self, url, ss58_format=None):
+        self.closed = False
+
+    async def initialize(self):
+        pass
+
+    async def close(self):
+        self.closed = True
+
+    async def get_chain_head(self):
+        return "0x00"
+
+
+def make_pool():
+    return SubstratePool(url="ws://test", size=1, max_concurrency=4, health_check_interval=3600, health_check_timeout=1)
+
+
+@pytest.mark.asyncio
+@patch("substrate_pool.AsyncSubstrateInterface", FakeSubstrate)
+async def test_broken_connection_is_rebuilt_only_once_idle():
+    """Test that a running query keeps its websocket until it is done"""
+    pool = make_pool()
+    await pool.start()
+    release = asyncio.Event()
+
+    async def running_query():
+        async with pool.connection() as substrate:
+            await release.wait()
+            assert not substrate.closed
+            return substrate
+
+    first = asyncio.create_task(running_query())
+    await asyncio.sleep(0)
+    pool.connections[0].healthy = False  # e.g. another query hit a transport error
+
+    async def next_query():
+        async with pool.connection() as substrate:
+            return substrate
+
+    second = asyncio.create_task(next_query())
+    await asyncio.sleep(0.01)
+    assert not second.done()  # Waits instead of getting the broken connection
+
+    release.set()
+    old, new = await first, await second
+    assert old.closed
+    assert new is not old and not new.closed
+    await pool.close()
+
+@pytest.mark.asyncio
+@patch("substrate_pool.AsyncSubstrateInterface", FakeSubstrate)
+async def test_health_check_does_not_rebuild_a_busy_connection():
+    """Test that a failed ping leaves a connection alone while a query uses it"""
+    pool = make_pool()
+    await pool.start()
+    conn = pool.connections[0]
+
+    async with pool.connection() as substrate:
+        with patch.object(FakeSubstrate, "get_chain_head", side_effect=ConnectionError("timeout")):
+            assert not await conn.check_health(1)
+        assert not conn.rebuildable
+        assert not substrate.closed
+    assert conn.rebuildable
+    await pool.close()
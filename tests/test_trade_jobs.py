@@ -0,0 +1,109 @@
+import pytest
+from unittest.mock import AsyncMock, patch
+from trade_jobs import CLAIM_JOB_SCRIPT, get_trade_job, run_trade_job, submit_trade_job
+
+
+class FakePipeline:
+    """Queues commands and runs them on the fake Redis when executed"""
+
+    def __init__(self, redis):
+        self.redis = redis
+        self.commands = []
+
+    def __getattr__(self, name):
+        return lambda *args, **kwargs: self.commands.append((name, args, kwargs))
+
+    async def execute(self):
+        return [await getattr(self.redis, name)(*args, **kwargs) for name, args, kwargs in self.commands]
+
+
+class FakeRedis:
+    """In-memory stand-in for the Redis commands of the trade jobs"""
+
+    def __init__(self):
+        self.data = {}
+        self.published = []
+
+    def pipeline(self, transaction=True):
+        return FakePipeline(self)
+
+    async def set(self, key, value, ex=None, nx=False):
+        if nx and key in self.data:
+            return None
+        self.data[key] = value
+        return True
+
+    async def get(self, key):
+        return self.data.get(key)
+
+    async def delete(self, key):
+        self.data.pop(key, None)
+
+    async def hset(self, key, mapping):
+        self.data.setdefault(key, {}).update({field: str(value) for field, value in mapping.items()})
+
+    async def hgetall(self, key):
+        return dict(self.data.get(key, {}))
+
+    async def expire(self, key, seconds):
+        pass
+
+    async def publish(self, channel, message):
+        self.published.append(channel)
+
+    async def eval(self, script, numkeys, *args):
+        # Same effect as the Lua script, which only a real Redis can run
+        assert script == CLAIM_JOB_SCRIPT and numkeys == 1
+        job_key, now = args
+        job = self.data.get(job_key, {})
+        if job.get("status") != "queued":
+            return 0
+        job.update({"status": "running", "updated_at": str(now)})
+        return 1
+
+
+@pytest.fixture
+def redis():
+    fake = FakeRedis()
+    with patch("trade_jobs.get_redis_connection", return_value=fake):
+        yield fake
+
+
+@pytest.mark.asyncio
+async def test_replayed_request_gets_the_original_job(redis):
+    """Test that requests with the same idempotency key share one queued job"""
+    dispatched = []
+    job_id, created = await submit_trade_job("alice", 1, "hotkey", 0.5, "key-1", dispatched.append)
+    replay_id, replay_created = await submit_trade_job("alice", 1, "hotkey", 0.5, "key-1", dispatched.append)
+    assert (created, replay_created) == (True, False)
+    assert replay_id == job_id
+    assert dispatched == [job_id]
+    assert (await get_trade_job(job_id))["status"] == "queued"
+
+    other_id, other_created = await submit_trade_job("bob", 1, "hotkey", 0.5, "key-1", dispatched.append)
+    assert other_created and other_id != job_id  # Keys are scoped per user
+
+@pytest.mark.asyncio
+async def test_failed_dispatch_frees_the_idempotency_key(redis):
+    """Test that a job the broker refused is marked failed and may be retried with the same key"""
+    def refuse(job_id):
+        raise ConnectionError("broker unavailable")
+
+    with pytest.raises(ConnectionError):
+        await submit_trade_job("alice", 1, "hotkey", 0.5, "key-1", refuse)
+    [failed] = [key for key in redis.data if key.startswith("tao:trade_job:")]
+    assert redis.data[failed]["status"] == "failed"
+
+    job_id, created = await submit_trade_job("alice", 1, "hotkey", 0.5, "key-1", lambda job_id: None)
+    assert created and f"tao:trade_job:{job_id}" != failed
+
+@pytest.mark.asyncio
+async def test_redelivered_job_trades_once(redis):
+    """Test that only the first delivery of a job claims and executes it"""
+    job_id, _ = await submit_trade_job("alice", 1, "hotkey", 0.5, "key-1", lambda job_id: None)
+    with patch("trade_jobs.trading_process", AsyncMock(return_value=True)) as trading_process:
+        await run_trade_job(job_id)
+        await run_trade_job(job_id)
+    trading_process.assert_awaited_once_with(1, "hotkey", "alice", score=0.5)
+    job = await get_trade_job(job_id)
+    assert job["status"] == "succeeded" and job["stake_tx_triggered"] is True
@@ -0,0 +1,96 @@
+import asyncio
+import os
+import pytest
+from bson import ObjectId, json_util
+from trading_log_writer import TradingLogWriter
+
+
+class FakeCollection:
+    """In-memory stand-in for the trading logs collection"""
+
+    def __init__(self, fail: bool = False):
+        self.fail = fail
+        self.docs = {}
+        self.batches = []
+
+    async def insert_many(self, docs, ordered=False):
+        if self.fail:
+            raise ConnectionError("MongoDB unavailable")
+        self.batches.append(len(docs))
+        for doc in docs:
+            self.docs[doc["_id"]] = doc
+
+
+def make_writer(collection, tmp_path, **options):
+    options.setdefault("batch_size", 2)
+    options.setdefault("flush_interval", 0.05)
+    options.setdefault("max_buffer", 10)
+    return TradingLogWriter(collection, spill_path=str(tmp_path / "trading_logs.spill"), **options)
+
+
+def make_log(action="stake"):
+    return {"_id": ObjectId(), "action_type": action, "netuid": 1}
+
+
+@pytest.mark.asyncio
+async def test_logs_are_written_in_batches(tmp_path):
+    """Test that a full batch is written without waiting for shutdown"""
+    collection = FakeCollection()
+    writer = make_writer(collection, tmp_path, flush_interval=0.5)
+    for _ in range(2):
+        await writer.write(make_log())
+    for _ in range(30):
+        if collection.docs:
+            break
+        await asyncio.sleep(0.01)
+    assert collection.batches == [2]
+    await writer.close(timeout=1)
+    assert writer.stats()["written"] == 2
+
+@pytest.mark.asyncio
+async def test_close_flushes_buffered_logs(tmp_path):
+    """Test that logs still buffered at shutdown are written"""
+    collection = FakeCollection()
+    writer = make_writer(collection, tmp_path, batch_size=100)
+    logs = [make_log() for _ in range(3)]
+    for log in logs:
+        await writer.write(log)
+    await writer.close(timeout=1)
+    assert set(collection.docs) == {log["_id"] for log in logs}
+    assert writer.stats()["buffered"] == 0
+
+@pytest.mark.asyncio
+async def test_failed_logs_are_spilled_and_replayed(tmp_path):
+    """Test that logs MongoDB refused are spilled to disk and inserted by the next writer"""
+    writer = make_writer(FakeCollection(fail=True), tmp_path)
+    spilled = [make_log() for _ in range(2)]
+    for log in spilled:
+        await writer.write(log)
+    await writer.close(timeout=1)
+    assert writer.stats()["spilled"] == 2
+    assert writer.stats()["spill_pending"] is True
+
+    collection = FakeCollection()
+    writer = make_writer(collection, tmp_path)
+    log = make_log("unstake")
+    await writer.write(log)
+    await writer.close(timeout=1)
+    assert set(collection.docs) == {log["_id"] for log in spilled + [log]}
+    assert writer.stats()["replayed"] == 2
+    assert writer.stats()["spill_pending"] is False
+
+@pytest.mark.asyncio
+async def test_unreadable_spill_lines_are_skipped(tmp_path):
+    """Test that a truncated line does not block the replay of the others"""
+    log = make_log()
+    with open(tmp_path / "trading_logs.spill", "w", encoding="utf-8") as spill_file:
+        spill_file.write(json_util.dumps(log) + "\n")
+        spill_file.write('{"_id": {"$oid": "trunc\n')
+
+    collection = FakeCollection()
+    writer = make_writer(collection, tmp_path)
+    await writer.write(make_log())
+    await writer.close(timeout=1)
+    assert log["_id"] in collection.docs
+    assert writer.stats()["skipped_spill_lines"] == 1
+    assert not os.path.exists(writer.replay_path)
@@ -0,0 +1,18 @@
+import pytest
+from utils import PasswordHashPool
+
+
+def fail(password):
+    raise ValueError("malformed hash")
+
+
+@pytest.mark.asyncio
+async def test_failed_operations_are_counted_separately():
+    """Test that a failing hash operation counts as failed, not completed"""
+    pool = PasswordHashPool(workers=2, max_queue=2)
+    assert await pool.run(str.upper, "secret") == "SECRET"
+    with pytest.raises(ValueError):
+        await pool.run(fail, "secret")
+    stats = pool.stats()
+    assert (stats["completed"], stats["failed"], stats["running"], stats["queued"]) == (1, 1, 0, 0)
+    assert stats["avg_run_ms"] is not None
@@ -0,0 +1,188 @@
+import asyncio
+import json
+import logging
+import time
+import uuid
+from redis_interface import get_redis_connection, get_pubsub_connection
+from trading import trading_process
+from config import TRADE_JOB_TTL
+
+# Set up logging for job lifecycle events
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Redis hash holding the state of a trade job
+TRADE_JOB_KEY = "tao:trade_job:{job_id}"
+
+# Redis key mapping an idempotency key to the job it created
+TRADE_IDEMPOTENCY_KEY = "tao:trade_idempotency:{key}"
+
+# Redis pub/sub channel announcing the state changes of one job ({"job_id": ..., "status": ...}),
+# so a waiter only receives the messages of the job it waits for
+TRADE_JOB_CHANNEL = "tao:trade_job_updates:{job_id}"
+
+# Job statuses after which nothing changes anymore
+FINAL_STATUSES = {"succeeded", "failed"}
+
+# Claims a queued job for execution, so a redelivered task never trades twice
+CLAIM_JOB_SCRIPT = """
+if redis.call('hget', KEYS[1], 'status') == 'queued' then
+    redis.call('hset', KEYS[1], 'status', 'running', 'updated_at', ARGV[1])
+    return 1
+end
+return 0
+"""
+
+
+def parse_trade_job(fields: dict) -> dict:
+    """
+    Convert the Redis hash of a job into its typed representation.
+    """
+    job = dict(fields)
+    job["netuid"] = int(job["netuid"])
+    job["score"] = float(job["score"])
+    job["created_at"] = float(job["created_at"])
+    job["updated_at"] = float(job["updated_at"])
+    if "stake_tx_triggered" in job:
+        job["stake_tx_triggered"] = job["stake_tx_triggered"] == "1"
+    return job
+
+
+async def submit_trade_job(username: str, netuid: int, hotkey: str, score: float, idempotency_key: str, dispatch) -> tuple:
+    """
+    Create a trade job and hand it to the queue, unless the idempotency key was already used.
+
+    Args:
+        username (str): The user the trade is made for.
+        netuid (int): The network ID.
+        hotkey (str): The hotkey to stake to / unstake from.
+        score (float): The sentiment score the trade is based on, as seen when it was requested.
+        idempotency_key (str): Requests with the same key share a single job.
+        dispatch (Callable): Enqueues the job for execution; called with the job ID.
+
+    Returns:
+        tuple: `(job_id, created)` - the job handling the request and whether this request created it.
+    """
+    redis = await get_redis_connection()
+    job_id = uuid.uuid4().hex
+    idempotency_key = TRADE_IDEMPOTENCY_KEY.format(key=f"{username}:{idempotency_key}")
+
+    # Claim the idempotency key; a replayed request gets the original job
+    if not await redis.set(idempotency_key, job_id, ex=TRADE_JOB_TTL, nx=True):
+        return await redis.get(idempotency_key), False
+
+    now = time.time()
+    job_key = TRADE_JOB_KEY.format(job_id=job_id)
+    pipe = redis.pipeline(transaction=True)
+    pipe.hset(job_key, mapping={
+        "job_id": job_id,
+        "status": "queued",
+        "username": username,
+        "netuid": netuid,
+        "hotkey": hotkey,
+        "score": score,
+        "created_at": now,
+        "updated_at": now,
+    })
+    pipe.expire(job_key, TRADE_JOB_TTL)
+    await pipe.execute()
+
+    try:
+        # Publishing to the broker is blocking I/O: keep it off the event loop
+        await asyncio.to_thread(dispatch, job_id)
+    except Exception as e:
+        logger.error(f"Failed to enqueue trade job {job_id}: {e}")
+        await update_trade_job(job_id, status="failed", error=f"Could not be queued: {e}")
+        await redis.delete(idempotency_key)
+        raise
+    return job_id, True
+
+
+async def update_trade_job(job_id: str, **fields):
+    """
+    Update the state of a job and notify anyone waiting for it.
+
+    Args:
+        job_id (str): The job ID.
+        **fields: The fields to set (e.g. `status`, `error`).
+    """
+    redis = await get_redis_connection()
+    fields["updated_at"] = time.time()
+    pipe = redis.pipeline(transaction=False)
+    pipe.hset(TRADE_JOB_KEY.format(job_id=job_id), mapping=fields)
+    if "status" in fields:
+        pipe.publish(TRADE_JOB_CHANNEL.format(job_id=job_id), json.dumps({"job_id": job_id, "status": fields["status"]}))
+    await pipe.execute()
+
+
+async def get_trade_job(job_id: str):
+    """
+    Read the state of a job.
+
+    Args:
+        job_id (str): The job ID.
+
+    Returns:
+        dict: The job, or None if it does not exist (or expired).
+    """
+    redis = await get_redis_connection()
+    fields = await redis.hgetall(TRADE_JOB_KEY.format(job_id=job_id))
+    return parse_trade_job(fields) if fields else None
+
+
+async def wait_for_trade_job(job_id: str, timeout: float):
+    """
+    Wait until a job reaches a final status, or until the timeout passes.
+
+    The subscription is held on the pub/sub pool, so long polls neither take connections
+    away from regular commands nor hit their socket timeout.
+
+    Args:
+        job_id (str): The job ID.
+        timeout (float): Maximum seconds to wait.
+
+    Returns:
+        dict: The latest state of the job, or None if it does not exist.
+    """
+    redis = await get_pubsub_connection()
+    async with redis.pubsub() as pubsub:
+        # Subscribe before reading so a change in between is not missed
+        await pubsub.subscribe(TRADE_JOB_CHANNEL.format(job_id=job_id))
+        deadline = time.monotonic() + timeout
+        job = await get_trade_job(job_id)
+        while job is not None and job["status"] not in FINAL_STATUSES:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            message = await pubsub.get_message(ignore_subscribe_messages=True, timeout=remaining)
+            if message is not None:
+                job = await get_trade_job(job_id)
+        return job
+
+
+async def run_trade_job(job_id: str):
+    """
+    Execute a queued trade job. Jobs that are already running or finished are left alone,
+    so redelivering the task is harmless.
+
+    Args:
+        job_id (str): The job ID.
+    """
+    redis = await get_redis_connection()
+    job_key = TRADE_JOB_KEY.format(job_id=job_id)
+    if not await redis.eval(CLAIM_JOB_SCRIPT, 1, job_key, time.time()):
+        logger.info(f"Trade job {job_id} is not queued anymore. Skipping it.")
+        return
+    await redis.publish(TRADE_JOB_CHANNEL.format(job_id=job_id), json.dumps({"job_id": job_id, "status": "running"}))
+
+    job = await get_trade_job(job_id)
+    try:
+        triggered = await trading_process(job["netuid"], job["hotkey"], job["username"], score=job["score"])
+    except Exception as e:
+        logger.error(f"Trade job {job_id} failed: {e}")
+        await update_trade_job(job_id, status="failed", error=str(e))
+        return
+    if triggered:
+        await update_trade_job(job_id, status="succeeded", stake_tx_triggered=1)
+    else:
+        await update_trade_job(job_id, status="failed", stake_tx_triggered=0, error="The trade was not executed")
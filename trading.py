@@ -1,17 +1,19 @@
 from sentiment_task import get_sentiment_score
 from bittensor_wallet_interface import add_stake, unstake
 from database import log_trading_action
+import asyncio
 import logging
 
 # Set up logging for debugging and monitoring
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-async def trading_process(netuid, hotkey, user):
+async def trading_process(netuid, hotkey, username, score=None):
     """
     This function performs a trading action (staking or unstaking) based on the sentiment score.
     
-    The sentiment score is fetched from the `get_sentiment_score()` function. Based on the sign of the score:
+    The sentiment score of the subnet (or of the whole market if the subnet has none) is fetched from the
+    `get_sentiment_score()` function. Based on the sign of the score:
     - If the score is positive, the function stakes a calculated amount.
     - If the score is negative, the function unstakes a calculated amount.
     
@@ -20,14 +22,16 @@ async def trading_process(netuid, hotkey, user):
     Parameters:
         - netuid (int): The unique identifier for the network where the action is to take place.
         - hotkey (str): The hotkey associated with the wallet for staking/unstaking.
-        - user (dict): The authenticated user performing the action, required to log the action.
+        - username (str): The user performing the action, required to log the action.
+        - score (float, optional): The sentiment score to trade on; the current score is used if omitted.
 
     Returns:
         - bool: Returns `True` if a trading action (stake or unstake) was performed, `False` otherwise.
     """
     
     # Fetch the current sentiment score (this could be positive or negative)
-    score = get_sentiment_score()
+    if score is None:
+        score = get_sentiment_score(netuid)
 
     # Calculate the amount to stake/unstake. The absolute value of the score is used,
     # and a percentage (0.01) of that value is used for the trading action.
@@ -36,11 +40,11 @@ async def trading_process(netuid, hotkey, user):
     # If sentiment score is positive, perform staking action
     if score > 0:
         try:
-            # Perform the staking action
-            add_stake(netuid, hotkey, amount)
+            # Perform the staking action (wallet and extrinsic calls block, so run it in a thread)
+            await asyncio.to_thread(add_stake, netuid, hotkey, amount)
             
             # Log the trading action in the database
-            await log_trading_action(user.username, "stake", netuid, hotkey, amount)
+            await log_trading_action(username, "stake", netuid, hotkey, amount)
             return True
         
         except Exception as e:
@@ -51,11 +55,11 @@ async def trading_process(netuid, hotkey, user):
     # If sentiment score is negative, perform unstaking action
     elif score < 0:
         try:
-            # Perform the unstaking action
-            unstake(netuid, hotkey, amount)
+            # Perform the unstaking action (wallet and extrinsic calls block, so run it in a thread)
+            await asyncio.to_thread(unstake, netuid, hotkey, amount)
             
             # Log the trading action in the database
-            await log_trading_action(user.username, "unstake", netuid, hotkey, amount)
+            await log_trading_action(username, "unstake", netuid, hotkey, amount)
             return True
         
         except Exception as e:
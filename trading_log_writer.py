@@ -0,0 +1,299 @@
+import asyncio
+import fcntl
+import logging
+import os
+from contextlib import contextmanager
+from bson import ObjectId, json_util
+from pymongo.errors import BulkWriteError
+from config import (
+    TRADING_LOG_BATCH_SIZE,
+    TRADING_LOG_FLUSH_INTERVAL,
+    TRADING_LOG_MAX_BUFFER,
+    TRADING_LOG_SPILL_PATH,
+    TRADING_LOG_DRAIN_TIMEOUT,
+)
+
+# Set up logging for flush and spill events
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# MongoDB error code of a duplicate key
+DUPLICATE_KEY_ERROR = 11000
+
+
+@contextmanager
+def spill_lock(lock_path: str, blocking: bool = True):
+    """
+    Hold the lock guarding the spill files, shared by every process of the host.
+
+    Args:
+        lock_path (str): The lock file.
+        blocking (bool): Wait for the lock; otherwise yield False if another holder has it.
+
+    Yields:
+        bool: Whether the lock is held.
+    """
+    with open(lock_path, "a") as lock_file:
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            yield False
+            return
+        try:
+            yield True
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+class TradingLogWriter:
+    """
+    An in-memory buffer of trading logs, written to MongoDB in batches.
+
+    Logs are queued and flushed with an unordered `insert_many` once `batch_size` logs are
+    waiting or `flush_interval` seconds passed. The buffer holds at most `max_buffer` logs;
+    beyond that, writers wait for a flush (backpressure). Logs MongoDB does not accept are
+    appended to a local spill file and inserted again once MongoDB is back. Every log gets
+    its `_id` before it is queued, so replaying a log that was in fact written is harmless.
+
+    The spill file may be shared by every API and Celery worker process of the host: all
+    access to it goes through an `flock` on `<spill_path>.lock`, and a replay holds that
+    lock until it is done.
+    """
+
+    def __init__(
+        self,
+        collection,
+        batch_size: int = TRADING_LOG_BATCH_SIZE,
+        flush_interval: float = TRADING_LOG_FLUSH_INTERVAL,
+        max_buffer: int = TRADING_LOG_MAX_BUFFER,
+        spill_path: str = TRADING_LOG_SPILL_PATH,
+    ):
+        self.collection = collection
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_buffer = max_buffer
+        self.spill_path = spill_path
+        self.replay_path = spill_path + ".replay"
+        self.lock_path = spill_path + ".lock"
+        self._queue = None
+        self._task = None
+        self._stopping = False
+        self._in_flight = []
+        self._carry = []
+        self.written = 0
+        self.spilled = 0
+        self.replayed = 0
+        self.skipped_lines = 0
+        self.failed_flushes = 0
+        self.loop_errors = 0
+        self.backpressure_waits = 0
+
+    def _start(self):
+        # The queue outlives the task: logs still buffered are never thrown away
+        if self._queue is None:
+            self._queue = asyncio.Queue(maxsize=self.max_buffer)
+        if self._task is None or self._task.done():
+            self._stopping = False
+            self._task = asyncio.create_task(self._run())
+
+    async def write(self, log: dict):
+        """
+        Queue a trading log, waiting if the buffer is full.
+
+        Args:
+            log (dict): The trading log document.
+        """
+        self._start()
+        log.setdefault("_id", ObjectId())
+        if self._queue.full():
+            self.backpressure_waits += 1
+        await self._queue.put(log)
+
+    async def _next_batch(self) -> list:
+        """
+        Collect logs until the batch is full or the flush interval passed. Logs of a batch
+        that could neither be written nor spilled come first.
+        """
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.flush_interval
+        batch, self._carry = self._carry, []
+        while len(batch) < self.batch_size:
+            if self._stopping:
+                if self._queue.empty():
+                    break
+                batch.append(self._queue.get_nowait())
+                continue
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _run(self):
+        replay = True
+        while not (self._stopping and self._queue.empty() and not self._carry):
+            try:
+                if replay:
+                    await self._replay_spill()
+                batch = await self._next_batch()
+                replay = bool(batch) and await self._flush(batch)
+            except Exception as e:
+                # Keep the batch for the next round instead of dropping it
+                self.loop_errors += 1
+                self._carry, self._in_flight = list(self._in_flight), []
+                replay = False
+                logger.error(f"Trading log writer failed, retrying: {e}")
+                if self._stopping:
+                    return
+                await asyncio.sleep(self.flush_interval)
+
+    async def _insert(self, logs: list) -> list:
+        """
+        Insert logs, ignoring the ones that already exist.
+
+        Returns:
+            list: The logs that could not be written.
+        """
+        try:
+            await self.collection.insert_many(logs, ordered=False)
+            self.written += len(logs)
+            return []
+        except BulkWriteError as e:
+            self.written += e.details.get("nInserted", 0)
+            return [
+                logs[error["index"]]
+                for error in e.details.get("writeErrors", [])
+                if error.get("code") != DUPLICATE_KEY_ERROR
+            ]
+
+    async def _flush(self, batch: list) -> bool:
+        """
+        Write a batch, spilling whatever MongoDB does not accept.
+
+        Returns:
+            bool: True if the whole batch was written.
+
+        Raises:
+            OSError: If the spill file cannot be written either (the batch stays in flight).
+        """
+        self._in_flight = batch
+        try:
+            failed = await self._insert(batch)
+        except Exception as e:
+            logger.error(f"Failed to write {len(batch)} trading logs: {e}")
+            failed = batch
+        if failed:
+            self.failed_flushes += 1
+            await asyncio.to_thread(self._spill, failed)
+        self._in_flight = []
+        return not failed
+
+    def _spill(self, logs: list):
+        """
+        Append logs to the spill file and sync it to disk.
+        """
+        with spill_lock(self.lock_path):
+            with open(self.spill_path, "a", encoding="utf-8") as spill_file:
+                for log in logs:
+                    spill_file.write(json_util.dumps(log) + "\n")
+                spill_file.flush()
+                os.fsync(spill_file.fileno())
+        self.spilled += len(logs)
+        logger.warning(f"Spilled {len(logs)} trading logs to {self.spill_path}.")
+
+    def _read_replay_file(self) -> list:
+        """
+        Read the logs of the replay file, skipping lines that cannot be parsed (e.g. the
+        last line of a process that died while spilling).
+        """
+        logs = []
+        with open(self.replay_path, encoding="utf-8") as replay_file:
+            for number, line in enumerate(replay_file, start=1):
+                if not line.strip():
+                    continue
+                try:
+                    logs.append(json_util.loads(line))
+                except Exception:
+                    self.skipped_lines += 1
+                    logger.error(f"Skipping unreadable line {number} of {self.replay_path}: {line[:200]!r}")
+        return logs
+
+    async def _replay_spill(self):
+        """
+        Insert the logs of the spill file again. The file is moved aside first so that new
+        spills do not mix with the replay; it is deleted once every log is written, and
+        replayed again on the next attempt otherwise. Another process replaying at the same
+        time holds the lock, in which case this attempt is skipped.
+        """
+        if not os.path.exists(self.spill_path) and not os.path.exists(self.replay_path):
+            return
+        with spill_lock(self.lock_path, blocking=False) as locked:
+            if not locked:
+                return
+            if not os.path.exists(self.replay_path):
+                if not os.path.exists(self.spill_path):
+                    return
+                os.replace(self.spill_path, self.replay_path)
+
+            logs = await asyncio.to_thread(self._read_replay_file)
+            try:
+                for start in range(0, len(logs), self.batch_size):
+                    if await self._insert(logs[start:start + self.batch_size]):
+                        raise RuntimeError("some logs were refused")
+            except Exception as e:
+                logger.error(f"Replaying spilled trading logs failed, will retry: {e}")
+                return
+            os.remove(self.replay_path)
+        self.replayed += len(logs)
+        logger.info(f"Replayed {len(logs)} spilled trading logs.")
+
+    async def close(self, timeout: float = TRADING_LOG_DRAIN_TIMEOUT):
+        """
+        Flush every buffered log before shutdown. Logs that cannot be written in time are
+        spilled. Never raises, so the rest of the shutdown runs.
+
+        Args:
+            timeout (float): Seconds to wait for the final flushes.
+        """
+        if self._task is None:
+            return
+        self._stopping = True
+        try:
+            await asyncio.wait_for(self._task, timeout)
+        except Exception as e:
+            if not isinstance(e, asyncio.TimeoutError):
+                logger.error(f"Trading log writer failed while draining: {e}")
+        # Whatever is left: the batch being written may or may not have made it, replaying it is harmless
+        remaining = list(self._carry) + list(self._in_flight)
+        while not self._queue.empty():
+            remaining.append(self._queue.get_nowait())
+        if remaining:
+            try:
+                self._spill(remaining)
+            except Exception as e:
+                logger.error(f"Lost {len(remaining)} trading logs at shutdown: {e}")
+        self._carry, self._in_flight = [], []
+        self._task = None
+
+    def stats(self) -> dict:
+        """
+        Report the state of the buffer.
+
+        Returns:
+            dict: Buffered logs, logs written / spilled / replayed, failed flushes, writer errors and backpressure waits.
+        """
+        return {
+            "buffered": (self._queue.qsize() if self._queue is not None else 0) + len(self._carry),
+            "max_buffer": self.max_buffer,
+            "written": self.written,
+            "spilled": self.spilled,
+            "replayed": self.replayed,
+            "skipped_spill_lines": self.skipped_lines,
+            "failed_flushes": self.failed_flushes,
+            "writer_errors": self.loop_errors,
+            "backpressure_waits": self.backpressure_waits,
+            "spill_pending": os.path.exists(self.spill_path) or os.path.exists(self.replay_path),
+        }
@@ -1,16 +1,123 @@
 # utils.py
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from fastapi import HTTPException
 from passlib.context import CryptContext
+from config import BCRYPT_ROUNDS, PASSWORD_HASH_WORKERS, PASSWORD_HASH_MAX_QUEUE
 
-# Password hashing setup using bcrypt for secure password storage
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# Password hashing setup using bcrypt for secure password storage. Pinning the minimum and
+# maximum rounds to the cost factor makes hashes of any other cost "need an update".
+pwd_context = CryptContext(
+    schemes=["bcrypt"],
+    deprecated="auto",
+    bcrypt__default_rounds=BCRYPT_ROUNDS,
+    bcrypt__min_rounds=BCRYPT_ROUNDS,
+    bcrypt__max_rounds=BCRYPT_ROUNDS,
+)
+
+
+class PasswordHashPool:
+    """
+    A bounded thread pool for bcrypt, which costs 100-300 ms of CPU per call.
+
+    bcrypt releases the GIL while hashing, so running it on a few dedicated threads keeps
+    the event loop free for other requests. At most `max_queue` operations may be waiting
+    at once; further ones are refused with a 503 instead of piling up behind a login burst.
+    """
+
+    def __init__(self, workers: int = PASSWORD_HASH_WORKERS, max_queue: int = PASSWORD_HASH_MAX_QUEUE):
+        self.workers = workers
+        self.max_queue = max_queue
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="bcrypt")
+        self.pending = 0
+        self.rejected = 0
+        # Updated by the worker threads
+        self.lock = threading.Lock()
+        self.running = 0
+        self.completed = 0
+        self.failed = 0
+        self.wait_time = 0.0
+        self.run_time = 0.0
+
+    def _timed(self, submitted_at, fn, *args):
+        started_at = time.monotonic()
+        with self.lock:
+            self.running += 1
+        succeeded = False
+        try:
+            result = fn(*args)
+            succeeded = True
+            return result
+        finally:
+            with self.lock:
+                self.running -= 1
+                if succeeded:
+                    self.completed += 1
+                else:
+                    self.failed += 1
+                self.wait_time += started_at - submitted_at
+                self.run_time += time.monotonic() - started_at
+
+    async def run(self, fn, *args):
+        """
+        Run a hashing function on the pool.
+
+        Args:
+            fn (Callable): The blocking function to run.
+            *args: Its arguments.
+
+        Returns:
+            Any: The result of the function.
+
+        Raises:
+            HTTPException: 503 if too many operations are already waiting.
+        """
+        if self.pending >= self.workers + self.max_queue:
+            self.rejected += 1
+            raise HTTPException(status_code=503, detail="Too many concurrent password checks, please retry")
+        self.pending += 1
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self.executor, self._timed, time.monotonic(), fn, *args)
+        finally:
+            self.pending -= 1
+
+    def stats(self) -> dict:
+        """
+        Report the load of the pool.
+
+        Returns:
+            dict: Pool size, queued / running operations, successes, failures, refusals and average wait and run times.
+        """
+        with self.lock:
+            running, completed, failed = self.running, self.completed, self.failed
+            wait_time, run_time = self.wait_time, self.run_time
+        finished = completed + failed
+        return {
+            "workers": self.workers,
+            "max_queue": self.max_queue,
+            "queued": max(self.pending - running, 0),
+            "running": running,
+            "completed": completed,
+            "failed": failed,
+            "rejected": self.rejected,
+            "avg_wait_ms": round(1000 * wait_time / finished, 2) if finished else None,
+            "avg_run_ms": round(1000 * run_time / finished, 2) if finished else None,
+        }
+
+
+# Process-wide pool shared by registration and login
+password_hash_pool = PasswordHashPool()
 
 def get_hashed_password(plain_password: str) -> str:
     """
     Hash a plain password using bcrypt.
-    
+
     Args:
         plain_password (str): The plain text password to hash.
-    
+
     Returns:
         str: The hashed password.
     """
@@ -19,12 +126,38 @@ def get_hashed_password(plain_password: str) -> str:
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     """
     Verify that the plain password matches the hashed password.
-    
+
     Args:
         plain_password (str): The plain text password entered by the user.
         hashed_password (str): The stored hashed password.
-    
+
     Returns:
         bool: True if the passwords match, False otherwise.
     """
     return pwd_context.verify(plain_password, hashed_password)
+
+async def hash_password(plain_password: str) -> str:
+    """
+    Hash a plain password on the password hashing pool.
+
+    Args:
+        plain_password (str): The plain text password to hash.
+
+    Returns:
+        str: The hashed password.
+    """
+    return await password_hash_pool.run(get_hashed_password, plain_password)
+
+async def verify_and_update_password(plain_password: str, hashed_password: str) -> tuple:
+    """
+    Verify a password on the password hashing pool and rehash it if its hash is outdated
+    (e.g. made with another cost factor).
+
+    Args:
+        plain_password (str): The plain text password entered by the user.
+        hashed_password (str): The stored hashed password.
+
+    Returns:
+        tuple: `(verified, new_hash)`; `new_hash` is None unless the stored hash should be replaced.
+    """
+    return await password_hash_pool.run(pwd_context.verify_and_update, plain_password, hashed_password)